@@ -8,6 +8,8 @@ from django.shortcuts import HttpResponse
 from django.http import HttpResponseNotAllowed, Http404
 from django.views.decorators.csrf import csrf_exempt
 
+from analytics.cache import cache_stats, cached_aggregation
+from analytics.rollups import rollup_group_records
 from universal.api_validation import ApiValidator
 
 from dateutil import parser as dateparser
@@ -39,11 +41,12 @@ def views_last_7_days(request):
 
     job_views = get_mongo_db().job_views
 
+    date_end = datetime.today()
+    date_start = date_end - timedelta(days=7)
     query = [
         {'$match': {'time_first_viewed': {'$type': 'date'}}},
-        {'$match': {'time_first_viewed': {'$gte': datetime.today() -
-                                                  timedelta(days=7)}}},
-        {'$match': {'time_first_viewed': {'$lte': datetime.today()}}},
+        {'$match': {'time_first_viewed': {'$gte': date_start}}},
+        {'$match': {'time_first_viewed': {'$lte': date_end}}},
         {
             "$group":
                 {
@@ -59,9 +62,12 @@ def views_last_7_days(request):
         {'$sort': {'_id': 1}}
     ]
 
-    records = job_views.aggregate(query)
+    records = cached_aggregation(
+        'views_last_7_days',
+        lambda: [format_dict(r) for r in job_views.aggregate(query)],
+        date_start=date_start, date_end=date_end)
 
-    return HttpResponse(json.dumps([format_dict(r) for r in records]))
+    return HttpResponse(json.dumps(records))
 
 
 @requires("view analytics")
@@ -84,11 +90,12 @@ def activity_last_7_days(request):
 
     filtered_analytics = get_mongo_db().analytics
 
+    date_end = datetime.today()
+    date_start = date_end - timedelta(days=7)
     query = [
         {'$match': {'time': {'$type': 'date'}}},
-        {'$match': {'time': {'$gte': datetime.today() -
-                                     timedelta(days=7)}}},
-        {'$match': {'time': {'$lte': datetime.today()}}},
+        {'$match': {'time': {'$gte': date_start}}},
+        {'$match': {'time': {'$lte': date_end}}},
         {
             "$group":
                 {
@@ -104,9 +111,12 @@ def activity_last_7_days(request):
         {'$sort': {'_id': 1}}
     ]
 
-    records = filtered_analytics.aggregate(query)
+    records = cached_aggregation(
+        'activity_last_7_days',
+        lambda: [format_dict(r) for r in filtered_analytics.aggregate(query)],
+        date_start=date_start, date_end=date_end)
 
-    return HttpResponse(json.dumps([format_dict(r) for r in records]))
+    return HttpResponse(json.dumps(records))
 
 
 @requires("view analytics")
@@ -140,9 +150,11 @@ def campaign_percentages(request):
         {'$sort': {'_id': 1}}
     ]
 
-    records = filtered_analytics.aggregate(query)
+    records = cached_aggregation(
+        'campaign_percentages',
+        lambda: [format_dict(r) for r in filtered_analytics.aggregate(query)])
 
-    return HttpResponse(json.dumps([format_dict(r) for r in records]))
+    return HttpResponse(json.dumps(records))
 
 
 def format_return_dict(record, group_label):
@@ -359,6 +371,51 @@ def get_analytics_reporttype_datatype(analytics_report_id):
     return report_data
 
 
+def sampled_group_records(collection, query_data, date_start, date_end,
+                          buids, group_by, sample_size):
+    """
+    group the raw job view documents matching a request, sampling them if
+    there are more than sample_size
+
+    :param collection: the collection we're targeting (job_views typically)
+    :param query_data: data from the request
+    :param date_start: start of the date range
+    :param date_end: end of the date range
+    :param buids: BUIDs from the current company
+    :param group_by: column by which to group data/get counts
+    :param sample_size: how large the sample should be (count cut off)
+    :return: grouped records, adjusted for sampling if needed
+
+
+    """
+    top_query = build_top_query(date_start, date_end, buids)
+
+    sample_query, total_count = retrieve_sampling_query_and_count(collection,
+                                                                  top_query,
+                                                                  sample_size)
+
+    if not sample_query:
+        sample_size = total_count
+
+    active_filter_query = build_active_filter_query(query_data)
+
+    group_query = build_group_by_query(group_by.column_name)
+
+    query = [
+        {'$match': top_query},
+    ] + sample_query + active_filter_query + group_query
+
+    records = collection.aggregate(query, allowDiskUse=True)
+
+    if sample_query:
+        def curried_query(count):
+            return calculate_error_and_count(total_count, sample_size, count)
+
+        records = adjust_records_for_sampling(records, curried_query)
+
+    return records
+
+
 @requires("view analytics")
 @csrf_exempt
 def dynamic_chart(request):
@@ -441,36 +498,31 @@ def dynamic_chart(request):
 
     sample_size = 50000 # TODO: Add sample size to request object
 
-    job_views = get_mongo_db().job_views
+    mongo_db = get_mongo_db()
+    job_views = mongo_db.job_views
 
     buids = get_company_buids(request)
 
-    top_query = build_top_query(date_start, date_end, buids)
-
-    sample_query, total_count = retrieve_sampling_query_and_count(job_views,
-                                                                  top_query,
-                                                                  sample_size)
-
-    if not sample_query:
-        sample_size = total_count
-
-    active_filter_query = build_active_filter_query(query_data)
-
     group_by = determine_data_group_by_column(query_data, report_data)
 
-    group_query = build_group_by_query(group_by.column_name)
-
-    query = [
-        {'$match': top_query},
-    ] + sample_query + active_filter_query + group_query
-
-    records = job_views.aggregate(query, allowDiskUse=True)
-
-    if sample_query:
-        def curried_query(count):
-            return calculate_error_and_count(total_count, sample_size, count)
-
-        records = adjust_records_for_sampling(records, curried_query)
+    def group_records():
+        records = None
+        if not query_data.get('active_filters'):
+            # Rollups are kept per dimension, so they can only answer
+            # requests that don't filter on another dimension.
+            records = rollup_group_records(mongo_db, date_start, date_end,
+                                           group_by.column_name, buids)
+
+        if records is None:
+            records = sampled_group_records(job_views, query_data,
+                                            date_start, date_end, buids,
+                                            group_by, sample_size)
+        return list(records)
+
+    records = cached_aggregation(
+        'dynamic_chart', group_records, buids=buids, date_start=date_start,
+        date_end=date_end, active_filters=query_data.get('active_filters'),
+        group_by=group_by.column_name)
 
     response = {
         "column_names":
@@ -487,6 +539,21 @@ def dynamic_chart(request):
     return HttpResponse(json.dumps(response))
 
 
+@requires("view analytics")
+def get_cache_stats(request):
+    """
+    retrieve hit, miss and wait counts for the analytics result cache
+
+    {
+        'hits': 1021,
+        'misses': 87,
+        'waits': 3,
+    }
+    """
+    return HttpResponse(json.dumps(cache_stats()),
+                        content_type="application/json")
+
+
 @requires("view analytics")
 def get_available_analytics(request):
     """Get a list of available analytics reports.
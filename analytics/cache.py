@@ -0,0 +1,153 @@
+"""
+Caching for the analytics API's Mongo aggregations.
+
+Results are cached in the Django cache under a fingerprint of everything
+that determines them: the endpoint, the company's buids, the date range
+(truncated to the hour), the active filters and the group by column. Ranges
+that reach into the last few hours change as logs land and are cached
+briefly; older ranges are effectively static and are cached for longer.
+
+Only one process computes a given result at a time. Other requests for the
+same result wait for it to land in the cache rather than running the same
+aggregation concurrently.
+
+"""
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+
+KEY_PREFIX = 'analytics-api'
+
+# (age of the end of the date range, seconds to cache), checked in order.
+TTLS = [
+    (timedelta(hours=1), 60),
+    (timedelta(days=1), 5 * 60),
+    (timedelta(days=7), 60 * 60),
+]
+MAX_TTL = 24 * 60 * 60
+
+# How long a request waits for another to compute the result it needs
+# before computing it itself.
+WAIT_SECONDS = 30
+POLL_SECONDS = 0.1
+
+COUNTERS = ('hits', 'misses', 'waits')
+
+
+def truncate_to_hour(value):
+    if value is None:
+        return None
+    return value.replace(minute=0, second=0, microsecond=0).isoformat()
+
+
+def request_fingerprint(endpoint, buids=None, date_start=None, date_end=None,
+                        active_filters=None, group_by=None):
+    """
+    Builds the cache key for an analytics result.
+
+    :param endpoint: name of the API endpoint
+    :param buids: buids the result is scoped to
+    :param date_start: start of the date range
+    :param date_end: end of the date range
+    :param active_filters: list of {'type': ..., 'value': ...} filters
+    :param group_by: column the result is grouped by
+    :return: cache key
+
+    """
+    filters = sorted((f.get('type'), f.get('value'))
+                     for f in active_filters or [])
+    fingerprint = json.dumps({
+        'buids': sorted(buids or []),
+        'date_start': truncate_to_hour(date_start),
+        'date_end': truncate_to_hour(date_end),
+        'active_filters': filters,
+        'group_by': group_by,
+    }, sort_keys=True)
+    # A hash keeps keys under memcache's 250 character limit.
+    return "%s::%s::%s" % (KEY_PREFIX, endpoint,
+                           hashlib.md5(fingerprint).hexdigest())
+
+
+def ttl_for(date_end):
+    """
+    Returns how long to cache a result for a date range ending at date_end.
+
+    """
+    if date_end is None:
+        return TTLS[0][1]
+    now = datetime.now(date_end.tzinfo)
+    for age, ttl in TTLS:
+        if date_end > now - age:
+            return ttl
+    return MAX_TTL
+
+
+def count(counter):
+    key = '%s::stats::%s' % (KEY_PREFIX, counter)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr; losing one count is fine.
+        pass
+
+
+def cache_stats():
+    """Returns the hit, miss and wait counters as a dictionary."""
+    keys = dict(('%s::stats::%s' % (KEY_PREFIX, counter), counter)
+                for counter in COUNTERS)
+    values = cache.get_many(keys.keys())
+    return dict((counter, values.get(key, 0))
+                for key, counter in keys.iteritems())
+
+
+def cached_result(key, compute, ttl):
+    """
+    Returns the result cached under key, calling compute() to produce and
+    cache it if there isn't one. compute() must return a JSON serializable
+    value other than None.
+
+    """
+    result = cache.get(key)
+    if result is not None:
+        count('hits')
+        return result
+    count('misses')
+
+    lock = key + '::lock'
+    if not cache.add(lock, 1, WAIT_SECONDS):
+        # Someone else is computing this result; wait for it.
+        count('waits')
+        deadline = time.time() + WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(POLL_SECONDS)
+            result = cache.get(key)
+            if result is not None:
+                return result
+            if cache.get(lock) is None:
+                break
+        result = compute()
+        cache.set(key, result, ttl)
+        return result
+
+    try:
+        result = compute()
+        cache.set(key, result, ttl)
+    finally:
+        cache.delete(lock)
+    return result
+
+
+def cached_aggregation(endpoint, compute, buids=None, date_start=None,
+                       date_end=None, active_filters=None, group_by=None):
+    """
+    Composed method for caching an analytics API result; accepts the
+    arguments of request_fingerprint and returns the result of compute().
+
+    """
+    key = request_fingerprint(endpoint, buids, date_start, date_end,
+                              active_filters, group_by)
+    return cached_result(key, compute, ttl_for(date_end))
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+from optparse import make_option
+
+from dateutil import parser as dateparser
+from django.core.management.base import BaseCommand
+
+from analytics.api import get_mongo_db
+from analytics.rollups import build_dirty_rollups, build_rollups
+
+
+class Command(BaseCommand):
+    help = """
+           Rebuilds the daily job_views rollups used by the analytics charts:
+           every day marked dirty by a log batch, then the last two days (by
+           default). Run this as log batches land.
+           """
+    option_list = BaseCommand.option_list + (
+        make_option('--days', type='int', default=2,
+                    help='Number of days, ending today, to rebuild.'),
+        make_option('--start', default=None,
+                    help='First day to rebuild; overrides --days.'),
+        make_option('--end', default=None,
+                    help='Last day to rebuild. Defaults to today.'),
+    )
+
+    def handle(self, *args, **options):
+        date_end = datetime.utcnow()
+        if options['end']:
+            date_end = dateparser.parse(options['end'])
+        date_start = date_end - timedelta(days=options['days'] - 1)
+        if options['start']:
+            date_start = dateparser.parse(options['start'])
+
+        db = get_mongo_db()
+        days, written = build_dirty_rollups(db)
+        self.stdout.write("Wrote %s rollups for %s dirty days" % (
+            written, len(days)))
+
+        written = build_rollups(db, date_start, date_end)
+        self.stdout.write("Wrote %s rollups for %s through %s" % (
+            written, date_start.date(), date_end.date()))
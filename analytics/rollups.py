@@ -0,0 +1,244 @@
+"""
+Daily rollups of the job_views collection.
+
+For each day, business unit and analytics dimension (every ConfigurationColumn
+of a web analytics report), the job_view_rollups collection holds the number
+of visitors and job views for each value of that dimension:
+
+    {'day': datetime(2016, 1, 1), 'buid': 1, 'dimension': 'country',
+     'value': 'USA', 'visitors': 1050, 'job_views': 1201}
+
+Days are rebuilt from job_views as a whole, so rebuilding is idempotent.
+Built days are recorded in job_view_rollup_days, and only those are ever
+read from the rollups. When a batch of log lines lands, the days it covers
+are marked dirty with `mark_days_dirty`: their rollups stop being read at
+once, and `rollup_job_views` rebuilds them on its next run, along with the
+most recent days.
+
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+
+def rollup_dimensions():
+    """
+    Returns the set of job_views columns used by web analytics reports.
+
+    """
+    # Imported here so that log loaders can mark days dirty without
+    # setting up Django.
+    from myreports.models import ConfigurationColumn, ReportType
+
+    report_types = ReportType.objects.filter(
+        reportingtypereporttypes__reporting_type__reporting_type=(
+            "web-analytics"))
+    return set(ConfigurationColumn.objects.filter(
+        configuration__reporttypedatatypes__report_type__in=report_types
+    ).values_list('column_name', flat=True))
+
+
+def day_of(value):
+    """Returns midnight of the day containing `value`."""
+    return datetime.combine(value.date(), time())
+
+
+def build_day_rollups(db, day, dimensions=None):
+    """
+    Rebuilds the rollups for one day from job_views.
+
+    :param db: the analytics mongo database
+    :param day: the day to rebuild; any time of day is ignored
+    :param dimensions: job_views columns to roll up; defaults to
+        rollup_dimensions()
+    :return: the number of rollup documents written
+
+    """
+    day = day_of(day)
+    if dimensions is None:
+        dimensions = rollup_dimensions()
+
+    # Readers ignore the day while it is being rebuilt.
+    db.job_view_rollup_days.delete_one({'_id': day})
+    db.job_view_rollups.delete_many({'day': day})
+
+    match = {'$match': {'time_first_viewed': {'$gte': day,
+                                              '$lt': day + timedelta(days=1)}}}
+    written = 0
+    for dimension in dimensions:
+        records = db.job_views.aggregate([
+            match,
+            {'$group': {'_id': {'buid': '$buid', 'value': '$' + dimension},
+                        'visitors': {'$sum': 1},
+                        'job_views': {'$sum': '$view_count'}}},
+        ], allowDiskUse=True)
+        rollups = [{'day': day,
+                    'buid': record['_id'].get('buid'),
+                    'dimension': dimension,
+                    'value': record['_id'].get('value'),
+                    'visitors': record['visitors'],
+                    'job_views': record['job_views']}
+                   for record in records]
+        if rollups:
+            db.job_view_rollups.insert_many(rollups)
+            written += len(rollups)
+
+    if db.job_view_rollup_dirty.find_one({'_id': day}) is None:
+        # A day marked dirty while it was being rebuilt is left unbuilt
+        # until the next run.
+        db.job_view_rollup_days.replace_one(
+            {'_id': day}, {'_id': day, 'built': datetime.utcnow(),
+                           'dimensions': sorted(dimensions)},
+            upsert=True)
+    return written
+
+
+def build_rollups(db, date_start, date_end, dimensions=None):
+    """
+    Rebuilds the rollups for every day from date_start to date_end,
+    inclusive.
+
+    :return: the number of rollup documents written
+
+    """
+    if dimensions is None:
+        dimensions = rollup_dimensions()
+    day, last_day = day_of(date_start), day_of(date_end)
+    written = 0
+    while day <= last_day:
+        written += build_day_rollups(db, day, dimensions)
+        day += timedelta(days=1)
+    return written
+
+
+def mark_days_dirty(db, days):
+    """
+    Records that job_views may have changed for `days` since they were
+    rolled up. Their rollups stop being read straight away, and the days are
+    rebuilt by `build_dirty_rollups`.
+
+    :param db: the analytics mongo database
+    :param days: datetimes within the days to mark
+
+    """
+    days = sorted(set(day_of(day) for day in days))
+    if not days:
+        return
+    marked = datetime.utcnow()
+    for day in days:
+        db.job_view_rollup_dirty.replace_one(
+            {'_id': day}, {'_id': day, 'marked': marked}, upsert=True)
+    db.job_view_rollup_days.delete_many({'_id': {'$in': days}})
+
+
+def build_dirty_rollups(db, dimensions=None):
+    """
+    Rebuilds the rollups for every day marked dirty.
+
+    :return: the days rebuilt and the number of rollup documents written
+
+    """
+    if dimensions is None:
+        dimensions = rollup_dimensions()
+    days = sorted(record['_id'] for record in
+                  db.job_view_rollup_dirty.find({}, {'_id': 1}))
+    written = 0
+    for day in days:
+        # Unmarked first, so that a batch landing mid-rebuild marks the day
+        # dirty again.
+        db.job_view_rollup_dirty.delete_one({'_id': day})
+        written += build_day_rollups(db, day, dimensions)
+    return days, written
+
+
+def split_by_rollup_days(db, date_start, date_end, dimension):
+    """
+    Splits the inclusive range date_start - date_end into the whole days
+    with rollups for `dimension` and the ranges that must be read from
+    job_views.
+
+    :return: built days (list) and raw ranges (list of (start, end) tuples
+        where start is inclusive and end is exclusive, except for a range
+        ending at date_end, which is inclusive)
+
+    """
+    first_day = day_of(date_start)
+    if first_day < date_start:
+        first_day += timedelta(days=1)
+    # Only days which end strictly before date_end are whole.
+    last_day = day_of(date_end) - timedelta(days=1)
+    built = set()
+    if first_day <= last_day:
+        built = set(record['_id'] for record in db.job_view_rollup_days.find(
+            {'_id': {'$gte': first_day, '$lte': last_day},
+             'dimensions': dimension}, {'_id': 1}))
+
+    days, ranges = [], []
+    raw_start = date_start
+    day = first_day
+    while day <= last_day:
+        if day in built:
+            if raw_start < day:
+                ranges.append((raw_start, day))
+            days.append(day)
+            raw_start = day + timedelta(days=1)
+        day += timedelta(days=1)
+    if raw_start <= date_end:
+        ranges.append((raw_start, date_end))
+    return days, ranges
+
+
+def rollup_group_records(db, date_start, date_end, group_by, buids=None,
+                         limit=10):
+    """
+    Counts visitors and job views by the values of `group_by`, reading
+    whole days from the rollups and anything else from job_views.
+
+    Returns None when no day in the range has been rolled up, in which case
+    the caller is better served by querying job_views directly.
+
+    :return: records shaped like those of the job_views $group in
+        analytics.api.build_group_by_query, or None
+
+    """
+    if date_start.tzinfo or date_end.tzinfo:
+        # Rollup days are naive, as are the dates job_views are stored with.
+        return None
+    days, ranges = split_by_rollup_days(db, date_start, date_end, group_by)
+    if not days:
+        return None
+
+    buid_match = {}
+    if buids:
+        buid_match = {'buid': {'$in': buids} if len(buids) > 1 else buids[0]}
+
+    totals = defaultdict(lambda: [0, 0])
+
+    rollup_match = {'day': {'$in': days}, 'dimension': group_by}
+    rollup_match.update(buid_match)
+    for record in db.job_view_rollups.aggregate([
+            {'$match': rollup_match},
+            {'$group': {'_id': '$value',
+                        'visitors': {'$sum': '$visitors'},
+                        'job_views': {'$sum': '$job_views'}}}]):
+        counts = totals[record['_id']]
+        counts[0] += record['visitors']
+        counts[1] += record['job_views']
+
+    for start, end in ranges:
+        raw_match = dict(buid_match)
+        end_operator = '$lte' if end == date_end else '$lt'
+        raw_match['time_first_viewed'] = {'$gte': start, end_operator: end}
+        for record in db.job_views.aggregate([
+                {'$match': raw_match},
+                {'$group': {'_id': '$' + group_by,
+                            'visitors': {'$sum': 1},
+                            'job_views': {'$sum': '$view_count'}}}],
+                allowDiskUse=True):
+            counts = totals[record['_id']]
+            counts[0] += record['visitors']
+            counts[1] += record['job_views']
+
+    records = [{'_id': value, 'visitors': visitors, 'job_views': job_views}
+               for value, (visitors, job_views) in totals.iteritems()]
+    records.sort(key=lambda record: record['visitors'], reverse=True)
+    return records[:limit]
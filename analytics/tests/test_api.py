@@ -1,4 +1,5 @@
 import json
+from datetime import datetime
 
 from myjobs.tests.setup import MyJobsBase
 import myreports.models as myreports_models
@@ -6,7 +7,11 @@ import myreports.models as myreports_models
 from django.core.urlresolvers import reverse
 
 from analytics.api import (get_available_analytics, get_report_info,
-                           dynamic_chart)
+                           dynamic_chart, get_mongo_db)
+from analytics.cache import cache_stats, cached_result, request_fingerprint
+from analytics.rollups import (build_day_rollups, build_dirty_rollups,
+                               mark_days_dirty, rollup_dimensions,
+                               rollup_group_records)
 
 
 class TestStartingPointApi(MyJobsBase):
@@ -332,4 +337,108 @@ class TestStartingPointApi(MyJobsBase):
         result = json.loads(response.content)
         self.assertEqual(400, response.status_code)
         message = result[0]['message']
-        self.assertEqual(message, 'No data provided.')
\ No newline at end of file
+        self.assertEqual(message, 'No data provided.')
+
+    def test_rollup_dimensions(self):
+        self.assertEqual(rollup_dimensions(),
+                         set(['title', 'job_guid', 'country', 'state',
+                              'city', 'found_on']))
+
+    def test_rollups_combined_with_raw_job_views(self):
+        db = get_mongo_db()
+        db.job_views.insert_many([
+            {'buid': 1, 'country': 'USA', 'view_count': 2,
+             'time_first_viewed': datetime(2016, 1, 1, 18)},
+            {'buid': 1, 'country': 'CAN', 'view_count': 1,
+             'time_first_viewed': datetime(2016, 1, 1, 20)},
+            {'buid': 1, 'country': 'USA', 'view_count': 1,
+             'time_first_viewed': datetime(2016, 1, 2, 9)},
+            {'buid': 1, 'country': 'CAN', 'view_count': 3,
+             'time_first_viewed': datetime(2016, 1, 2, 10)},
+            {'buid': 2, 'country': 'CAN', 'view_count': 5,
+             'time_first_viewed': datetime(2016, 1, 2, 11)},
+            {'buid': 1, 'country': 'CAN', 'view_count': 1,
+             'time_first_viewed': datetime(2016, 1, 3, 6)},
+            # Outside of the requested range.
+            {'buid': 1, 'country': 'USA', 'view_count': 1,
+             'time_first_viewed': datetime(2016, 1, 3, 18)},
+        ])
+
+        # Nothing is rolled up yet.
+        self.assertIsNone(rollup_group_records(
+            db, datetime(2016, 1, 1, 12), datetime(2016, 1, 3, 12),
+            'country', [1]))
+
+        build_day_rollups(db, datetime(2016, 1, 2), ['country'])
+        # Whole days that are rolled up are no longer read from job_views;
+        # the rest of the range still is.
+        db.job_views.delete_many({'time_first_viewed': {
+            '$gte': datetime(2016, 1, 2), '$lt': datetime(2016, 1, 3)}})
+
+        records = rollup_group_records(
+            db, datetime(2016, 1, 1, 12), datetime(2016, 1, 3, 12),
+            'country', [1])
+        self.assertEqual(records, [
+            {'_id': 'CAN', 'visitors': 3, 'job_views': 5},
+            {'_id': 'USA', 'visitors': 2, 'job_views': 3},
+        ])
+
+    def test_dirty_days_read_from_job_views(self):
+        """
+        A day marked dirty by a log batch is read from job_views until it
+        is rebuilt.
+
+        """
+        db = get_mongo_db()
+        db.job_views.insert_one(
+            {'buid': 1, 'country': 'USA', 'view_count': 1,
+             'time_first_viewed': datetime(2016, 1, 2, 9)})
+        build_day_rollups(db, datetime(2016, 1, 2), ['country'])
+        db.job_views.insert_one(
+            {'buid': 1, 'country': 'CAN', 'view_count': 2,
+             'time_first_viewed': datetime(2016, 1, 2, 10)})
+        args = (db, datetime(2016, 1, 2), datetime(2016, 1, 3), 'country',
+                [1])
+        self.assertEqual(len(rollup_group_records(*args)), 1)
+
+        mark_days_dirty(db, [datetime(2016, 1, 2, 10, 30)])
+        self.assertIsNone(rollup_group_records(*args))
+
+        days, _ = build_dirty_rollups(db, ['country'])
+        self.assertEqual(days, [datetime(2016, 1, 2)])
+        self.assertItemsEqual(rollup_group_records(*args), [
+            {'_id': 'USA', 'visitors': 1, 'job_views': 1},
+            {'_id': 'CAN', 'visitors': 1, 'job_views': 2},
+        ])
+        self.assertEqual(build_dirty_rollups(db, ['country']), ([], 0))
+
+    def test_request_fingerprint_normalized(self):
+        key = request_fingerprint(
+            'dynamic_chart', [2, 1], datetime(2016, 1, 1, 10, 15),
+            datetime(2016, 1, 2, 10, 59),
+            [{'type': 'state', 'value': 'Indiana'},
+             {'type': 'country', 'value': 'USA'}], 'city')
+        self.assertEqual(key, request_fingerprint(
+            'dynamic_chart', [1, 2], datetime(2016, 1, 1, 10),
+            datetime(2016, 1, 2, 10, 30),
+            [{'type': 'country', 'value': 'USA'},
+             {'type': 'state', 'value': 'Indiana'}], 'city'))
+        self.assertNotEqual(key, request_fingerprint(
+            'dynamic_chart', [1, 2], datetime(2016, 1, 1, 10),
+            datetime(2016, 1, 2, 10, 30),
+            [{'type': 'country', 'value': 'USA'}], 'city'))
+
+    def test_cached_result(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return [{'_id': 'USA', 'visitors': 1, 'job_views': 2}]
+
+        stats = cache_stats()
+        key = request_fingerprint('test_cached_result')
+        first = cached_result(key, compute, 60)
+        self.assertEqual(cached_result(key, compute, 60), first)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache_stats()['hits'], stats['hits'] + 1)
+        self.assertEqual(cache_stats()['misses'], stats['misses'] + 1)
@@ -0,0 +1,112 @@
+import threading
+
+from unittest import TestCase
+
+from analytics_logpipe import KinesisShipper
+
+
+class FakeKinesis(object):
+    """
+    Stands in for a boto3 kinesis client, recording the data of each
+    put_records call. Queued responses are returned (or raised) in order;
+    once they run out every record is accepted.
+
+    """
+    def __init__(self, responses=None):
+        self.calls = []
+        self.responses = list(responses or [])
+        self.called = threading.Event()
+
+    def put_records(self, StreamName, Records):
+        self.calls.append([record['Data'] for record in Records])
+        self.called.set()
+        if self.responses:
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return {'FailedRecordCount': 0,
+                'Records': [{'SequenceNumber': '1', 'ShardId': 'shard-0'}
+                            for _ in Records]}
+
+
+class KinesisShipperTest(TestCase):
+    def shipper(self, kinesis, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        return KinesisShipper(kinesis, 'stream', sleep=lambda seconds: None,
+                              **kwargs)
+
+    def test_batches_split_by_record_count(self):
+        kinesis = FakeKinesis()
+        shipper = self.shipper(kinesis, max_records=2)
+        for i in range(5):
+            shipper.put(str(i), 'key')
+        shipper.close()
+
+        self.assertEqual(kinesis.calls, [['0', '1'], ['2', '3'], ['4']])
+        self.assertEqual(shipper.sent, 5)
+
+    def test_batches_split_by_size(self):
+        """Data and partition keys both count towards max_bytes."""
+        kinesis = FakeKinesis()
+        shipper = self.shipper(kinesis, max_bytes=10)
+        for data in ['aaaa', 'bbbb', 'cccc']:
+            shipper.put(data, 'k')
+        shipper.close()
+
+        self.assertEqual(kinesis.calls, [['aaaa', 'bbbb'], ['cccc']])
+
+    def test_only_failed_records_retried(self):
+        kinesis = FakeKinesis([{
+            'FailedRecordCount': 2,
+            'Records': [
+                {'SequenceNumber': '1', 'ShardId': 'shard-0'},
+                {'ErrorCode': 'ProvisionedThroughputExceededException',
+                 'ErrorMessage': 'Rate exceeded'},
+                {'ErrorCode': 'InternalFailure',
+                 'ErrorMessage': 'Internal failure'},
+            ]}])
+        shipper = self.shipper(kinesis)
+        for data in ['a', 'b', 'c']:
+            shipper.put(data, 'key')
+        shipper.close()
+
+        self.assertEqual(kinesis.calls, [['a', 'b', 'c'], ['b', 'c']])
+        self.assertEqual((shipper.sent, shipper.failed), (3, 0))
+
+    def test_flushes_after_interval(self):
+        """A batch that never fills is sent once flush_interval passes."""
+        kinesis = FakeKinesis()
+        shipper = self.shipper(kinesis, flush_interval=0.01)
+        shipper.put('a', 'key')
+
+        self.assertTrue(kinesis.called.wait(5))
+        self.assertEqual(kinesis.calls, [['a']])
+        shipper.close()
+        self.assertEqual(kinesis.calls, [['a']])
+
+    def test_close_ships_queued_records(self):
+        kinesis = FakeKinesis()
+        shipper = self.shipper(kinesis)
+        for data in ['a', 'b', 'c']:
+            shipper.put(data, None)
+        shipper.close()
+
+        self.assertEqual(kinesis.calls, [['a', 'b', 'c']])
+        self.assertEqual(shipper.sent, 3)
+        self.assertFalse(shipper.thread.is_alive())
+
+    def test_unexpected_errors_do_not_stop_flusher(self):
+        """
+        A malformed response or a client bug drops that batch, but later
+        records are still shipped and close() returns.
+
+        """
+        kinesis = FakeKinesis([{}, TypeError('bad call')])
+        shipper = self.shipper(kinesis, max_records=1, max_queued=1)
+        for data in ['a', 'b', 'c', 'd']:
+            shipper.put(data, 'key')
+        shipper.close()
+
+        self.assertEqual(kinesis.calls, [['a'], ['b'], ['c'], ['d']])
+        self.assertEqual((shipper.sent, shipper.failed), (2, 2))
@@ -13,6 +13,7 @@ api_patterns = patterns(
     url(r'^campaign-percent', 'campaign_percentages',
         name='campaign_percentages'),
     url(r'^dynamic', 'dynamic_chart', name='dynamic_chart'),
+    url(r'^cache-stats', 'get_cache_stats', name='get_cache_stats'),
 )
 
 # View URLs
@@ -1,63 +1,178 @@
 #!/usr/bin/env python2
 import sys
+import hashlib
 import json
 import boto3
+import Queue
+import threading
 import time
-from botocore.exceptions import ClientError
+import traceback
+from botocore.exceptions import BotoCoreError, ClientError
 
 import secrets
 
 
-def process_lines(kinesis, lines):
+class KinesisShipper(object):
+    """Ship records to AWS Kinesis in batched PutRecords calls.
+
+    kinesis: AWS kinesis API client; anything with a boto3 style
+        put_records method will do.
+    stream_name: Kinesis stream to write to.
+    max_records: Most records sent in one PutRecords call (AWS limit 500).
+    max_bytes: Most data and partition key bytes in one call (AWS limit 5MB).
+    max_queued: Most records held in memory; put() blocks when the queue is
+        full, pushing back on whatever is feeding us.
+    flush_interval: Seconds a record may wait for its batch to fill.
+    max_attempts: Times a record is sent before it is given up on.
+
+    Records are packed into batches by a background thread. Only the
+    entries Kinesis rejects are retried, with an exponential backoff that
+    holds up the flusher but not the reader until the queue fills.
+    """
+    retry_codes = (u'ProvisionedThroughputExceededException',
+                   u'InternalFailure')
+
+    def __init__(self, kinesis, stream_name, max_records=500,
+                 max_bytes=5 * 1024 * 1024, max_queued=10000,
+                 flush_interval=1.0, max_attempts=7, sleep=time.sleep):
+        self.kinesis = kinesis
+        self.stream_name = stream_name
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+        self.sent = self.failed = 0
+        self.queue = Queue.Queue(max_queued)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, data, partition_key):
+        """Queue one record, blocking while the queue is full."""
+        if not partition_key:
+            # Spread records without a key evenly over the shards.
+            partition_key = hashlib.md5(data).hexdigest()
+        self.queue.put({'Data': data, 'PartitionKey': partition_key})
+
+    def close(self):
+        """Ship everything queued so far and stop the flusher."""
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch, size = [], 0
+            deadline = None
+            while len(batch) < self.max_records:
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        break
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except Queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                record_size = len(record['Data']) + len(record['PartitionKey'])
+                if batch and size + record_size > self.max_bytes:
+                    self.ship(batch)
+                    batch, size = [], 0
+                batch.append(record)
+                size += record_size
+                if deadline is None:
+                    deadline = time.time() + self.flush_interval
+            if batch:
+                self.ship(batch)
+
+    def ship(self, records):
+        """Send a batch, keeping the flusher alive whatever goes wrong.
+
+        If the flusher thread died nothing would drain the queue, and put()
+        and close() would block forever, so a batch that fails unexpectedly
+        is counted as failed and dropped.
+        """
+        try:
+            self.send(records)
+        except Exception:
+            self.failed += len(records)
+            traceback.print_exc(file=sys.stderr)
+            print >>sys.stderr, "Dropped %d records" % len(records)
+
+    def send(self, records):
+        """Send records, retrying only those Kinesis did not accept."""
+        for attempts in xrange(1, self.max_attempts + 1):
+            try:
+                result = self.kinesis.put_records(
+                    StreamName=self.stream_name, Records=records)
+            except (BotoCoreError, ClientError) as e:
+                print >>sys.stderr, "Attempt: %d" % attempts, str(e)
+            else:
+                retry = []
+                for record, entry in zip(records, result['Records']):
+                    error_code = entry.get('ErrorCode')
+                    if error_code is None:
+                        self.sent += 1
+                    elif error_code in self.retry_codes:
+                        retry.append(record)
+                    else:
+                        self.failed += 1
+                        print >>sys.stderr, repr(entry)
+                if not retry:
+                    return
+                print >>sys.stderr, "Attempt: %d, %d of %d records failed" % (
+                    attempts, len(retry), len(records))
+                records = retry
+            self.sleep(min(0.1 * 2 ** attempts, 10))
+        self.failed += len(records)
+        print >>sys.stderr, "Giving up on %d records" % len(records)
+
+
+_STOP = object()
+
+
+def process_lines(kinesis, lines, shipper=None):
     """Read log lines and send them to AWS Kinesis.
 
     kinesis: AWS kinesis API client
     lines: iterable over log lines.
+    shipper: KinesisShipper to send records with; one is created for
+        `kinesis` if not given. It is closed once lines are exhausted.
 
     Runs string unescaping and parses line to get an ip for the partition key.
 
     Also converts some string values to ints.
     """
-    for line in lines:
-        # Strip of the string escaping.
-        data = line.decode('string_escape')
-
-        # Parse the json or give up.
-        parsed = None
-        try:
-            parsed = json.loads(data)
-        except ValueError:
-            continue
-
-        # Give up if we are looking at something wierd. i.e. "-"
-        if not isinstance(parsed, dict):
-            continue
+    if shipper is None:
+        shipper = KinesisShipper(kinesis, secrets.LOG_TO_STREAM)
+    try:
+        for line in lines:
+            # Strip of the string escaping.
+            data = line.decode('string_escape')
+
+            # Parse the json or give up.
+            parsed = None
+            try:
+                parsed = json.loads(data)
+            except ValueError:
+                continue
 
-        partition_key = parsed.get('ip')
+            # Give up if we are looking at something wierd. i.e. "-"
+            if not isinstance(parsed, dict):
+                continue
 
-        # Convert some strings to ints, etc.
-        massaged = massage_log_line(parsed)
+            partition_key = parsed.get('ip')
 
-        data = json.dumps(massaged)
+            # Convert some strings to ints, etc.
+            massaged = massage_log_line(parsed)
 
-        needs_resend = u'ProvisionedThroughputExceededException'
-        for attempts in xrange(1, 8):
-            try:
-                result = kinesis.put_record(
-                    StreamName=secrets.LOG_TO_STREAM,
-                    Data=data,
-                    PartitionKey=partition_key)
-                error_code = result.get('ErrorCode')
-                if error_code is None:
-                    break
-                elif error_code == needs_resend:
-                    print >>sys.stderr, "Attempt: %d" % attempts, repr(result)
-                    time.sleep(2 ** attempts)
-                    continue
-                else:
-                    print >>sys.stderr, repr(result)
-            except ClientError as e:
-                print >>sys.stderr, e.message
+            shipper.put(json.dumps(massaged), partition_key)
+    finally:
+        shipper.close()
 
 
 def massage_log_line(json_line):
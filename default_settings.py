@@ -59,6 +59,12 @@ USE_L10N = True
 MEDIA_ROOT = os.path.join(_PATH, 'files', 'media')
 MEDIA_URL = '/files/media/'
 
+# Pre-rendered sitemaps, written daily by tasks.write_sitemaps. The tasks
+# run on the solr celery queue's workers and the pages are served by the web
+# servers, so this must be storage they all share (e.g. an NFS mount).
+# Sitemaps that weren't written today are counted in Solr instead.
+SITEMAP_ROOT = os.path.join(_PATH, 'files', 'sitemaps')
+
 STATIC_ROOT = os.path.join(_PATH, 'collected_static')
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (
@@ -150,6 +156,10 @@ CELERY_ROUTES = {
         'queue': 'solr',
         'routing_key': 'solr.update_solr'
     },
+    'tasks.task_update_solr_many': {
+        'queue': 'solr',
+        'routing_key': 'solr.update_solr'
+    },
     'tasks.task_clear_solr': {
         'queue': 'solr',
         'routing_key': 'solr.clear_solr'
@@ -174,6 +184,10 @@ CELERY_ROUTES = {
         'queue': 'myjobs',
         'routing_key': 'myjobs.send_search_digests'
     },
+    'tasks.send_search_digest_batch': {
+        'queue': 'myjobs',
+        'routing_key': 'myjobs.send_search_digest_batch'
+    },
     'tasks.delete_inactive_activations': {
         'queue': 'myjobs',
         'routing_key': 'myjobs.delete_inactive_activations',
@@ -190,6 +204,14 @@ CELERY_ROUTES = {
         'queue': 'myjobs',
         'routing_key': 'dseo.submit_all_sitemaps'
     },
+    'tasks.write_sitemaps': {
+        'queue': 'solr',
+        'routing_key': 'solr.write_sitemaps'
+    },
+    'tasks.write_site_sitemaps': {
+        'queue': 'solr',
+        'routing_key': 'solr.write_sitemaps'
+    },
     'tasks.send_event_email': {
         'queue': 'myemails',
         'routing_key': 'myemails.send_event_emails'
@@ -252,6 +274,10 @@ CELERYBEAT_SCHEDULE = {
         'task': 'tasks.expire_jobs',
         'schedule': crontab(minute=0, hour=0),
     },
+    'daily-sitemap-write': {
+        'task': 'tasks.write_sitemaps',
+        'schedule': crontab(minute=0, hour=1),
+    },
     'morning-sitemap-ping': {
         'task': 'tasks.submit_all_sitemaps',
         'schedule': crontab(hour=13, minute=0)
@@ -269,6 +295,9 @@ CELERYBEAT_SCHEDULE = {
         'schedule': crontab(hour=4, minute=3)
     }
 }
+# Number of digests or saved searches mailed by each
+# tasks.send_search_digest_batch task.
+SAVED_SEARCH_BATCH_SIZE = 100
 
 
 TEMPLATE_CONTEXT_PROCESSORS = (
@@ -3,7 +3,7 @@ import sys
 import urllib
 import datetime
 import logging
-from itertools import izip_longest, islice, chain
+from itertools import islice, chain
 import urllib2
 import base64
 import zipfile
@@ -17,12 +17,17 @@ from billiard import current_process
 
 from seo_pysolr import Solr
 from xmlparse import DEv2JobFeed
-from seo.helpers import slices, create_businessunit
+from seo.cache import bump_index_generation
+from seo.helpers import create_businessunit
+from moc_coding.cache import MocIndex
 from seo.models import BusinessUnit, Company
 from transform import hr_xml_to_json, make_redirect
 import re
 
-from import_jobs.solr import add_jobs, chunk, delete_by_guid
+from import_jobs.solr import (FINGERPRINT_FIELD, FingerprintMap, SolrWriter,
+                              UidSet, add_jobs, chunk, delete_by_guid,
+                              iter_documents, iter_field_values,
+                              job_fingerprint)
 
 logger = logging.getLogger(__name__)
 
@@ -52,7 +57,8 @@ def update_job_source(guid, buid, name):
     zf = get_jobsfs_zipfile(guid)
     jobs = get_jobs_from_zipfile(zf, guid)
     jobs = filter_current_jobs(jobs, bu)
-    jobs = (hr_xml_to_json(job, bu) for job in jobs)
+    moc_index = MocIndex()
+    jobs = (hr_xml_to_json(job, bu, moc_index) for job in jobs)
     jobs = (add_redirect(job, bu) for job in jobs)
 
     # AT&T Showed that large numbers of MOCs can cause import issues due to the size of documents.
@@ -256,7 +262,8 @@ def add_company(bu):
 
 
 def update_solr(buid, download=True, force=True, set_title=False,
-                delete_feed=True, data_dir=DATA_DIR, clear_cache=False):
+                delete_feed=True, data_dir=DATA_DIR, clear_cache=False,
+                filepath=None):
     """
     Update the Solr master index with the data contained in a feed file
     for a given buid/jsid.
@@ -269,13 +276,18 @@ def update_solr(buid, download=True, force=True, set_title=False,
     :download: Boolean. If False, this process will not download a new
     feedfile, but instead use the one on disk. Should only be false for
     the purposes of our test suite.
-    :force: Boolean. If True, every job seen in the feed file will be
+    :filepath: String. The path of an already downloaded feed file to
+    use. If given, no file is downloaded and ``download`` and ``data_dir``
+    are ignored.
+    :force: Boolean. If True, every job seen in the feed file whose
+    content fingerprint differs from the one stored in the index will be
     updated in the index. Otherwise, only the jobs seen in the feed file
     but not seen in the index will be updated. This latter option will
     soon be deprecated.
 
     Returns:
-    A 2-tuple consisting of the number of jobs added and the number deleted.
+    A 2-tuple consisting of the number of jobs added or updated and the
+    number deleted.
 
     Writes/Modifies:
     Job data found in the feed file is used to modify the Solr index. This
@@ -284,7 +296,9 @@ def update_solr(buid, download=True, force=True, set_title=False,
     the index, the equivalent of an update operation is performed.)
 
     """
-    if download:
+    if filepath is not None:
+        logging.info("BUID:%s - Using feed file %s" % (buid, filepath))
+    elif download:
         filepath = download_feed_file(buid, data_dir=data_dir)
     else:
         # Get current worker process id, to prevent race conditions.
@@ -301,7 +315,7 @@ def update_solr(buid, download=True, force=True, set_title=False,
     except IndexError:
         co = None
     jobfeed = DEv2JobFeed(filepath, jsid=buid, markdown=bu.enable_markdown,
-                          company=co)
+                          company=co, streaming=True)
     # If the feed file did not pass validation, return. The return value is
     # '(0, 0)' to match what's returned on a successful parse.
     if jobfeed.errors:
@@ -314,107 +328,81 @@ def update_solr(buid, download=True, force=True, set_title=False,
     # A dictionary of uids
     jobs = jobfeed.jobparse()
 
-    # Build a set of all the UIDs for all those instances.
-    job_uids = set([long(i.get('uid')) for i in jobs if i.get('uid')])
-    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
-    step1 = 1024
-
-    # Get the count of all the results in the Solr index for this BUID.
-    hits = conn.search("*:*", fq="buid:%s" % buid, facet="false",
-                       mlt="false").hits
-    # Create (start-index, stop-index) tuples to facilitate handling results
-    # in ``step1``-sized chunks. So if ``hits`` returns 2048 results,
-    # ``job_slices`` will look like ``[(0,1024), (1024, 2048)]``. Those
-    # values are then used to slice up the total results.
-    #
-    # This was put in place because part of the logic to figuring out what
-    # jobs to delete from and add jobs to the Solr index is using set
-    # algebra. We convert the total list of UIDs in the index and the UIDs
-    # in the XML feed to sets, then compare them via ``.difference()``
-    # (seen below). However for very large feed files, say 10,000+ jobs,
-    # this process was taking so long that the connection would time out. To
-    # address this problem we break up the comparisons as described above.
-    # This results in more requests but it alleviates the connection timeout
-    # issue.
-    job_slices = slices(range(hits), step=step1)
-    results = [_solr_results_chunk(tup, buid, step1) for tup in job_slices]
-    solr_uids = reduce(lambda x, y: x | y, results) if results else set()
+    # Build a compact set of all the UIDs for all those instances.
+    job_uids = UidSet(long(i.get('uid')) for i in jobs if i.get('uid'))
+
+    # Stream every UID currently in the Solr index for this BUID, along with
+    # the content fingerprint stored when it was indexed. This uses
+    # cursorMark paging and fetches only those two fields, so the cost of
+    # reading the index grows linearly with the number of jobs and the
+    # result takes up a few bytes per job.
+    indexed = iter_documents('uid,%s' % FINGERPRINT_FIELD,
+                             fq="buid:%s" % buid)
+    solr_uids = FingerprintMap((doc['uid'], doc.get(FINGERPRINT_FIELD))
+                               for doc in indexed if 'uid' in doc)
     # Return the job UIDs that are in the Solr index but not in the feed
     # file.
     solr_del_uids = solr_uids.difference(job_uids)
 
-    if not force:
-        # Return the job UIDs that are in the feed file but not in the Solr
-        # index.
-        solr_add_uids = job_uids.difference(solr_uids)
-        # ``jobfeed.solr_jobs()`` yields a list of dictionaries. We want to
-        # filter out any dictionaries whose "uid" key is not in
-        # ``solr_add_uids``. This is because by default we only want to add
-        # new documents (which each ``solr_jobs()`` dictionary represents),
-        # not update.
-        add_docs = filter(lambda x: int(x.get("uid", 0)) in solr_add_uids,
-                          jobfeed.solr_jobs())
-    else:
-        # This might seem redundant to refer to the same value
-        # twice with two different variable names. However, this decision
-        # was made during the implementation of the "force Solr update"
-        # feature to this function.
-        #
-        # Instead of adding only the documents with UIDs that are in the feed
-        # file but not in the Solr index, we're going to add ALL the documents
-        # in the feed file. This will add the new documents of course, but it
-        # will also update existing documents with any new data. Uniqueness of
-        # the documents is ensured by the ``id`` field defined in the Solr
-        # schema (the template for which can be seen in
-        # templates/search_configuration/solr.xml). At the very bottom you'll
-        # see <uniqueKey>id</uniqueKey>. This serves as the equivalent of the pk
-        # (i.e. globally unique) in a database.
-        solr_add_uids = job_uids
-        add_docs = jobfeed.solr_jobs()
-
-    # Slice up ``add_docs`` in chunks of 4096. This is because the
-    # maxBooleanClauses setting in solrconfig.xml is set to 4096. This means
-    # if we used any more than that Solr would throw an error and our
-    # updates wouldn't get processed.
-    add_steps = slices(range(len(solr_add_uids)), step=4096)
-    # Same concept as ``add_docs``.
-    del_steps = slices(range(len(solr_del_uids)), step=4096)
-    # Create a generator that yields 2-tuples with each invocation. The
-    # 2-tuples consist of one tuple each from del_steps & add_steps. Any
-    # mismatched values (e.g. there are more del_steps than add_steps)
-    # will be compensated for with the ``fillvalue``.
-    zipped_steps = izip_longest(del_steps, add_steps, fillvalue=(0, 0))
-
-    for tup in zipped_steps:
-        update_chunk = add_docs[tup[1][0]:tup[1][1] + 1]
-
-        if update_chunk:
-            logging.debug("BUID:%s - SOLR - Update chunk: %s" %
-                         (buid, [i['uid'] for i in update_chunk]))
-            # Pass 'commitWithin' so that Solr doesn't try to commit the new
-            # docs right away. This will help relieve some of the resource
-            # stress during the daily update. The value is expressed in
-            # milliseconds.
-            conn.add(update_chunk, commitWithin="30000")
-
-        delete_chunk = _build_solr_delete_query(
-            list(solr_del_uids)[tup[0][0]:tup[0][1] + 1])
-
-        if delete_chunk:
+    # Instead of adding only the documents with UIDs that are in the feed
+    # file but not in the Solr index, a forced update adds every document
+    # whose content has changed since it was last indexed. This will add the
+    # new documents of course, but it will also update existing documents
+    # with any new data, while skipping the (usually large) majority of
+    # documents that are byte-for-byte the same as yesterday. Uniqueness of
+    # the documents is ensured by the ``id`` field defined in the Solr
+    # schema (the template for which can be seen in
+    # templates/search_configuration/solr.xml). At the very bottom you'll
+    # see <uniqueKey>id</uniqueKey>. This serves as the equivalent of the pk
+    # (i.e. globally unique) in a database.
+    counts = {'new': 0, 'changed': 0, 'unchanged': 0,
+              'deleted': len(solr_del_uids)}
+    add_docs = _changed_docs(jobfeed.solr_jobs(), solr_uids, counts,
+                             new_only=not force)
+
+    # ``add_docs`` is streamed straight from the feed file into the writer,
+    # which keeps several /update requests in flight at once. Pass
+    # 'commitWithin' so that Solr doesn't try to commit the new docs right
+    # away. This will help relieve some of the resource stress during the
+    # daily update. The value is expressed in milliseconds. The deletes below
+    # can't be sent with commitWithin, so the writer still commits them, and
+    # with them the import, once when it is closed.
+    writer = SolrWriter(batch_size=4096, commit_within="30000", commit=False)
+    try:
+        writer.add(add_docs)
+
+        # Delete in chunks of 4096. This is because the maxBooleanClauses
+        # setting in solrconfig.xml is set to 4096. This means if we used
+        # any more than that Solr would throw an error and our updates
+        # wouldn't get processed.
+        for del_uids in chunk(solr_del_uids, 4096):
             # Post-a-job jobs should not be deleted during import
-            delete_chunk = "(%s) AND -is_posted:true" % delete_chunk
+            delete_chunk = "(%s) AND -is_posted:true" % (
+                _build_solr_delete_query(list(del_uids)))
             logging.debug("BUID:%s - SOLR - Delete chunk: %s" %
-                         (buid, list(solr_del_uids)))
-            conn.delete(q=delete_chunk)
+                          (buid, delete_chunk))
+            writer.delete(delete_chunk)
 
-    # delete any jobs that may have been added via etl_to_solr
-    conn.delete(q="buid:%s AND !uid:[0  TO *]" % buid)
+        # delete any jobs that may have been added via etl_to_solr
+        writer.delete("buid:%s AND !uid:[0  TO *]" % buid)
+    finally:
+        committed = writer.close()
+    logging.info("BUID:%s - SOLR - %s new, %s changed, %s unchanged, "
+                 "%s deleted." % (buid, counts['new'], counts['changed'],
+                                  counts['unchanged'], counts['deleted']))
 
     # Update business unit information: title, dates, and associated_jobs
     if set_title or not bu.title or (bu.title != jobfeed.job_source_name and
                                      jobfeed.job_source_name):
         bu.title = jobfeed.job_source_name
-    updated = bool(solr_add_uids) or bool(solr_del_uids)
+    num_added = counts['new'] + counts['changed']
+    updated = bool(num_added) or bool(solr_del_uids)
+    # Searches cached under the new generation must see this import, so
+    # only bump it once the import is committed. The generation is shared by
+    # every site: most feeds change daily and network sites search every
+    # business unit, so a per-business-unit generation would save little.
+    if updated and committed:
+        bump_index_generation()
     _update_business_unit_modified_dates(bu, jobfeed.crawled_date,
                                          updated=updated)
     bu.associated_jobs = len(jobs)
@@ -424,7 +412,35 @@ def update_solr(buid, download=True, force=True, set_title=False,
     if delete_feed:
         os.remove(filepath)
         logging.info("BUID:%s - Deleted feed file." % buid)
-    return len(solr_add_uids), len(solr_del_uids)
+    return num_added, len(solr_del_uids)
+
+
+def _changed_docs(docs, indexed, counts, new_only=False):
+    """
+    Stamps each solr-ready job in `docs` with its content fingerprint and
+    yields only the jobs that are new or have changed since they were
+    indexed.
+
+    Inputs:
+    :docs: An iterable of solr-ready jobs.
+    :indexed: A FingerprintMap of the uids and fingerprints in the index.
+    :counts: A dictionary whose 'new', 'changed' and 'unchanged' values
+    are incremented as jobs are seen.
+    :new_only: Boolean. If True, changed jobs are skipped as well.
+
+    """
+    for doc in docs:
+        fingerprint = job_fingerprint(doc)
+        doc[FINGERPRINT_FIELD] = fingerprint
+        indexed_fingerprint = indexed.get(long(doc.get('uid', 0)))
+        if indexed_fingerprint is None:
+            counts['new'] += 1
+        elif new_only or indexed_fingerprint == fingerprint:
+            counts['unchanged'] += 1
+            continue
+        else:
+            counts['changed'] += 1
+        yield doc
 
 
 def clear_solr(buid):
@@ -436,19 +452,6 @@ def clear_solr(buid):
     logging.info("BUID:%s - SOLR - All jobs deleted." % buid)
 
 
-def _solr_results_chunk(tup, buid, step):
-    """
-    Takes a (start_index, stop_index) tuple and gets the results in that
-    range from the Solr index.
-
-    """
-    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
-    results = conn.search("*:*", fq="buid:%s" % buid, fl="uid",
-                          rows=step, start=tup[0], facet="false",
-                          mlt="false").docs
-    return set([i['uid'] for i in results if 'uid' in i])
-
-
 def _job_filter(job):
     if job.uid:
         return long(job.uid)
@@ -596,18 +599,17 @@ def remove_expired_jobs(buid, active_ids, upload_chunk_size=1024):
     Given a job source id and a list of active job ids for that job source,
     Remove the jobs on solr that are not among the active jobs.
     """
-    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
-
     active_ids = set(active_ids)
 
-    count = conn.search("*:*", fq="buid:%s" % buid, facet="false",
-                                      mlt="false").hits
-    old_jobs = conn.search("*:*", fq="buid:%s" % buid, facet="false",
-                           rows=count, mlt="false").docs
-    old_ids = set(j['id'] for j in old_jobs)
-    expired = old_ids - active_ids
-    chunks = chunk(list(expired), upload_chunk_size)
-    for jobs in chunks:
-        query = "id:(%s)" % " OR ".join([str(x) for x in jobs])
-        conn.delete(q=query)
+    # Only the ids of the indexed jobs are streamed back from Solr, a page
+    # at a time, rather than every full document at once.
+    expired = set(job_id for job_id in
+                  iter_field_values('id', fq="buid:%s" % buid)
+                  if job_id not in active_ids)
+    writer = SolrWriter()
+    try:
+        for jobs in chunk(expired, upload_chunk_size):
+            writer.delete("id:(%s)" % " OR ".join([str(x) for x in jobs]))
+    finally:
+        writer.close()
     return expired
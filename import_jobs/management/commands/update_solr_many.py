@@ -0,0 +1,37 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from import_jobs.scheduler import update_solr_many
+from seo.models import BusinessUnit
+
+
+class Command(BaseCommand):
+    args = "[buid buid ...]"
+    help = """
+           Imports the feed files for the given business units (or every
+           business unit, if none are given) through a parallel download
+           and index pipeline, then prints a throughput summary.
+           """
+    option_list = BaseCommand.option_list + (
+        make_option('--download-threads', type='int', default=4,
+                    help='Number of feed files downloaded at once.'),
+        make_option('--processes', type='int', default=None,
+                    help='Number of worker processes indexing feeds. '
+                         'Defaults to the number of cores.'),
+    )
+
+    def handle(self, *args, **options):
+        buids = args or BusinessUnit.objects.values_list('id', flat=True)
+        summary = update_solr_many(
+            buids, download_threads=options['download_threads'],
+            processes=options['processes'])
+
+        for buid, added, deleted, seconds, error in summary['results']:
+            self.stdout.write("%s: %s added, %s deleted in %0.1fs%s" % (
+                buid, added, deleted, seconds,
+                " (%s)" % error if error else ""))
+        self.stdout.write(
+            "%(buids)s business units (%(failed)s failed): %(added)s added, "
+            "%(deleted)s deleted in %(seconds)0.1fs, "
+            "%(jobs_per_second)0.1f jobs/s" % summary)
@@ -1,15 +1,75 @@
+from pymongo import DeleteMany, ReplaceOne
 from pymongoenv import connect_db
 import re
 from seo.helpers import create_businessunit
+from moc_coding.cache import MocIndex
 from seo.models import BusinessUnit
 from import_jobs import add_company, get_jobsfs_zipfile, get_jobs_from_zipfile,\
     filter_current_jobs, DATA_DIR, download_feed_file, FeedImportError
+from import_jobs.solr import chunk
 from transform import hr_xml_to_json
 
 import logging
 from xmlparse import DEv2JobFeed
 logger = logging.getLogger(__name__)
 
+# Jobs replaced per bulk_write call. Jobs are a few kilobytes each, so a
+# batch stays far below MongoDB's 16MB message limit.
+MONGO_BATCH_SIZE = 500
+
+
+def load_jobs(jobs, buid, collection=None, batch_size=MONGO_BATCH_SIZE):
+    """
+    Streams jobs into the jobs collection, replacing (or inserting) each by
+    guid in batches of batch_size, then removes the business unit's jobs
+    whose guids weren't loaded.
+
+    Only one batch of jobs is held at a time; the guids loaded are kept to
+    find the stale jobs. If no jobs are loaded, nothing is removed, so an
+    empty or broken feed can't wipe out a business unit.
+
+    Inputs:
+    :jobs: An iterable of job dictionaries, such as hr_xml_to_json output.
+    :buid: The business unit the jobs belong to.
+
+    Returns a dictionary with the number of jobs matched, upserted and
+    deleted.
+
+    """
+    if collection is None:
+        collection = connect_db().db.jobs
+    counts = {'matched': 0, 'upserted': 0, 'deleted': 0}
+    loaded = set()
+
+    for batch in chunk(jobs, batch_size):
+        requests = []
+        for job in batch:
+            job['guid'] = job['guid'].lower()
+            loaded.add(job['guid'])
+            requests.append(ReplaceOne({'guid': job['guid']}, job,
+                                       upsert=True))
+        result = collection.bulk_write(requests, ordered=False)
+        counts['matched'] += result.matched_count
+        counts['upserted'] += result.upserted_count
+        logger.info("BUID:%s - Mongo batch: %s matched, %s upserted",
+                    buid, result.matched_count, result.upserted_count)
+
+    if loaded:
+        indexed = collection.find({'buid': buid}, {'guid': True, '_id': False})
+        stale = (job['guid'] for job in indexed
+                 if job.get('guid') not in loaded)
+        for batch in chunk(stale, batch_size):
+            result = collection.bulk_write(
+                [DeleteMany({'buid': buid, 'guid': {'$in': list(batch)}})])
+            counts['deleted'] += result.deleted_count
+            logger.info("BUID:%s - Mongo batch: %s deleted", buid,
+                        result.deleted_count)
+
+    logger.info("BUID:%s - Mongo: %s matched, %s upserted, %s deleted",
+                buid, counts['matched'], counts['upserted'],
+                counts['deleted'])
+    return counts
+
 
 def jobsfs_to_mongo(guid, buid, name):
     """Composed method for resopnding to a guid update."""
@@ -30,24 +90,16 @@ def jobsfs_to_mongo(guid, buid, name):
     zf = get_jobsfs_zipfile(guid)
     jobs = get_jobs_from_zipfile(zf, guid)
     jobs = filter_current_jobs(jobs, bu)
-    jobs = (hr_xml_to_json(job, bu) for job in jobs)
-    jobs = list(jobs)
-    for job in jobs:
-        job['guid'] = job['guid'].lower()
-
-    if len(jobs) > 0:
-        collection = connect_db().db.jobs
-        bulk = collection.initialize_unordered_bulk_op()
-        for job in jobs:
-            bulk.find({'guid': job['guid']}).upsert().replace_one(job)
-        bulk.execute()
+    moc_index = MocIndex()
+    jobs = (hr_xml_to_json(job, bu, moc_index) for job in jobs)
+    return load_jobs(jobs, bu.id)
 
 
 def seoxml_to_mongo(buid, data_dir=DATA_DIR):
     filepath = download_feed_file(buid, data_dir=data_dir)
 
     jobfeed = DEv2JobFeed(filepath, jsid=buid, markdown=False,
-                          company=None)
+                          company=None, streaming=True)
     # If the feed file did not pass validation, return. The return value is
     # '(0, 0)' to match what's returned on a successful parse.
     if jobfeed.errors:
@@ -57,13 +109,4 @@ def seoxml_to_mongo(buid, data_dir=DATA_DIR):
                                          error['exception']))
         raise FeedImportError(error)
 
-    # A dictionary of uids
-    jobfeed.jobparse()
-    jobs = jobfeed.solr_jobs()
-
-    collection = connect_db().db.jobs
-    bulk = collection.initialize_unordered_bulk_op()
-    for job in jobs:
-        job['guid'] = job['guid'].lower()
-        bulk.find({'guid': job['guid']}).upsert().replace_one(job)
-    bulk.execute()
+    return load_jobs(jobfeed.solr_jobs(), buid)
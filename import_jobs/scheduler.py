@@ -0,0 +1,209 @@
+"""
+Imports many business units at once, overlapping the download, parse and
+index stages of each.
+
+Feed files are downloaded by a pool of I/O threads. As soon as a feed is on
+disk it is handed to a pool of worker processes (one per core by default),
+each of which parses, diffs and indexes it with `update_solr`, streaming
+documents into its own pipelined `SolrWriter`. A semaphore bounds the
+number of feeds that have been downloaded but not yet indexed, so a fast
+network can't fill the disk while the workers catch up. A feed whose
+worker dies without reporting back (killed for memory, say) is given up on
+after `feed_timeout` seconds, so it can't hold its place in the pipeline
+forever.
+
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection
+
+from import_jobs import DATA_DIR, download_feed_file, update_solr
+
+logger = logging.getLogger(__name__)
+
+
+def _index_feed(buid, filepath, kwargs):
+    """
+    Runs in a worker process. Returns a (buid, added, deleted, seconds,
+    error) tuple rather than raising, so one bad feed doesn't stop the
+    rest of the run.
+
+    """
+    start = time.time()
+    try:
+        added, deleted = update_solr(buid, filepath=filepath, **kwargs)
+    except Exception as e:
+        logger.exception("BUID:%s - Import failed", buid)
+        return buid, 0, 0, time.time() - start, repr(e)
+    return buid, added, deleted, time.time() - start, None
+
+
+class ImportScheduler(object):
+    """
+    Imports a set of business units through a bounded download -> index
+    pipeline.
+
+    inputs:
+        :download_threads: Number of feeds downloaded at once.
+        :processes: Number of worker processes parsing and indexing feeds.
+            Defaults to the number of cores.
+        :max_pending: Maximum number of feeds that may be downloaded but
+            not yet indexed. Defaults to twice the number of processes.
+        :data_dir: Directory the feed files are downloaded into. Each run
+            uses its own temporary directory inside it.
+        :feed_timeout: Seconds a feed may spend being indexed before it is
+            recorded as failed and its place in the pipeline is freed.
+        :update_kwargs: Extra keyword arguments passed along to
+            `update_solr` for every business unit.
+
+    """
+    def __init__(self, download_threads=4, processes=None, max_pending=None,
+                 data_dir=DATA_DIR, feed_timeout=3600, **update_kwargs):
+        self.download_threads = download_threads
+        self.processes = processes or multiprocessing.cpu_count()
+        self.max_pending = max_pending or self.processes * 2
+        self.data_dir = data_dir
+        self.feed_timeout = feed_timeout
+        self.update_kwargs = update_kwargs
+        self.results = []
+
+    def run(self, buids):
+        """
+        Imports every business unit in `buids`. A business unit listed more
+        than once is only imported once, so no two imports of the same
+        business unit ever overlap.
+
+        outputs:
+            The throughput summary from `summary()`.
+
+        """
+        buids = list(_unique(int(buid) for buid in buids))
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+        run_dir = tempfile.mkdtemp(prefix='import_', dir=self.data_dir)
+        pending = threading.BoundedSemaphore(self.max_pending)
+        # Deadlines of the feeds handed to the workers and not yet finished.
+        indexing = {}
+        lock = threading.Condition()
+        finished = threading.Event()
+        self.results = []
+        start = time.time()
+
+        def download(buid):
+            pending.acquire()
+            try:
+                return buid, download_feed_file(buid, data_dir=run_dir), None
+            except Exception as e:
+                pending.release()
+                logger.exception("BUID:%s - Download failed", buid)
+                return buid, None, repr(e)
+
+        def indexed(result):
+            with lock:
+                if indexing.pop(result[0], None) is None:
+                    # The feed already timed out.
+                    return
+                self.results.append(result)
+                lock.notify()
+            pending.release()
+
+        def expire_lost_feeds():
+            # multiprocessing.Pool silently drops the task of a worker that
+            # dies, so its callback never fires.
+            while not finished.wait(1):
+                now = time.time()
+                with lock:
+                    lost = [buid for buid, deadline in indexing.items()
+                            if deadline < now]
+                    for buid in lost:
+                        del indexing[buid]
+                        self.results.append((buid, 0, 0, self.feed_timeout,
+                                             "Timed out"))
+                    lock.notify()
+                for buid in lost:
+                    logger.error("BUID:%s - Import timed out", buid)
+                    pending.release()
+
+        # Worker processes must not share the parent's database connection.
+        connection.close()
+        workers = multiprocessing.Pool(self.processes)
+        downloaders = ThreadPool(self.download_threads)
+        watchdog = threading.Thread(target=expire_lost_feeds)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            for buid, filepath, error in downloaders.imap_unordered(download,
+                                                                    buids):
+                with lock:
+                    if error:
+                        self.results.append((buid, 0, 0, 0, error))
+                        continue
+                    indexing[buid] = time.time() + self.feed_timeout
+                workers.apply_async(_index_feed,
+                                    (buid, filepath, self.update_kwargs),
+                                    callback=indexed)
+            downloaders.close()
+            workers.close()
+            # Pool.join() would wait forever on a feed lost with its worker,
+            # so wait for every feed to finish or time out instead.
+            with lock:
+                while indexing:
+                    lock.wait(1)
+        finally:
+            finished.set()
+            watchdog.join()
+            downloaders.terminate()
+            workers.terminate()
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+        summary = self.summary(time.time() - start)
+        logger.info("Imported %(buids)s business units (%(failed)s failed): "
+                    "%(added)s jobs added, %(deleted)s deleted in "
+                    "%(seconds)0.1f seconds (%(jobs_per_second)0.1f jobs/s)",
+                    summary)
+        return summary
+
+    def summary(self, seconds):
+        """
+        Summarizes the results of the last run.
+
+        outputs:
+            A dictionary of totals, with the per business unit results in
+            'results' as (buid, added, deleted, seconds, error) tuples.
+
+        """
+        added = sum(result[1] for result in self.results)
+        deleted = sum(result[2] for result in self.results)
+        return {
+            'buids': len(self.results),
+            'failed': len([result for result in self.results if result[4]]),
+            'added': added,
+            'deleted': deleted,
+            'seconds': seconds,
+            'jobs_per_second': (added + deleted) / seconds if seconds else 0,
+            'results': sorted(self.results),
+        }
+
+
+def _unique(items):
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+def update_solr_many(buids, **kwargs):
+    """
+    Composed method for importing a set of business units at once. Accepts
+    the same keyword arguments as ImportScheduler.
+
+    """
+    return ImportScheduler(**kwargs).run(buids)
@@ -1,26 +1,38 @@
+import hashlib
+import heapq
+import json
+import logging
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
 from django.conf import settings
+from pysolr import SolrError
 from seo_pysolr import Solr
-from itertools import chain, islice
+from itertools import chain, islice, izip
+
+logger = logging.getLogger(__name__)
+
 
 def add_jobs(jobs, upload_chunk_size=1024):
     """
     Loads a solr-ready json list of jobs into solr.
 
     inputs:
-        :jobs: A list of solr-ready, json-formatted jobs.
+        :jobs: A list (or generator) of solr-ready, json-formatted jobs.
 
     outputs:
         The ids of jobs loaded into solr.
     """
-    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
-
-    # Chunk them
-    jobs = chunk(jobs, upload_chunk_size)
-    job_ids = list()
-    for job_group in jobs:
-        job_group = list(job_group)
-        conn.add(job_group)
-        job_ids.extend(j['id'] for j in job_group)
+    writer = SolrWriter(batch_size=upload_chunk_size)
+    try:
+        job_ids = writer.add(jobs)
+    finally:
+        writer.close()
     return job_ids
 
 
@@ -41,13 +53,22 @@ def delete_by_guid(guids):
     if not guids:
         return 0
     num_guids = len(guids)
-    guids = chunk(guids)
-    for guid_group in guids:
-        delete_str = " OR ".join(guid_group)
-        conn.delete(q="guid: (%s)" % delete_str)
+    for query in guid_delete_queries(guids):
+        conn.delete(q=query)
     return num_guids
 
 
+def guid_delete_queries(guids):
+    """
+    Builds the delete-by-query queries that remove jobs from solr by guid,
+    one per chunk of guids.
+
+    """
+    for guid_group in chunk(guids):
+        delete_str = " OR ".join(guid_group)
+        yield "guid: (%s)" % delete_str
+
+
 def chunk(iterable, chunk_size=1024):
     """
     Create chunks from a list.
@@ -55,4 +76,344 @@ def chunk(iterable, chunk_size=1024):
     """
     iterator = iter(iterable)
     for first in iterator:
-        yield chain([first], islice(iterator, chunk_size - 1))
\ No newline at end of file
+        yield chain([first], islice(iterator, chunk_size - 1))
+
+
+# Dynamic long field holding each job's content fingerprint.
+FINGERPRINT_FIELD = 'fingerprint_l'
+
+# Fields that are set fresh (or randomly) on every import, and so would
+# make every job look changed if they were part of its fingerprint.
+FINGERPRINT_EXCLUDE = frozenset(['date_added', 'date_added_exact',
+                                 'salted_date', FINGERPRINT_FIELD])
+
+
+def iter_documents(fl, fq, q="*:*", rows=10000, conn=None):
+    """
+    Streams every document matching `q` and `fq`, using Solr's cursorMark
+    deep paging. Unlike start/rows paging, each page costs the same no
+    matter how deep into the results it is.
+
+    inputs:
+        :fl: The comma separated stored fields to return, e.g. "uid,id".
+        :fq: Filter query restricting the documents, e.g. "buid:13".
+        :rows: Number of documents fetched per request.
+        :conn: An existing Solr connection to reuse.
+
+    outputs:
+        A generator of (partial) documents.
+
+    """
+    conn = conn or Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
+    cursor = '*'
+    while True:
+        # cursorMark paging requires a sort on the uniqueKey.
+        params = {'q': q, 'fq': fq, 'fl': fl, 'rows': rows,
+                  'sort': 'id asc', 'cursorMark': cursor,
+                  'facet': 'false', 'mlt': 'false'}
+        result = conn.decoder.decode(conn._select(params))
+        for doc in result['response']['docs']:
+            yield doc
+        next_cursor = result.get('nextCursorMark')
+        if next_cursor is None or next_cursor == cursor:
+            break
+        cursor = next_cursor
+
+
+def iter_field_values(field, fq, **kwargs):
+    """
+    Streams the value of a single `field` for every document matching
+    `fq`. Documents without the field are skipped. Accepts the same keyword
+    arguments as `iter_documents`.
+
+    """
+    for doc in iter_documents(field, fq, **kwargs):
+        if field in doc:
+            yield doc[field]
+
+
+def job_fingerprint(doc):
+    """
+    Returns a stable, signed 64-bit hash of a solr-ready job.
+
+    Fields in FINGERPRINT_EXCLUDE are ignored and list values are sorted,
+    so two imports of an unchanged job produce the same fingerprint.
+
+    """
+    normalized = {}
+    for key, value in doc.iteritems():
+        if key in FINGERPRINT_EXCLUDE:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(unicode(v) for v in value)
+        elif value is not None:
+            value = unicode(value)
+        normalized[key] = value
+    digest = hashlib.md5(json.dumps(normalized, sort_keys=True)).digest()
+    return struct.unpack('<q', digest[:8])[0]
+
+
+# Number of rows sorted in memory at once while building a UidSet.
+SORT_RUN_SIZE = 65536
+
+
+def sorted_runs(rows, width):
+    """
+    Sorts `rows`, tuples of `width` integers, without holding them all as
+    python objects at once.
+
+    Rows are sorted `SORT_RUN_SIZE` at a time, and each sorted run is packed
+    into `width` parallel arrays. The runs are then merged lazily.
+
+    outputs:
+        An iterator over the sorted rows.
+
+    """
+    runs = []
+    for run in chunk(rows, SORT_RUN_SIZE):
+        columns = [array('l') for _ in range(width)]
+        for row in sorted(run):
+            for column, value in zip(columns, row):
+                column.append(value)
+        runs.append(columns)
+    return heapq.merge(*[izip(*columns) for columns in runs])
+
+
+class UidSet(object):
+    """
+    A sorted, array-backed set of integer uids.
+
+    Each member costs 8 bytes, instead of the ~60 bytes per member of a
+    set of python longs, so the uids for even the largest business units
+    can be diffed in a few hundred kilobytes. Membership tests are a binary
+    search.
+
+    Uids are sorted in bounded runs as they are read, so building the set
+    never holds more than `SORT_RUN_SIZE` of them as python longs.
+
+    """
+    def __init__(self, uids=()):
+        self._uids = array('l')
+        last = None
+        for uid, in sorted_runs(((long(uid),) for uid in uids), 1):
+            if uid != last:
+                self._uids.append(uid)
+                last = uid
+
+    def __contains__(self, uid):
+        i = bisect_left(self._uids, uid)
+        return i < len(self._uids) and self._uids[i] == uid
+
+    def __iter__(self):
+        return iter(self._uids)
+
+    def __len__(self):
+        return len(self._uids)
+
+    def difference(self, other):
+        """Returns a UidSet of the members of this set not in `other`."""
+        result = UidSet()
+        result._uids.extend(uid for uid in self._uids if uid not in other)
+        return result
+
+
+class FingerprintMap(UidSet):
+    """
+    A UidSet that also stores a 64-bit fingerprint for each uid, in a
+    parallel array.
+
+    inputs:
+        :pairs: An iterable of (uid, fingerprint) tuples. A fingerprint of
+            None is stored as 0, which never matches a real fingerprint in
+            practice.
+
+    """
+    def __init__(self, pairs=()):
+        self._uids = array('l')
+        self._fingerprints = array('l')
+        last = None
+        rows = ((long(uid), long(fingerprint or 0))
+                for uid, fingerprint in pairs)
+        for uid, fingerprint in sorted_runs(rows, 2):
+            if uid != last:
+                self._uids.append(uid)
+                self._fingerprints.append(fingerprint)
+                last = uid
+
+    def get(self, uid, default=None):
+        """Returns the fingerprint stored for `uid`."""
+        i = bisect_left(self._uids, uid)
+        if i < len(self._uids) and self._uids[i] == uid:
+            return self._fingerprints[i]
+        return default
+
+
+def doc_size(doc):
+    """
+    Approximates the number of bytes a document will take up in an
+    /update request body.
+
+    """
+    size = 0
+    for key, value in doc.iteritems():
+        if isinstance(value, (list, tuple, set)):
+            size += sum(len(key) + len(unicode(v)) for v in value)
+        else:
+            size += len(key) + len(unicode(value))
+    return size
+
+
+class SolrWriter(object):
+    """
+    Writes documents to Solr in batches, keeping a bounded number of
+    /update requests in flight at once.
+
+    Documents are consumed from any iterable (typically a generator), so
+    at most `max_in_flight` batches are ever held in memory. A batch is
+    sent once it reaches `batch_size` documents or `max_batch_bytes`
+    approximate bytes, whichever comes first. Failed batches are retried
+    `retries` times and then split in half, so a single bad document
+    doesn't sink the rest of its batch.
+
+    Batches are sent without committing; `close()` waits for every
+    outstanding request and then issues a single commit. Deletes can't be
+    sent with commitWithin, so `close()` always commits if any were sent.
+
+    inputs:
+        :url: The Solr url to write to. Defaults to the default haystack
+            connection.
+        :batch_size: Maximum number of documents per /update request.
+        :max_batch_bytes: Maximum approximate size of an /update request.
+        :max_in_flight: Number of requests that may be running at once.
+        :retries: Number of times a failed batch is resent before it is
+            split.
+        :commit_within: Passed along to Solr as commitWithin.
+        :commit: Whether `close()` should commit the index when only
+            documents were added.
+
+    """
+    def __init__(self, url=None, batch_size=1024, max_batch_bytes=5242880,
+                 max_in_flight=4, retries=2, commit_within=None, commit=True):
+        self.url = url or settings.HAYSTACK_CONNECTIONS['default']['URL']
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.commit_within = commit_within
+        self.commit = commit
+        self.deletes = 0
+        # One (documents, bytes, seconds) tuple per /update request sent.
+        self.batch_stats = []
+        self._local = threading.local()
+        self._pending = deque()
+        self._pool = ThreadPool(max_in_flight)
+
+    @property
+    def conn(self):
+        """A Solr connection private to the calling thread."""
+        if not hasattr(self._local, 'conn'):
+            self._local.conn = Solr(self.url)
+        return self._local.conn
+
+    def batches(self, docs):
+        """
+        Groups `docs` into lists limited by both `batch_size` and
+        `max_batch_bytes`, yielding (batch, approximate bytes) tuples.
+
+        """
+        batch, batch_bytes = [], 0
+        for doc in docs:
+            size = doc_size(doc)
+            if batch and (len(batch) >= self.batch_size or
+                          batch_bytes + size > self.max_batch_bytes):
+                yield batch, batch_bytes
+                batch, batch_bytes = [], 0
+            batch.append(doc)
+            batch_bytes += size
+        if batch:
+            yield batch, batch_bytes
+
+    def add(self, docs):
+        """
+        Sends every document in `docs` to Solr and waits for all of them to
+        be written.
+
+        outputs:
+            The ids of the documents written.
+
+        """
+        ids = []
+        for batch, size in self.batches(docs):
+            ids.extend(doc['id'] for doc in batch)
+            self._submit(self._send_batch, batch, size)
+        self.flush()
+        return ids
+
+    def delete(self, q):
+        """Queues a delete-by-query alongside any outstanding adds."""
+        self.deletes += 1
+        self._submit(self._send_delete, q)
+
+    def flush(self):
+        """Blocks until every outstanding request has completed."""
+        while self._pending:
+            self._pending.popleft().get()
+
+    def close(self):
+        """
+        Flushes outstanding requests, commits and stops the workers.
+
+        outputs:
+            Whether the index was committed.
+
+        """
+        try:
+            self.flush()
+            committed = self.commit or bool(self.deletes)
+            if committed:
+                self.conn.commit()
+        finally:
+            self._pool.terminate()
+        return committed
+
+    def _submit(self, func, *args):
+        # Wait on the oldest request once the pipeline is full; this is what
+        # bounds memory use when reading from a generator.
+        while len(self._pending) >= self.max_in_flight:
+            self._pending.popleft().get()
+        self._pending.append(self._pool.apply_async(func, args))
+
+    def _send_batch(self, batch, size=None):
+        start = time.time()
+        for attempt in range(self.retries + 1):
+            try:
+                self.conn.add(batch, commit=False,
+                              commitWithin=self.commit_within)
+                break
+            except SolrError:
+                if attempt < self.retries:
+                    continue
+                if len(batch) == 1:
+                    logger.error("SOLR - Unable to add document %s",
+                                 batch[0].get('id'))
+                    raise
+                logger.warn("SOLR - Splitting failed batch of %s documents",
+                            len(batch))
+                half = len(batch) // 2
+                self._send_batch(batch[:half])
+                self._send_batch(batch[half:])
+                return
+        elapsed = time.time() - start
+        if size is None:
+            size = sum(doc_size(doc) for doc in batch)
+        self.batch_stats.append((len(batch), size, elapsed))
+        logger.info("SOLR - Added %s documents (%s bytes) in %0.3f seconds.",
+                    len(batch), size, elapsed)
+
+    def _send_delete(self, q):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.conn.delete(q=q, commit=False)
+            except SolrError:
+                if attempt == self.retries:
+                    raise
@@ -4,8 +4,10 @@ from os import path
 
 import lxml
 import pytz
+from pymongoenv import connect_db
 
 import import_jobs
+from import_jobs.mongo import load_jobs
 from seo.tests.factories import BusinessUnitFactory
 from seo.tests.setup import DirectSEOBase
 import transform
@@ -62,3 +64,31 @@ class JobsFStoJsonTest(DirectSEOBase):
             msg="date_new is '%s', it should equal '%s'" % (
                 date_new.astimezone(pytz.UTC),
                 expected.isoformat()))
+
+
+class MongoLoadTest(DirectSEOBase):
+    def test_load_jobs_in_batches(self):
+        """
+        Jobs are upserted by lowercased guid in batches, and jobs for the
+        business unit that weren't loaded are removed.
+
+        """
+        collection = connect_db().db.jobs
+        collection.insert_many([{'guid': 'stale', 'buid': 1},
+                                {'guid': 'other', 'buid': 2}])
+
+        jobs = ({'guid': 'GUID%s' % i, 'buid': 1} for i in range(5))
+        counts = load_jobs(jobs, 1, collection=collection, batch_size=2)
+        self.assertEqual(counts, {'matched': 0, 'upserted': 5, 'deleted': 1})
+        self.assertEqual(sorted(collection.distinct('guid', {'buid': 1})),
+                         ['guid%s' % i for i in range(5)])
+        self.assertEqual(collection.find({'buid': 2}).count(), 1)
+
+        jobs = ({'guid': 'GUID%s' % i, 'buid': 1} for i in range(5))
+        counts = load_jobs(jobs, 1, collection=collection, batch_size=2)
+        self.assertEqual(counts, {'matched': 5, 'upserted': 0, 'deleted': 0})
+
+        # An empty feed leaves the business unit's jobs alone.
+        counts = load_jobs(iter([]), 1, collection=collection)
+        self.assertEqual(counts, {'matched': 0, 'upserted': 0, 'deleted': 0})
+        self.assertEqual(collection.find({'buid': 1}).count(), 5)
@@ -6,15 +6,12 @@ from django import http
 from django.core.urlresolvers import reverse
 from django.utils.timezone import activate
 from django.conf import settings
-from django.contrib.sites.models import Site
-from django.core.cache import cache
 from django.shortcuts import redirect
 
 from impersonate.middleware import ImpersonateMiddleware
 
 from myjobs.models import User, SecondPartyAccessRequest
-from postajob.models import SitePackage
-from seo.models import SeoSite, SeoSiteRedirect, SeoSiteFacet
+from seo.site_context import get_site_context
 import version
 
 
@@ -114,16 +111,11 @@ class SiteRedirectMiddleware:
               to redirect, why go thru any other unneeded processing
 
         """
-        host = request.get_host()
-        try:
-            ss = SeoSiteRedirect.objects. \
-                select_related('seosite__domain').get(redirect_url=host)
-            redirect_host = ss.seosite.domain
-            uri = request.path
-            redirect_url = 'http://%s%s' % (redirect_host, uri)
+        host = request.get_host().split(":")[0]
+        redirect_host = get_site_context(host).redirect_to
+        if redirect_host:
+            redirect_url = 'http://%s%s' % (redirect_host, request.path)
             return redirect(redirect_url, permanent=True)
-        except SeoSiteRedirect.DoesNotExist:
-            return
 
 
 class MultiHostMiddleware:
@@ -156,36 +148,13 @@ class MultiHostMiddleware:
         #             127.0.0.1:8000,
         #             find.ibm.jobs:80
         host = host.split(":")[0]
-        site_cache_key = '%s:SeoSite' % host
-        MINUTES_TO_CACHE = getattr(settings, 'MINUTES_TO_CACHE', 120)
-        ## REMINDER: make domain a unique field on site model
-        # see if the cache has it
-        my_site = cache.get(site_cache_key)
-        if not my_site:
-            # DO NOT add filters to prefetched objects. Use only with .all()
-            sites = SeoSite.objects.select_related('group',
-                                                   'microsite_carousel',
-                                                   'view_sources',
-                                                   ).prefetch_related('billboard_images',
-                                                                      'business_units',
-                                                                      'featured_companies',
-                                                                      'site_tags',
-                                                                      'google_analytics',
-                                                                      'queryredirect_set')
-            # the cache didn't have it, so lets get it and set the cache
-            try:
-                my_site = sites.get(domain=host)
-            except Site.MultipleObjectsReturned:
-                my_site = sites.filter(domain=host)[:1][0]
-            except Site.DoesNotExist:
-                my_site = sites.get(id=1)
-            cache.set(site_cache_key, my_site, MINUTES_TO_CACHE*60)
+        context = get_site_context(host)
+        my_site = context.site
         settings.SITE = my_site
-        my_buids = [bu.id for bu in my_site.business_units.all()]
         settings.SITE_ID = my_site.id
         settings.SITE_NAME = my_site.name
-        settings.SITE_BUIDS = my_buids
-        settings.SITE_TAGS = [tag.site_tag for tag in my_site.site_tags.all()]
+        settings.SITE_BUIDS = list(context.buids)
+        settings.SITE_TAGS = list(context.tags)
         # version information
         settings.VERSION = version.marketing_version
         settings.BUILD = version.build_calculated
@@ -220,41 +189,13 @@ class MultiHostMiddleware:
             else:
                 setattr(settings, v, '')
 
-        site_facets = SeoSiteFacet.objects.filter(seosite=my_site)
-        site_facets = site_facets.select_related('customfacet')
-
         settings.CACHE_MIDDLEWARE_KEY_PREFIX = "%s" % my_site.domain
 
-        default = SeoSiteFacet.DEFAULT
-        default_site_facets = site_facets.filter(facet_type=default)
-        settings.DEFAULT_FACET = custom_facets_ops_groups(default_site_facets)
-
-        featured = SeoSiteFacet.FEATURED
-        featured_site_facets = site_facets.filter(facet_type=featured)
-        settings.FEATURED_FACET = custom_facets_ops_groups(featured_site_facets)
-
-        standard = SeoSiteFacet.STANDARD
-        standard_site_facets = site_facets.filter(facet_type=standard)
-        settings.STANDARD_FACET = custom_facets_ops_groups(standard_site_facets)
+        settings.DEFAULT_FACET = list(context.default_facets)
+        settings.FEATURED_FACET = list(context.featured_facets)
+        settings.STANDARD_FACET = list(context.standard_facets)
 
-        packages = SitePackage.objects.filter(sites=my_site)
-        settings.SITE_PACKAGES = [int(site_package.pk)
-                                  for site_package in packages]
-
-
-def custom_facets_ops_groups(site_facets):
-    """
-    Returns a list of custom facets with boolean_operation attributes set
-    from site facets
-
-    """
-    custom_facets = []
-    for site_facet in site_facets:
-        custom_facet = site_facet.customfacet
-        setattr(custom_facet, 'boolean_operation', site_facet.boolean_operation)
-        setattr(custom_facet, 'facet_group', site_facet.facet_group)
-        custom_facets.append(custom_facet)
-    return custom_facets
+        settings.SITE_PACKAGES = list(context.packages)
 
 
 def filter_custom_facets_by_production_status(custom_facets):
@@ -0,0 +1,118 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from moc_coding.models import CustomCareer, Moc
+
+
+class MocIndex(object):
+    """
+    An in-memory index of O*NET code -> MOC mappings and of business unit
+    CustomCareer mappings, so that feed parsing can map every job with
+    dictionary lookups instead of issuing several queries per job.
+
+    The O*NET mappings are loaded in bulk (two queries) the first time they
+    are needed. Custom mappings are loaded with one query the first time a
+    given business unit is looked up.
+
+    An index is normally created once per import and thrown away
+    afterwards. `MocIndex.shared()` returns a process-wide index instead;
+    it is discarded whenever a Moc, its O*NET codes or a CustomCareer is
+    saved or deleted in this process.
+
+    """
+    _shared = None
+
+    def __init__(self):
+        self._mocs = None
+        self._mocs_by_onet = None
+        self._custom_careers = {}
+
+    @classmethod
+    def shared(cls):
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    @classmethod
+    def invalidate_shared(cls):
+        cls._shared = None
+
+    def _load(self):
+        # Moc instances sort in their Meta ordering, so lookups return MOCs
+        # in the same order the equivalent query would.
+        self._mocs = dict((moc.pk, moc) for moc in Moc.objects.all())
+        self._mocs_by_onet = defaultdict(list)
+        for onet_id, moc_id in Moc.onets.through.objects.values_list(
+                'onet_id', 'moc_id'):
+            self._mocs_by_onet[onet_id].append(self._mocs[moc_id])
+        for mocs in self._mocs_by_onet.itervalues():
+            mocs.sort(key=lambda moc: (moc.branch, moc.code))
+
+    def mocs(self, ids):
+        """Returns the Moc instances for a list of Moc ids."""
+        if self._mocs is None:
+            self._load()
+        return [self._mocs[moc_id] for moc_id in ids if moc_id in self._mocs]
+
+    def job_mocs(self, onets):
+        """
+        Returns a list of the MOCs mapped to any of the O*NET codes in
+        `onets`, equivalent to `Moc.objects.filter(onets__code__in=onets)`.
+
+        """
+        if self._mocs_by_onet is None:
+            self._load()
+        mocs = []
+        for onet in set(onets):
+            mocs.extend(self._mocs_by_onet.get(onet, []))
+        mocs.sort(key=lambda moc: (moc.branch, moc.code))
+        return mocs
+
+    def custom_careers(self, buid):
+        """
+        Returns a dictionary of O*NET code -> list of Moc ids for the
+        CustomCareer mappings of a business unit.
+
+        """
+        if buid not in self._custom_careers:
+            from seo.models import BusinessUnit
+            content_type = ContentType.objects.get_for_model(BusinessUnit)
+            careers = defaultdict(list)
+            for onet_id, moc_id in CustomCareer.objects.filter(
+                    object_id=buid, content_type=content_type).values_list(
+                    'onet_id', 'moc_id'):
+                careers[onet_id].append(moc_id)
+            self._custom_careers[buid] = dict(careers)
+        return self._custom_careers[buid]
+
+    def mapped_moc_ids(self, buid):
+        """Returns every Moc id with a custom mapping for a business unit."""
+        return [moc_id for moc_ids in self.custom_careers(buid).itervalues()
+                for moc_id in moc_ids]
+
+    def custom_mocs(self, buid, onets):
+        """
+        Returns the MOCs a business unit has custom mapped to any of the
+        O*NET codes in `onets`.
+
+        """
+        careers = self.custom_careers(buid)
+        moc_ids = set()
+        for onet in onets:
+            moc_ids.update(careers.get(onet, []))
+        return self.mocs(moc_ids)
+
+
+@receiver(post_save, sender=Moc, dispatch_uid='moc_index_moc_saved')
+@receiver(post_delete, sender=Moc, dispatch_uid='moc_index_moc_deleted')
+@receiver(post_save, sender=CustomCareer,
+          dispatch_uid='moc_index_career_saved')
+@receiver(post_delete, sender=CustomCareer,
+          dispatch_uid='moc_index_career_deleted')
+@receiver(m2m_changed, sender=Moc.onets.through,
+          dispatch_uid='moc_index_onets_changed')
+def invalidate_moc_index(sender, **kwargs):
+    MocIndex.invalidate_shared()
@@ -5,6 +5,8 @@ from django.contrib.contenttypes.models import ContentType
 from seo.models import User, BusinessUnit
 from seo.tests.setup import DirectSEOBase
 
+from moc_coding.cache import MocIndex
+from moc_coding.models import Moc
 from moc_coding.tests.factories import (CustomCareerFactory, MocFactory,
                                         MocDetailFactory, OnetFactory)
 from xmlparse import DEv2JobFeed
@@ -63,6 +65,38 @@ class MocTestCase(DirectSEOBase):
 
         self.assertEqual(len(mocs), 2)
 
+    def test_moc_index(self):
+        """
+        The in-memory index should return the same MOCs as the equivalent
+        queries, loading everything it needs up front.
+
+        """
+        new_onet = OnetFactory(code="22222222")
+        new_moc = MocFactory(code="2")
+        new_moc.onets = [new_onet, self.onet]
+        new_moc.save()
+        CustomCareerFactory(object_id=1, onet_id="22222222")
+
+        onets = ['99999999', '22222222', self.onet.code]
+        index = MocIndex()
+        self.assertEqual(index.job_mocs(onets),
+                         list(Moc.objects.filter(onets__code__in=onets)))
+
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                index.job_mocs(onets)
+        ContentType.objects.get_for_model(BusinessUnit)
+        with self.assertNumQueries(1):
+            index.custom_mocs(1, onets)
+            index.custom_mocs(1, ['22222222'])
+        self.assertEqual(index.custom_mocs(2, onets), [])
+
+    def test_shared_moc_index_invalidated(self):
+        index = MocIndex.shared()
+        self.assertIs(MocIndex.shared(), index)
+        MocFactory(code="4")
+        self.assertIsNot(MocIndex.shared(), index)
+
     def test_authentication(self):
         # If user isn't logged in, redirect to login view
         resp = self.client.get('/mocmaps/newmap/?onet=99999999')
@@ -156,9 +156,10 @@ def get_jobs_and_counts(request):
     num_jobs = int(site_config.num_job_items_to_show) * 2
     percent_featured = site_config.percent_featured
 
-    args = (request, filters, num_jobs)
-    kwargs = {'fl': fl}
-    default_jobs, featured_jobs, facet_counts = helpers.jobs_and_counts(*args, **kwargs)
+    listing = cache.get_listing(request, filters, num_jobs, fl=fl)
+    default_jobs = listing.default_jobs
+    featured_jobs = listing.featured_jobs
+    facet_counts = listing.facet_counts
 
     total_default_jobs = default_jobs.count()
     total_featured_jobs = featured_jobs.count()
@@ -3,7 +3,7 @@ import datetime
 from setup import MyJobsBase
 from myjobs.models import STOP_SENDING, BAD_EMAIL, EmailLog, User
 from myjobs.tests.factories import UserFactory
-from tasks import process_batch_events
+from tasks import process_batch_events, process_email_events
 
 
 class TaskTests(MyJobsBase):
@@ -74,3 +74,29 @@ class TaskTests(MyJobsBase):
 
         log = EmailLog.objects.get()
         self.assertTrue(log.processed)
+
+    def test_process_email_events_in_batches(self):
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        users = [UserFactory(email="user%s@example.com" % i,
+                             last_response=yesterday, opt_in_myjobs=True)
+                 for i in range(3)]
+        for user in users:
+            self.make_email_logs(user.email, 'open', today, False, 2)
+        self.make_email_logs(users[0].email, STOP_SENDING[0], yesterday,
+                             False, 1)
+        self.make_email_logs('nobody@example.com', 'open', today, False, 1)
+        self.make_email_logs(users[1].email, 'open', yesterday, True, 1)
+
+        stats = process_email_events(batch_size=2)
+        self.assertEqual(stats['events'], 8)
+        self.assertEqual(stats['users'], 3)
+        self.assertFalse(EmailLog.objects.filter(processed=False).exists())
+
+        for user in User.objects.filter(pk__in=[u.pk for u in users]):
+            self.assertEqual(user.last_response, today)
+            self.assertEqual(user.opt_in_myjobs, user.pk != users[0].pk)
+        self.assertEqual(users[0].messageinfo_set.count(), 1)
+
+        # Nothing is left to process.
+        self.assertEqual(process_email_events()['events'], 0)
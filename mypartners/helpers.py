@@ -1,10 +1,12 @@
-from collections import namedtuple
+from collections import defaultdict, namedtuple, OrderedDict
 from datetime import datetime, time
 import json
 import os
+from timeit import default_timer as timer
 from urlparse import urlparse, parse_qsl, urlunparse
 from urllib import urlencode
 
+from django.db import transaction
 from django.db.models import Min, Max, Q, Model
 from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
@@ -394,6 +396,146 @@ def get_library_partners(search_url, download_url=None, params=None):
             yield CompliancePartner(**fields)
 
 
+# Together with the source, these identify a PartnerLibrary entry.
+LIBRARY_KEY_FIELDS = ('contact_name', 'st', 'city', 'email')
+LIBRARY_VALUE_FIELDS = (
+    'name', 'uri', 'region', 'state', 'area', 'phone', 'phone_ext',
+    'alt_phone', 'fax', 'street1', 'street2', 'zip_code', 'is_minority',
+    'is_female', 'is_disabled', 'is_disabled_veteran', 'is_veteran')
+
+
+def library_rows(partners):
+    """
+    Converts `CompliancePartner` objects, as yielded by
+    `get_library_partners`, to PartnerLibrary field values.
+
+    Inputs:
+    :partners: An iterable of `CompliancePartner` objects.
+
+    Outputs:
+    An ordered dictionary mapping `LIBRARY_KEY_FIELDS` values to a dictionary
+    of `LIBRARY_VALUE_FIELDS` values. A partner with several email addresses
+    produces one row per address; when a key repeats, the first row wins.
+    """
+    rows = OrderedDict()
+    for partner in partners:
+        # the second join + split take care of extra internal whitespace
+        fullname = " ".join(" ".join([partner.first_name,
+                                      partner.middle_name,
+                                      partner.last_name]).split())
+        values = {
+            'name': partner.organization_name,
+            'uri': partner.website,
+            'region': partner.region,
+            'state': partner.state,
+            'area': partner.area,
+            'phone': partner.phone,
+            'phone_ext': partner.phone_ext,
+            'alt_phone': partner.alt_phone,
+            'fax': partner.fax,
+            'street1': partner.street1,
+            'street2': partner.street2,
+            'zip_code': partner.zip_code,
+            'is_minority': partner.minority,
+            'is_female': partner.female,
+            'is_disabled': partner.disabled,
+            'is_disabled_veteran': partner.disabled_veteran,
+            'is_veteran': partner.veteran}
+
+        for email in partner.email_id.split(';', 1):
+            key = (fullname, partner.st, partner.city, email.strip())
+            rows.setdefault(key, values)
+    return rows
+
+
+def sync_partner_library(source_name, partners, batch_size=500):
+    """
+    Brings the PartnerLibrary entries of a source in line with a fresh
+    download of that source.
+
+    The existing entries are read once, then compared with the download by
+    key: new keys are inserted with `bulk_create`, changed entries are
+    updated in batches of identical values, and entries missing from the
+    download are deleted, all inside one transaction. Nothing is deleted
+    when the download is empty, as that is more likely to be a failed
+    download than an emptied directory.
+
+    Inputs:
+    :source_name: The `PartnerLibrarySource` name stored as `data_source`.
+    :partners: An iterable of `CompliancePartner` objects, as yielded by
+               `get_library_partners`.
+    :batch_size: The number of rows written per query.
+
+    Outputs:
+    A dictionary with the number of entries 'added', 'updated', 'deleted'
+    and 'unchanged', and under 'timings', the seconds spent in each phase.
+    """
+    timings = OrderedDict()
+    started = timer()
+
+    def phase(name):
+        timings[name] = timer() - started - sum(timings.values())
+
+    rows = library_rows(partners)
+    phase('download')
+
+    existing = {}
+    duplicates = []
+    fields = ('id', ) + LIBRARY_KEY_FIELDS + LIBRARY_VALUE_FIELDS
+    for entry in PartnerLibrary.objects.filter(
+            data_source=source_name).values_list(*fields).iterator():
+        key = entry[1:len(LIBRARY_KEY_FIELDS) + 1]
+        if key in existing:
+            # Left over from before entries were disambiguated.
+            duplicates.append(entry[0])
+        else:
+            existing[key] = (entry[0], entry[len(LIBRARY_KEY_FIELDS) + 1:])
+    phase('load')
+
+    inserts = [key for key in rows if key not in existing]
+    deletes = [pk for key, (pk, _) in existing.iteritems()
+               if key not in rows] if rows else []
+    deletes.extend(duplicates)
+    updates = defaultdict(list)
+    unchanged = 0
+    for key, (pk, current) in existing.iteritems():
+        if key not in rows:
+            continue
+        values = tuple(rows[key][field] for field in LIBRARY_VALUE_FIELDS)
+        if values == current:
+            unchanged += 1
+        else:
+            updates[values].append(pk)
+    phase('diff')
+
+    with transaction.atomic():
+        PartnerLibrary.objects.bulk_create(
+            [PartnerLibrary(data_source=source_name,
+                            **dict(zip(LIBRARY_KEY_FIELDS, key),
+                                   **rows[key]))
+             for key in inserts],
+            batch_size=batch_size)
+        phase('insert')
+
+        for values, pks in updates.iteritems():
+            values = dict(zip(LIBRARY_VALUE_FIELDS, values))
+            for index in xrange(0, len(pks), batch_size):
+                PartnerLibrary.objects.filter(
+                    pk__in=pks[index:index + batch_size]).update(**values)
+        phase('update')
+
+        for index in xrange(0, len(deletes), batch_size):
+            PartnerLibrary.objects.filter(
+                pk__in=deletes[index:index + batch_size]).delete()
+        phase('delete')
+
+    return {'added': len(inserts),
+            'updated': sum(len(pks) for pks in updates.itervalues()),
+            'deleted': len(deletes),
+            'unchanged': unchanged,
+            'timings': timings}
+
+
 def filter_partners(request, partner_library=False):
     """
     Advanced partner filtering.
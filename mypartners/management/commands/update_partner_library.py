@@ -1,9 +1,35 @@
-from django.core.management.base import BaseCommand
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mypartners.helpers import get_library_partners, sync_partner_library
 from tasks import update_partner_library
 
 
 class Command(BaseCommand):
     help = "Update PartnerLibrary model."
+    option_list = BaseCommand.option_list + (
+        make_option('--file', default=None,
+                    help='Synchronize a source from a saved copy of its '
+                         'Excel export rather than downloading every '
+                         'source.'),
+        make_option('--source', default=None,
+                    help='Name of the source --file is for.'),
+    )
 
     def handle(self, *args, **options):
-        update_partner_library()
+        if not options['file']:
+            update_partner_library()
+            return
+
+        if not options['source']:
+            raise CommandError("--source is required with --file.")
+
+        stats = sync_partner_library(
+            options['source'], get_library_partners(options['file']))
+        self.stdout.write(
+            "%d records added, %d updated, %d deleted and %d unchanged." % (
+                stats['added'], stats['updated'], stats['deleted'],
+                stats['unchanged']))
+        for phase, seconds in stats['timings'].items():
+            self.stdout.write("%s: %.2fs" % (phase, seconds))
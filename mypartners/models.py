@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from os import path
 from re import sub
@@ -529,108 +530,134 @@ class PartnerLibrary(models.Model):
 
 
 class ContactRecordQuerySet(SearchParameterQuerySet):
+    # Maps contact types to the activity_summary counter they count towards.
+    ACTIVITY_COUNTERS = {
+        'email': 'emails',
+        'phone': 'calls',
+        'meetingorevent': 'meetings',
+        'pssemail': 'searches',
+        'job': 'referrals',
+    }
+
     @property
     def communication_activity(self):
         return self.exclude(contact_type='job')
 
-    @property
-    def referral_activity(self):
-        activity = self.filter(contact_type='job').aggregate(
+    def activity_summary(self):
+        """
+        Returns the number of emails, calls, meetings, searches and
+        referrals along with the referred applications, interviews and hires
+        in this queryset as a dictionary.
+
+        The counters are computed in a single query grouped by contact type,
+        and cached on the queryset so that reading several of the properties
+        below doesn't query again.
+        """
+        summary = getattr(self, '_activity_summary', None)
+        if summary is not None:
+            return summary
+
+        records = self
+        if self.query.distinct:
+            # Joins added by from_search can repeat a record; group over the
+            # distinct records instead so that each is only counted once.
+            records = self.model.all_objects.filter(
+                pk__in=self.order_by().values('pk'))
+
+        summary = dict.fromkeys(
+            self.ACTIVITY_COUNTERS.values() +
+            ['applications', 'interviews', 'hires'], 0)
+        activity = records.order_by().values('contact_type').annotate(
+            records=models.Count('pk'),
             applications=models.Sum('job_applications'),
             interviews=models.Sum('job_interviews'),
             hires=models.Sum('job_hires'))
+        for row in activity:
+            counter = self.ACTIVITY_COUNTERS.get(row['contact_type'])
+            if counter:
+                summary[counter] += row['records']
+            if row['contact_type'] == 'job':
+                for key in ('applications', 'interviews', 'hires'):
+                    summary[key] += int(row[key] or 0)
 
-        return {key: int(value or 0) for key, value in activity.items()}
+        self._activity_summary = summary
+        return summary
+
+    @property
+    def referral_activity(self):
+        summary = self.activity_summary()
+        return {key: summary[key]
+                for key in ('applications', 'interviews', 'hires')}
 
     @property
     def emails(self):
-        return self.communication_activity.filter(
-            contact_type='email').count()
+        return self.activity_summary()['emails']
 
     @property
     def calls(self):
-        return self.communication_activity.filter(
-            contact_type='phone').count()
+        return self.activity_summary()['calls']
 
     @property
     def meetings(self):
-        return self.communication_activity.filter(
-            contact_type='meetingorevent').count()
+        return self.activity_summary()['meetings']
 
     @property
     def searches(self):
-        return self.communication_activity.filter(
-            contact_type='pssemail').count()
+        return self.activity_summary()['searches']
 
     @property
     def applications(self):
-        return self.referral_activity['applications']
+        return self.activity_summary()['applications']
 
     @property
     def interviews(self):
-        return self.referral_activity['interviews']
+        return self.activity_summary()['interviews']
 
     @property
     def hires(self):
-        return self.referral_activity['hires']
+        return self.activity_summary()['hires']
 
     @property
     def referrals(self):
-        return self.filter(contact_type='job').count()
-
-    @staticmethod
-    def _dict_from_values(values, key_fields, value_field):
-        """
-        Used to match distinct items between querysets based on multiple field 
-        values.
-
-        Inputs:
-            :values: An iterable of dictionaries such as queryset.values()
-                     [{field1: value}, {field2: value}]
-            :key_fields: An ordered iterable of field names whose values will be
-                         used to form a unique key
-            :value_field: The field from values stored in the returned 
-                          dictionary
-        """
-        dictionary = {}
-        for item in values:
-            key = '-'.join([str(item[field]) for field in key_fields])
-            dictionary[key] = item[value_field]
-        return dictionary
+        return self.activity_summary()['referrals']
 
     @property
     def contacts(self):
         """
-        Returns a queryset annotated by the number of referrals (contact_type =
-        'job') and number of records (contact_type != 'job'). Django doesn't
-        allow annotated values to be filtered without also filtering the base
-        result set, which is why we annotate separately then attach the values
-        to the resulting objects.
-        """
+        Returns a list of the distinct partner contacts in this queryset,
+        each annotated by its number of referrals (contact_type = 'job') and
+        number of records (contact_type != 'job'), most records first.
 
-        all_contacts = self.values('partner__name', 'partner',  'contact__name',
-                'contact', 'contact_email').distinct().order_by('partner__name')
+        Records are counted in a single query grouped by contact and contact
+        type, and the rows for each contact are then folded together.
+        """
+        rows = self.values(
+            'partner__name', 'partner', 'contact__name', 'contact',
+            'contact_email', 'contact_type').annotate(
+            record_count=models.Count('contact')).order_by('partner__name')
 
-        # Fields to identify distinct instances for grouping. Names are redundant.
+        # Fields to identify distinct instances for grouping. Names are
+        # redundant.
         distinct_fields = ('partner', 'contact', 'contact_email')
-        record_qs = (self.exclude(contact_type='job').values(
-                         *distinct_fields).annotate(
-                         record_count=models.Count('contact')).distinct())
-
-        records = self._dict_from_values(record_qs, distinct_fields,
-                                         'record_count')
-
-        referral_qs = self.filter(contact_type='job').values(
-                        *distinct_fields).annotate(
-                        referral_count=models.Count('contact')).distinct()
-
-        referrals = self._dict_from_values(referral_qs, distinct_fields,
-                                           'referral_count')
-        for contact in all_contacts:
-            key = '-'.join([str(contact[field]) for field in distinct_fields])
-            contact['referrals'] = referrals.get(key, 0)
-            contact['records'] = records.get(key, 0)
-        return sorted(all_contacts, key=lambda c: c['records'], reverse=True)
+        contacts = OrderedDict()
+        for row in rows:
+            key = tuple(row[field] for field in distinct_fields)
+            contact = contacts.get(key)
+            if contact is None:
+                contact = contacts[key] = {
+                    'partner__name': row['partner__name'],
+                    'partner': row['partner'],
+                    'contact__name': row['contact__name'],
+                    'contact': row['contact'],
+                    'contact_email': row['contact_email'],
+                    'referrals': 0,
+                    'records': 0}
+            if row['contact_type'] == 'job':
+                contact['referrals'] += row['record_count']
+            else:
+                contact['records'] += row['record_count']
+        return sorted(contacts.values(), key=lambda c: c['records'],
+                      reverse=True)
 
 
 class ContactRecordManager(SearchParameterManager):
@@ -10,7 +10,7 @@ from mypartners.tests.test_views import (MyPartnersTestCase,
                                          PartnerLibraryTestCase)
 from mypartners.tests.factories import (ContactRecordFactory, PartnerFactory,
                                         PRMAttachmentFactory)
-from mypartners.models import ContactLogEntry
+from mypartners.models import ContactLogEntry, PartnerLibrary
 
 
 class HelpersTests(MyPartnersTestCase):
@@ -120,6 +120,68 @@ class HelpersTests(MyPartnersTestCase):
         self.assertNotIn("notes", delta.keys())
 
 
+class PartnerLibrarySyncTests(MyPartnersTestCase):
+    library_file = 'mypartners/tests/data/library.html'
+    source = 'Library Sync Test'
+
+    def sync(self, partners=None):
+        if partners is None:
+            partners = helpers.get_library_partners(self.library_file)
+        return helpers.sync_partner_library(self.source, partners)
+
+    def test_sync_partner_library(self):
+        """
+        Synchronizing inserts new entries, updates changed ones, deletes ones
+        no longer in the source and leaves everything else alone.
+        """
+        rows = helpers.library_rows(
+            helpers.get_library_partners(self.library_file))
+        stats = self.sync()
+        self.assertEqual(stats['added'], len(rows))
+        self.assertEqual(stats['unchanged'], 0)
+        self.assertEqual(
+            PartnerLibrary.objects.filter(data_source=self.source).count(),
+            len(rows))
+
+        stats = self.sync()
+        self.assertEqual((stats['added'], stats['updated'],
+                          stats['deleted'], stats['unchanged']),
+                         (0, 0, 0, len(rows)))
+
+        changed, removed = PartnerLibrary.objects.filter(
+            data_source=self.source)[:2]
+        changed.name = 'Renamed Organization'
+        changed.save()
+        removed_id = removed.pk
+        removed.delete()
+        PartnerLibrary.objects.create(data_source=self.source,
+                                      name='Gone Organization',
+                                      contact_name='Nobody')
+
+        stats = self.sync()
+        self.assertEqual((stats['added'], stats['updated'],
+                          stats['deleted'], stats['unchanged']),
+                         (1, 1, 1, len(rows) - 2))
+        self.assertNotEqual(PartnerLibrary.objects.get(pk=changed.pk).name,
+                            'Renamed Organization')
+        self.assertFalse(PartnerLibrary.objects.filter(
+            pk=removed_id).exists())
+        self.assertFalse(PartnerLibrary.objects.filter(
+            name='Gone Organization').exists())
+        self.assertEqual(stats['timings'].keys(),
+                         ['download', 'load', 'diff', 'insert', 'update',
+                          'delete'])
+
+    def test_empty_download_deletes_nothing(self):
+        """An empty download shouldn't wipe out a source."""
+        added = self.sync()['added']
+        stats = self.sync(partners=[])
+        self.assertEqual(stats['deleted'], 0)
+        self.assertEqual(
+            PartnerLibrary.objects.filter(data_source=self.source).count(),
+            added)
+
+
 class PartnerLibraryFilterTests(PartnerLibraryTestCase):
 
     def test_all_ofccp_partners_available(self):
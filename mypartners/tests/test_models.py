@@ -331,3 +331,33 @@ class MyPartnerTests(MyJobsBase):
         self.assertEqual(records.emails, 1)
         self.assertEqual(records.calls, 1)
 
+    def test_activity_summary_is_one_query(self):
+        """
+        All of the aggregated values of a contact record queryset are read
+        from a single, cached query.
+        """
+        for contact_type in ['email', 'email', 'phone', 'meetingorevent',
+                             'pssemail']:
+            ContactRecordFactory(contact_type=contact_type,
+                                 partner=self.partner, contact=self.contact)
+        for applications in [3, 4]:
+            ContactRecordFactory(contact_type="job", partner=self.partner,
+                                 contact=self.contact,
+                                 job_applications=applications,
+                                 job_interviews=2, job_hires=1)
+
+        records = ContactRecord.objects.all()
+        with self.assertNumQueries(1):
+            self.assertEqual(records.activity_summary(), {
+                'emails': 2, 'calls': 1, 'meetings': 1, 'searches': 1,
+                'referrals': 2, 'applications': 7, 'interviews': 4,
+                'hires': 2})
+            self.assertEqual(records.emails, 2)
+            self.assertEqual(records.hires, 2)
+            self.assertEqual(records.referral_activity['applications'], 7)
+
+        with self.assertNumQueries(1):
+            contacts = records.contacts
+        self.assertEqual(len(contacts), 1)
+        self.assertEqual(contacts[0]['records'], 5)
+        self.assertEqual(contacts[0]['referrals'], 2)
@@ -0,0 +1,133 @@
+'''Columnar storage for report results.
+
+A columnar file holds the same records as a report's JSON results, laid out
+so that a reader can fetch only the columns and rows it needs:
+
+    {"format": "columnar", "version": 1, "rows": 3, "block_size": 1024,
+     "columns": [{"name": "a", "blocks": [0]}, {"name": "b", "blocks": [6]}]}
+    1
+    2
+    3
+    "x"
+
+    "z"
+
+The first line is a JSON header. The rest of the file holds each column in
+turn, one JSON encoded value per line; an empty line means the record has no
+such key. For every block_size rows of a column, the header records the
+offset (from the end of the header line) at which that block starts.
+'''
+
+import json
+import tempfile
+
+from myreports.result_encoder import report_hook, ReportJsonEncoder
+
+FORMAT = 'columnar'
+VERSION = 1
+BLOCK_SIZE = 1024
+
+
+def write_columnar(records, output, block_size=BLOCK_SIZE):
+    """Write records to output in the columnar format.
+
+    records - list of dicts
+    output - has method output.write(bytes)
+    """
+    names = []
+    seen = set()
+    for record in records:
+        for name in record:
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+
+    encoder = ReportJsonEncoder()
+    body = tempfile.TemporaryFile()
+    try:
+        columns = []
+        for name in names:
+            blocks = []
+            for row, record in enumerate(records):
+                if row % block_size == 0:
+                    blocks.append(body.tell())
+                if name in record:
+                    body.write(encoder.encode(record[name]))
+                body.write('\n')
+            columns.append({'name': name, 'blocks': blocks})
+
+        output.write(json.dumps({
+            'format': FORMAT,
+            'version': VERSION,
+            'rows': len(records),
+            'block_size': block_size,
+            'columns': columns,
+        }))
+        output.write('\n')
+        body.seek(0)
+        for chunk in iter(lambda: body.read(64 * 1024), ''):
+            output.write(chunk)
+    finally:
+        body.close()
+
+
+class ColumnarReader(object):
+    """Read records, or parts of them, from a columnar file.
+
+    fileobj must support seek, readline and read.
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        header_line = fileobj.readline()
+        header = json.loads(header_line)
+        if header.get('format') != FORMAT or header.get('version') != VERSION:
+            raise ValueError("Not a columnar report file.")
+        self.header_size = len(header_line)
+        self.rows = header['rows']
+        self.block_size = header['block_size']
+        self.blocks = dict((column['name'], column['blocks'])
+                           for column in header['columns'])
+        self.columns = [column['name'] for column in header['columns']]
+
+    def read_column(self, name, start, stop):
+        """Return the values of column `name` for rows start to stop.
+
+        Missing values are returned as a sentinel, `MISSING`.
+        """
+        block = start // self.block_size
+        self.fileobj.seek(self.header_size + self.blocks[name][block])
+        for _ in xrange(start - block * self.block_size):
+            self.fileobj.readline()
+
+        values = []
+        for _ in xrange(stop - start):
+            line = self.fileobj.readline().rstrip('\n')
+            if line:
+                values.append(json.loads(line, object_hook=report_hook))
+            else:
+                values.append(MISSING)
+        return values
+
+    def iter_records(self, values=None, start=0, stop=None):
+        """Yield records holding only the columns in values (all columns if
+        values is empty), for rows start to stop.
+        """
+        if values:
+            names = [name for name in values if name in self.blocks]
+        else:
+            names = self.columns
+        if stop is None or stop > self.rows:
+            stop = self.rows
+
+        # Rows are read a block at a time, column by column, so only one
+        # block of the requested columns is in memory at once.
+        for block_start in xrange(start, stop, self.block_size):
+            block_stop = min(block_start + self.block_size, stop)
+            columns = [(name, self.read_column(name, block_start, block_stop))
+                       for name in names]
+            for row in xrange(block_stop - block_start):
+                yield dict((name, column[row]) for name, column in columns
+                           if column[row] is not MISSING)
+
+
+MISSING = object()
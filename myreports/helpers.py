@@ -1,9 +1,13 @@
 from collections import OrderedDict
 from cStringIO import StringIO
+import cPickle
 import csv
 from datetime import datetime
+import heapq
 import HTMLParser
+from itertools import chain, islice
 import json
+import tempfile
 
 from django.core import serializers
 from django.core.serializers.json import DjangoJSONEncoder
@@ -11,6 +15,9 @@ from django.db.models import query
 from lxml import html
 from mypartners.models import CONTACT_TYPES
 
+# Most records sort_records sorts in memory at once.
+SORT_CHUNK_SIZE = 20000
+
 
 # TODO:
 # * allow other models to be humanized, maybe generalize the things being
@@ -149,13 +156,73 @@ def compare_records(order_by):
     return do_compare
 
 
-def sort_records(records, order_by, reverse):
+def sort_records(records, order_by, reverse, chunk_size=SORT_CHUNK_SIZE):
     """Sort dynamic reporting records by the given field.
 
-    records: records to sort
+    records: records to sort; any iterable
     order_by: name of field
     reverse: True for ascending, False for desending
+    chunk_size: most records sorted in memory at once. Longer inputs are
+        sorted chunk by chunk into temporary files which are then merged.
 
-    returns: a new set of records, sorted.
+    returns: a new set of records, sorted. A list when there were no more
+        than chunk_size records, otherwise an iterator.
     """
-    return sorted(records, compare_records(order_by), reverse=reverse)
+    records = iter(records)
+    chunk = list(islice(records, chunk_size))
+    extra = list(islice(records, 1))
+    if not extra:
+        return sorted(chunk, compare_records(order_by), reverse=reverse)
+    return _external_sort(chain(chunk, extra, records), order_by, reverse,
+                          chunk_size)
+
+
+class _SortKey(object):
+    """Orders records the way compare_records does, optionally reversed."""
+    __slots__ = ('value', 'reverse')
+
+    def __init__(self, value, reverse):
+        self.value = value
+        self.reverse = reverse
+
+    def __cmp__(self, other):
+        result = cmp(self.value, other.value)
+        return -result if self.reverse else result
+
+
+def _external_sort(records, order_by, reverse, chunk_size):
+    # Records are decorated with their position so that records comparing
+    # equal keep their original order, as they do with sorted().
+    decorated = ((_SortKey(record.get(order_by), reverse), position, record)
+                 for position, record in enumerate(records))
+    spilled = []
+    try:
+        while True:
+            chunk = sorted(islice(decorated, chunk_size))
+            if not chunk:
+                break
+            spill = tempfile.TemporaryFile()
+            spilled.append(spill)
+            pickler = cPickle.Pickler(spill, cPickle.HIGHEST_PROTOCOL)
+            for item in chunk:
+                pickler.dump((item[0].value, item[1], item[2]))
+                # Don't keep a reference to every pickled record.
+                pickler.clear_memo()
+            del chunk
+            spill.seek(0)
+
+        def read_spill(spill):
+            unpickler = cPickle.Unpickler(spill)
+            while True:
+                try:
+                    value, position, record = unpickler.load()
+                except EOFError:
+                    return
+                yield _SortKey(value, reverse), position, record
+
+        for _, _, record in heapq.merge(*[read_spill(spill)
+                                          for spill in spilled]):
+            yield record
+    finally:
+        for spill in spilled:
+            spill.close()
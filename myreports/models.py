@@ -1,19 +1,54 @@
 import json
+import tempfile
+from cStringIO import StringIO
+from itertools import islice
 
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 from django.core.exceptions import SuspiciousOperation
 from django.db import models
 from django.db.models.loading import get_model
 
+from myreports.columnar import ColumnarReader, write_columnar
 from myreports.helpers import serialize, determine_user_type
 from myreports.datasources import ds_json_drivers
 from myreports.report_configuration import (
     ReportConfiguration, ColumnConfiguration)
-from myreports.result_encoder import report_hook, ReportJsonEncoder
+from myreports.result_encoder import (
+    iter_report_records, report_hook, ReportJsonEncoder)
 from mypartners.models import SearchParameterManager
 
 
-class Report(models.Model):
+class ResultsFileMixin(object):
+    """
+    Reads a report's `results` file the first time `_results` is used, so
+    that instantiating reports (e.g. to list them) doesn't touch storage.
+    """
+    _results_cache = None
+
+    @property
+    def _results(self):
+        if self._results_cache is None:
+            self._results_cache = '{}'
+            if self.results:
+                try:
+                    self.results.open('rb')
+                    try:
+                        self._results_cache = self.results.read()
+                    finally:
+                        self.results.close()
+                except IOError:
+                    # If we are here, the file can't be found, which is
+                    # usually the case when testing locally and pointing to
+                    # QC/Staging/Production.
+                    pass
+        return self._results_cache
+
+    @_results.setter
+    def _results(self, value):
+        self._results_cache = value
+
+
+class Report(ResultsFileMixin, models.Model):
     """
     Models a Report which can be serialized in various formats.
 
@@ -43,19 +78,6 @@ class Report(models.Model):
 
     objects = SearchParameterManager()
 
-    def __init__(self, *args, **kwargs):
-        super(Report, self).__init__(*args, **kwargs)
-        self._results = '{}'
-
-        if self.results:
-            try:
-                self._results = self.results.read()
-            except IOError:
-                # If we are here, the file can't be found, which is usually the
-                # case when testing locally and pointing to
-                # QC/Staging/Production.
-                pass
-
     @property
     def json(self):
         return self._results
@@ -318,7 +340,7 @@ class ConfigurationColumn(models.Model):
     objects = ConfigurationColumnManager()
 
 
-class DynamicReport(models.Model):
+class DynamicReport(ResultsFileMixin, models.Model):
     """
     Models a Report which was generated from a Configuration.
 
@@ -345,19 +367,6 @@ class DynamicReport(models.Model):
 
     objects = SearchParameterManager()
 
-    def __init__(self, *args, **kwargs):
-        super(DynamicReport, self).__init__(*args, **kwargs)
-        self._results = '{}'
-
-        if self.results:
-            try:
-                self._results = self.results.read()
-            except IOError:
-                # If we are here, the file can't be found, which is usually the
-                # case when testing locally and pointing to
-                # QC/Staging/Production.
-                pass
-
     @property
     def json(self):
         return self._results
@@ -366,6 +375,77 @@ class DynamicReport(models.Model):
     def python(self):
         return json.loads(self._results, object_hook=report_hook)
 
+    @property
+    def columnar_name(self):
+        """Storage name of the columnar copy of the results."""
+        return '%s.columns' % self.results.name
+
+    def iter_records(self, values=None, start=0, stop=None):
+        """Yield the report's records one at a time.
+
+        values - if given, only these keys are included in each record
+        start, stop - if given, only rows start to stop are included
+
+        Records are read from the columnar copy of the results when there
+        is one, touching only the requested columns and rows. Otherwise the
+        results file is read incrementally, so the records are never all in
+        memory at once.
+        """
+        if self.results:
+            try:
+                columns_file = self.results.storage.open(self.columnar_name,
+                                                         'rb')
+                reader = ColumnarReader(columns_file)
+            except (IOError, ValueError):
+                pass
+            else:
+                try:
+                    for record in reader.iter_records(values, start, stop):
+                        yield record
+                finally:
+                    columns_file.close()
+                return
+
+        for record in islice(self._iter_json_records(), start, stop):
+            if values:
+                record = dict((value, record[value]) for value in values
+                              if value in record)
+            yield record
+
+    def _iter_json_records(self):
+        if self.results:
+            try:
+                self.results.open('rb')
+            except IOError:
+                pass
+            else:
+                try:
+                    for record in iter_report_records(self.results):
+                        yield record
+                finally:
+                    self.results.close()
+                return
+
+        for record in iter_report_records(StringIO(self._results)):
+            yield record
+
+    def record_count(self):
+        """Return the number of records in the results."""
+        if self.results:
+            try:
+                columns_file = self.results.storage.open(self.columnar_name,
+                                                         'rb')
+            except IOError:
+                pass
+            else:
+                try:
+                    return ColumnarReader(columns_file).rows
+                except ValueError:
+                    pass
+                finally:
+                    columns_file.close()
+        return sum(1 for _ in self._iter_json_records())
+
     def regenerate(self):
         report_type = self.report_data.report_type
         data_type = self.report_data.data_type
@@ -378,8 +458,18 @@ class DynamicReport(models.Model):
         results = ContentFile(contents)
 
         if self.results:
+            self.results.storage.delete(self.columnar_name)
             self.results.delete()
 
         self.results.save('%s-%s.json' % (self.name, self.pk), results)
         self._results = contents
         self.save()
+
+        if isinstance(data, list):
+            columns = tempfile.TemporaryFile()
+            try:
+                write_columnar(data, columns)
+                columns.seek(0)
+                self.results.storage.save(self.columnar_name, File(columns))
+            finally:
+                columns.close()
@@ -1,3 +1,32 @@
+import tempfile
+
+
+class ChunkedOutput(object):
+    """File-like object which collects writes for a streaming response.
+
+    Presentations write to it as they would to a file; `drain` hands back
+    what has been written since the last call once at least chunk_size bytes
+    are waiting (or always, if `force` is set).
+    """
+    def __init__(self, chunk_size=64 * 1024):
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self, data):
+        self.pending.append(data)
+        self.pending_size += len(data)
+
+    def drain(self, force=False):
+        if not self.pending or (not force and
+                                self.pending_size < self.chunk_size):
+            return ''
+        data = ''.join(self.pending)
+        self.pending = []
+        self.pending_size = 0
+        return data
+
+
 class Presentation(object):
     """Base class for Reporting presentation types.
 
@@ -23,7 +52,8 @@ class Presentation(object):
 
         values - Ordered list of columns to appear in the download.
             i.e. ['a', 'c', 'b']
-        records - List of dicts containing data to appear in the download.
+        records - Iterable of dicts containing data to appear in the
+            download. Records are consumed one at a time.
             i.e. [
             {'a': '1', 'b': '2', 'c', '3'},
             {'a': '4', 'b': '5', 'c', '6'},
@@ -41,3 +71,20 @@ class Presentation(object):
                     output.write('\\n')
         """
         pass
+
+    def iter_presentation(self, values, records, chunk_size=64 * 1024):
+        """Yield the bytes of the downloaded artifact in chunks.
+
+        Suitable as the content of a StreamingHttpResponse. By default the
+        artifact is written to a temporary file by write_presentation and
+        then read back; formats which can be produced a record at a time
+        override this to start yielding before all records are consumed.
+        """
+        output = tempfile.TemporaryFile()
+        try:
+            self.write_presentation(values, records, output)
+            output.seek(0)
+            for chunk in iter(lambda: output.read(chunk_size), ''):
+                yield chunk
+        finally:
+            output.close()
@@ -1,5 +1,5 @@
 import unicodecsv
-from myreports.presentation.base import Presentation
+from myreports.presentation.base import ChunkedOutput, Presentation
 
 
 class Csv(Presentation):
@@ -9,7 +9,18 @@ class Csv(Presentation):
     filename_extension = 'csv'
 
     def write_presentation(self, values, records, output):
+        for chunk in self.iter_presentation(values, records):
+            output.write(chunk)
+
+    def iter_presentation(self, values, records, chunk_size=64 * 1024):
+        output = ChunkedOutput(chunk_size)
         csvwriter = unicodecsv.writer(output, encoding='utf-8')
         csvwriter.writerow(values)
         for record in records:
             csvwriter.writerow(unicode(record[v]) for v in values)
+            chunk = output.drain()
+            if chunk:
+                yield chunk
+        chunk = output.drain(force=True)
+        if chunk:
+            yield chunk
@@ -1,5 +1,5 @@
 import json
-from myreports.presentation.base import Presentation
+from myreports.presentation.base import ChunkedOutput, Presentation
 
 
 class Json(Presentation):
@@ -12,7 +12,20 @@ class Json(Presentation):
     filename_extension = 'json'
 
     def write_presentation(self, values, records, output):
-        output.write(json.dumps({
-            'values': values,
-            'records': records,
-        }))
+        for chunk in self.iter_presentation(values, records):
+            output.write(chunk)
+
+    def iter_presentation(self, values, records, chunk_size=64 * 1024):
+        # Equivalent to json.dumps({'values': values, 'records': records}),
+        # without holding all of the records at once.
+        output = ChunkedOutput(chunk_size)
+        output.write('{"values": %s, "records": [' % json.dumps(values))
+        for index, record in enumerate(records):
+            if index:
+                output.write(', ')
+            output.write(json.dumps(record))
+            chunk = output.drain()
+            if chunk:
+                yield chunk
+        output.write(']}')
+        yield output.drain(force=True)
@@ -10,6 +10,7 @@ Serialized JSON objects handled by this module include a __type__ member.
 '''
 
 import json
+import re
 from datetime import datetime, time
 from django.utils.dateparse import parse_datetime, parse_time
 
@@ -32,6 +33,69 @@ def report_hook(obj):
         return obj
 
 
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_report_records(fileobj, chunk_size=64 * 1024):
+    """Yield the records of a JSON array of report records.
+
+    fileobj is read chunk_size bytes at a time, so only the record being
+    decoded is held in memory. Records are decoded with report_hook.
+
+    If fileobj doesn't contain an array (e.g. '{}' for a report without
+    results), nothing is yielded.
+    """
+    decoder = json.JSONDecoder(object_hook=report_hook)
+    chunks = iter(lambda: fileobj.read(chunk_size), '')
+    buf, pos = '', 0
+    state = 'start'
+
+    while True:
+        # Skip whitespace, reading more when we run out.
+        pos = WHITESPACE.match(buf, pos).end()
+        if pos == len(buf):
+            chunk = next(chunks, None)
+            if chunk is None:
+                if state == 'start':
+                    return
+                raise ValueError("Unexpected end of report results")
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        if state == 'start':
+            if buf[pos] != '[':
+                value = json.loads(buf[pos:] + ''.join(chunks),
+                                   object_hook=report_hook)
+                if isinstance(value, list):
+                    for record in value:
+                        yield record
+                return
+            pos += 1
+            state = 'first'
+        elif state in ('first', 'next') and buf[pos] == ']':
+            return
+        elif state == 'next':
+            if buf[pos] != ',':
+                raise ValueError("Expected ',' at report results offset %s" %
+                                 pos)
+            pos += 1
+            state = 'record'
+        else:
+            # Every record ends with a closing bracket or quote, so a record
+            # which decodes is complete.
+            while True:
+                try:
+                    record, pos = decoder.raw_decode(buf, pos)
+                    break
+                except ValueError:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        raise
+                    buf, pos = buf[pos:] + chunk, 0
+            yield record
+            state = 'next'
+
+
 class ReportJsonEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, datetime):
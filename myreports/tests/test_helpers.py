@@ -184,3 +184,13 @@ class TestSorting(TestCase):
         self.assertEqual([b, a, a], sort_records([a, a, b], 'd', True))
         self.assertEqual([b, a, a], sort_records([a, a, b], 'e', False))
         self.assertEqual([a, a, b], sort_records([a, a, b], 'e', True))
+
+    def test_sort_spilled(self):
+        """Sorting in spilled chunks matches sorting in memory."""
+        records = [{'d': i % 7, 'e': i} for i in range(100)]
+        records.append({'e': 100})
+        for reverse in [False, True]:
+            self.assertEqual(
+                sort_records(records, 'd', reverse),
+                list(sort_records(iter(records), 'd', reverse,
+                                  chunk_size=9)))
@@ -353,6 +353,31 @@ class TestDynamicReport(MyReportsTestCase):
         self.assertEqual(10, len(report.python))
         self.assertEqual(expected_column_names, set(report.python[0]))
 
+    def test_lazy_columnar_results(self):
+        """Results load lazily and can be read column by column."""
+        partner = PartnerFactory(owner=self.company)
+        for i in range(0, 10):
+            ContactFactory.create(name="name-%s" % i, partner=partner)
+
+        report_data = (
+            self.dynamic_models['report_type/data_type']
+            ['contacts/unaggregated'])
+        report = DynamicReport.objects.create(
+            report_data=report_data,
+            owner=self.company)
+        report.regenerate()
+
+        report = DynamicReport.objects.get(pk=report.pk)
+        self.assertIsNone(report._results_cache)
+        self.assertEqual(10, report.record_count())
+        self.assertIsNone(report._results_cache)
+
+        records = report.python
+        self.assertEqual(records, list(report.iter_records()))
+        self.assertEqual(
+            [{'name': r['name'], 'email': r['email']} for r in records[2:5]],
+            list(report.iter_records(['name', 'email'], 2, 5)))
+
     def test_filtered_report(self):
         """Run a dynamic report with a filter."""
         partner = PartnerFactory(owner=self.company)
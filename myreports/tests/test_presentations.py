@@ -1,9 +1,11 @@
+import json
 from zipfile import ZipFile
 from cStringIO import StringIO
 from unittest import TestCase
 from defusedxml.ElementTree import fromstring
 from myreports.presentation.disposition import get_content_disposition
 from myreports.presentation.csv import Csv
+from myreports.presentation.jsonpass import Json
 from myreports.presentation.xlsx import Xlsx
 
 
@@ -43,12 +45,34 @@ class TestCsv(TestCase):
         records = [{'A': u'aa\u2019zz'}]
         self.assert_content(expected, values, records)
 
+    def test_iter_presentation(self):
+        """Records can be a generator and are written in chunks."""
+        values = ['A']
+        records = ({'A': i} for i in range(100))
+        chunks = list(self.csv.iter_presentation(values, records,
+                                                 chunk_size=10))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(
+            "A\r\n" + "".join("%s\r\n" % i for i in range(100)),
+            "".join(chunks))
+
     def assert_content(self, expected, values, records):
         output = StringIO()
         self.csv.write_presentation(values, records, output)
         self.assertEqual(expected, output.getvalue())
 
 
+class TestJson(TestCase):
+    def test_iter_presentation(self):
+        """Streamed json matches the records that went in."""
+        values = ['A', 'B']
+        records = [{'A': i, 'B': u'b\u2019'} for i in range(50)]
+        content = "".join(Json().iter_presentation(
+            values, iter(records), chunk_size=16))
+        self.assertEqual({'values': values, 'records': records},
+                         json.loads(content))
+
+
 class TestXlsx(TestCase):
     xlsx = Xlsx()
     ns = {
@@ -1,11 +1,12 @@
 from unittest import TestCase
 
 import json
+from cStringIO import StringIO
 from datetime import datetime, tzinfo, timedelta, time
 
 from myreports.result_encoder import (
     report_hook, ReportJsonEncoder, parse_datetime, parse_time,
-    encode_datetime, encode_time)
+    encode_datetime, encode_time, iter_report_records)
 
 
 class LocalTime(tzinfo):
@@ -52,3 +53,17 @@ class TestResultEncoding(TestCase):
         decoded = json.loads(encoded, object_hook=report_hook)
 
         self.assertEqual(data, decoded)
+
+    def test_iter_report_records(self):
+        """Records decode one at a time, whatever the read size."""
+        records = [{'a': i, 'b': datetime(2015, 12, 23, i)}
+                   for i in range(20)]
+        encoded = json.dumps(records, cls=ReportJsonEncoder, indent=1)
+        for chunk_size in [1, 7, 1024 * 1024]:
+            result = list(iter_report_records(StringIO(encoded), chunk_size))
+            self.assertEqual(records, result)
+
+        self.assertEqual([], list(iter_report_records(StringIO('{}'))))
+        self.assertEqual([], list(iter_report_records(StringIO(''))))
+        with self.assertRaises(ValueError):
+            list(iter_report_records(StringIO('[{"a": 1}, {"a":'), 4))
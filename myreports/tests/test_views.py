@@ -754,7 +754,7 @@ class TestDynamicReports(MyReportsTestCase):
         resp = self.client.get(reverse('download_dynamic_report'), data)
         self.assertEquals(200, resp.status_code)
 
-        response_data = json.loads(resp.content)
+        response_data = json.loads(''.join(resp.streaming_content))
         self.assertEquals(10, len(response_data['records']))
 
         first_found_name = response_data['records'][0]['Name']
@@ -804,7 +804,7 @@ class TestDynamicReports(MyReportsTestCase):
         }
         resp = self.client.get(reverse('download_dynamic_report'), data)
         self.assertEquals(200, resp.status_code)
-        response_data = json.loads(resp.content)
+        response_data = json.loads(''.join(resp.streaming_content))
         self.assertEquals(21, len(response_data['records']))
 
         last_found_name = response_data['records'][-1]['Name']
@@ -898,7 +898,7 @@ class TestDynamicReports(MyReportsTestCase):
         }
         resp = self.client.get(reverse('download_dynamic_report'), data)
         self.assertEquals(200, resp.status_code)
-        response_data = json.loads(resp.content)
+        response_data = json.loads(''.join(resp.streaming_content))
         self.assertEquals(20, len(response_data['records']))
 
         last_subject = response_data['records'][-1]['Subject']
@@ -944,7 +944,7 @@ class TestDynamicReports(MyReportsTestCase):
         }
         resp = self.client.get(reverse('download_dynamic_report'), data)
         self.assertEquals(200, resp.status_code)
-        response_data = json.loads(resp.content)
+        response_data = json.loads(''.join(resp.streaming_content))
         self.assertEquals(1, len(response_data['records']))
 
         found_name = response_data['records'][0]['Name']
@@ -1049,7 +1049,7 @@ class TestDynamicReports(MyReportsTestCase):
         self.assertIn('The_Report.csv', resp['content-disposition'])
         self.assertIn('text/csv', resp['content-type'])
 
-        lines = resp.content.splitlines()
+        lines = ''.join(resp.streaming_content).splitlines()
         self.assertEquals('URL,Name', lines[0])
         self.assertEquals('somewhere,partner-0 \xe2\x80\x99', lines[2])
 
@@ -1100,7 +1100,7 @@ class TestDynamicReports(MyReportsTestCase):
         }
         resp = self.client.get(reverse('download_dynamic_report'), data)
         self.assertEquals(200, resp.status_code)
-        response_data = json.loads(resp.content)
+        response_data = json.loads(''.join(resp.streaming_content))
         self.assertEquals(21, len(response_data['records']))
 
         found_name = response_data['records'][0]['Name']
@@ -1224,7 +1224,7 @@ class TestDynamicReports(MyReportsTestCase):
         }
         resp = self.client.get(reverse('download_dynamic_report'), data)
         self.assertEquals(200, resp.status_code)
-        response_data = json.loads(resp.content)
+        response_data = json.loads(''.join(resp.streaming_content))
         self.assertEquals(12, len(response_data['records']))
         january = response_data['records'][0]
         self.assertEqual('1', january['Month'])
@@ -5,7 +5,7 @@ import json
 from django.core.files.base import ContentFile
 from django.db.models import Q
 from django.db.models.loading import get_model
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render_to_response
 from django.template import RequestContext
 from django.utils.decorators import method_decorator
@@ -26,8 +26,6 @@ from universal.api_validation import ApiValidator
 
 from myreports.datasources import ds_json_drivers
 
-from cStringIO import StringIO
-
 
 @require_http_methods(['GET'])
 @requires('read partner', 'read contact', 'read communication record')
@@ -513,7 +511,7 @@ def export_options_api(request):
         return validator.build_error_response()
 
     report = report_list[0]
-    count = len(report.python)
+    count = report.record_count()
     rps = (ReportPresentation.objects
            .active_for_report_type_data_type(report.report_data))
 
@@ -776,10 +774,10 @@ def download_dynamic_report(request):
     if len(values) == 0:
         values = report_configuration.get_header()
 
-    records = [
+    records = (
         report_configuration.format_record(r, values)
-        for r in report.python
-    ]
+        for r in report.iter_records(values)
+    )
 
     sorted_records = records
     if order_by:
@@ -791,20 +789,18 @@ def download_dynamic_report(request):
     presentation_driver = (
         report_presentation.presentation_type.presentation_type)
     presentation = presentation_drivers[presentation_driver]
-    response = HttpResponse(content_type=presentation.content_type)
+    aliases = [
+        c.alias for value in values for c in report_configuration.columns
+        if c.column == value
+    ]
+    response = StreamingHttpResponse(
+        presentation.iter_presentation(aliases, sorted_records),
+        content_type=presentation.content_type)
     disposition = get_content_disposition(
         report.name,
         presentation.filename_extension)
     response['Content-Disposition'] = disposition
 
-    output = StringIO()
-    values = [
-        c.alias for value in values for c in report_configuration.columns
-        if c.column == value
-    ]
-    presentation.write_presentation(values, sorted_records, output)
-    response.write(output.getvalue())
-
     return response
 
 
@@ -1,4 +1,6 @@
+from contextlib import contextmanager
 import json
+import threading
 import urllib
 import urllib2
 from urlparse import urlparse, urlunparse, parse_qs, parse_qsl
@@ -11,6 +13,7 @@ from dateutil import parser as dateparser
 from django.conf import settings
 from django.utils.encoding import smart_str, smart_unicode
 
+from universal.cache import LRUCache
 from universal.helpers import get_domain
 
 
@@ -45,6 +48,87 @@ def update_url_if_protected(url, user):
     return url
 
 
+# Maximum number of feeds held by a FeedCache.
+FEED_CACHE_SIZE = 1000
+
+_feed_caches = threading.local()
+
+
+def normalize_feed_url(feed_url):
+    """
+    Normalizes a feed url so that urls requesting the same results compare
+    equal, regardless of the order of their query parameters.
+
+    Inputs:
+    :feed_url: URL of a job feed
+
+    Outputs:
+    :feed_url: The url with a lowercase host and sorted query parameters
+    """
+    parts = urlparse(feed_url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunparse((parts.scheme.lower(), parts.netloc.lower(), parts.path,
+                       parts.params, query, ''))
+
+
+class FeedCache(LRUCache):
+    """
+    Size-bounded memo of fetched feeds, keyed on their normalized url. When
+    the cache is full, the least recently used feed is evicted.
+
+    Feeds are cached as fetched rather than parsed, so every caller gets its
+    own copy of the parsed items to modify.
+    """
+    def __init__(self, max_size=FEED_CACHE_SIZE):
+        super(FeedCache, self).__init__(max_size=max_size)
+
+    def get_feed(self, feed_url, fetch):
+        """
+        Returns the cached body of feed_url, calling fetch(feed_url) to
+        retrieve it if it isn't cached.
+        """
+        return self.get_or_set(normalize_feed_url(feed_url),
+                               lambda: fetch(feed_url))
+
+    @property
+    def stats(self):
+        """
+        The number of distinct feeds fetched ('queries') and the total
+        number of feeds requested ('lookups').
+        """
+        return {'queries': self.misses, 'lookups': self.hits + self.misses}
+
+
+@contextmanager
+def shared_feed_cache(max_size=FEED_CACHE_SIZE):
+    """
+    Context manager which caches the feeds fetched by parse_feed, and
+    anything else using fetch_feed, for the duration of the block. Yields
+    the FeedCache in use.
+
+    Saved searches sent together often share a feed; within the block, each
+    distinct feed is only requested once.
+    """
+    previous = getattr(_feed_caches, 'cache', None)
+    _feed_caches.cache = FeedCache(max_size)
+    try:
+        yield _feed_caches.cache
+    finally:
+        _feed_caches.cache = previous
+
+
+def fetch_feed(feed_url):
+    """
+    Returns the body of the feed at feed_url, from the shared feed cache if
+    one is active.
+    """
+    cache = getattr(_feed_caches, 'cache', None)
+    if cache is None:
+        return urllib2.urlopen(feed_url).read()
+    return cache.get_feed(feed_url,
+                          lambda url: urllib2.urlopen(url).read())
+
+
 def get_rss_soup(rss_url):
     """
     Turn a URL into a BeautifulSoup object
@@ -55,7 +139,7 @@ def get_rss_soup(rss_url):
     Outputs:
                    BeautifulSoup object
     """
-    rss_feed = urllib2.urlopen(rss_url).read()
+    rss_feed = fetch_feed(rss_url)
     return BeautifulSoup(rss_feed, "html.parser")
 
 
@@ -129,7 +213,7 @@ def get_json(json_url):
     Outputs:
                     List of one or more Python dictionaries
     """
-    return json.loads(urllib2.urlopen(json_url).read())
+    return json.loads(fetch_feed(json_url))
 
 
 def parse_feed(feed_url, frequency='W', num_items=100, offset=0,
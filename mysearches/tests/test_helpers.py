@@ -5,11 +5,13 @@ from urlparse import urlparse, parse_qs
 from django.conf import settings
 from django.contrib.auth.models import Group
 
+from mock import patch
+
 from myjobs.tests.setup import MyJobsBase
 from mysearches.models import SavedSearch
-from mysearches.helpers import (date_in_range, parse_feed,
-                                update_url_if_protected, url_sort_options,
-                                validate_dotjobs_url)
+from mysearches.helpers import (date_in_range, FeedCache, parse_feed,
+                                shared_feed_cache, update_url_if_protected,
+                                url_sort_options, validate_dotjobs_url)
 
 
 class SavedSearchHelperTests(MyJobsBase):
@@ -91,6 +93,36 @@ class SavedSearchHelperTests(MyJobsBase):
         items, count = parse_feed(feed_url, num_items=num_items)
         self.assertEqual(count, num_items)
 
+    def test_parse_feed_with_shared_cache(self):
+        """
+        Within shared_feed_cache, each distinct feed is only requested once,
+        however its query parameters are ordered.
+        """
+        urls = ['http://www.my.jobs/jobs/feed/rss?q=nurse&location=chicago',
+                'http://www.my.jobs/jobs/feed/rss?location=chicago&q=nurse',
+                'http://www.my.jobs/jobs/feed/rss?q=nurse']
+        with patch('urllib2.urlopen', wraps=self.mock_urlopen) as urlopen:
+            with shared_feed_cache() as feeds:
+                results = [parse_feed(url) for url in urls]
+
+        self.assertEqual(urlopen.call_count, 2)
+        self.assertEqual(feeds.stats, {'queries': 2, 'lookups': 3})
+        self.assertEqual(results[0], results[1])
+        # Callers get their own items to modify
+        self.assertIsNot(results[0][0][0], results[1][0][0])
+
+    def test_feed_cache_eviction(self):
+        cache = FeedCache(max_size=2)
+        for url in ['http://a.jobs', 'http://b.jobs', 'http://a.jobs',
+                    'http://c.jobs', 'http://a.jobs', 'http://b.jobs']:
+            cache.get_feed(url, lambda url: url)
+        # b.jobs was the least recently used feed when c.jobs was added.
+        self.assertEqual(cache.stats, {'queries': 4, 'lookups': 6})
+        self.assertEqual(cache.evictions, 2)
+        self.assertIn('http://a.jobs', cache)
+        self.assertIn('http://b.jobs', cache)
+        self.assertNotIn('http://c.jobs', cache)
+
     def test_url_sort_options(self):
         feed = 'http://www.my.jobs/jobs/feed/rss?date_sort=False'
 
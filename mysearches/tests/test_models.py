@@ -26,7 +26,8 @@ from mysearches.tests.factories import (SavedSearchFactory,
                                         SavedSearchDigestFactory,
                                         PartnerSavedSearchFactory)
 from registration.models import ActivationProfile, Invitation
-from tasks import send_search_digests, requeue_missed_searches
+from tasks import (send_search_digests, requeue_missed_searches,
+                   plan_search_digests)
 
 
 @freeze_time("2016-10-01 10:00:00")
@@ -176,6 +177,33 @@ class SavedSearchModelsTests(MyJobsBase):
         send_search_digests()
         self.assertEqual(len(mail.outbox), 1)
 
+    def test_plan_search_digests(self):
+        """
+        Searches due today are planned in batches. Users with an active
+        digest are only planned for their digest.
+        """
+        SavedSearchDigestFactory(user=self.user, is_active=False)
+        searches = [SavedSearchFactory(user=self.user, frequency='D')
+                    for _ in range(3)]
+        # Not due on a Saturday
+        SavedSearchFactory(user=self.user, frequency='W', day_of_week='1')
+
+        user = UserFactory(email='digest@example.com')
+        digest = SavedSearchDigestFactory(user=user, email=user.email)
+        SavedSearchFactory(user=user, email=user.email, frequency='D')
+
+        batches = plan_search_digests(batch_size=2)
+        self.assertEqual(batches, [
+            ('SavedSearchDigest', [digest.pk]),
+            ('SavedSearch', [searches[0].pk, searches[1].pk]),
+            ('SavedSearch', [searches[2].pk])])
+
+        stats = send_search_digests()
+        self.assertEqual(stats, {'planned': 4, 'sent': 4, 'batches': 2})
+        for search in searches:
+            self.assertIsNotNone(
+                SavedSearch.objects.get(pk=search.pk).last_sent)
+
     def test_initial_email(self):
         search = SavedSearchFactory(user=self.user, is_active=False,
                                     url='www.my.jobs/search?q=new+search')
@@ -1,5 +1,11 @@
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from import_jobs.solr import guid_delete_queries
 from myjobs.models import AppAccess, Activity
-from postajob.models import SitePackage
+from postajob.models import Job, JobLocation, SitePackage
+from transform import transform_for_postajob
 from myblocks.models import (raw_base_template, Page, Row, RowOrder,
                              LoginBlock, BlockOrder)
 
@@ -131,3 +137,91 @@ def enable_marketplace(company, site):
     package.sites.add(site)
 
     return package
+
+
+# Number of jobs expired or renewed together by expire_due_jobs and
+# renew_due_jobs.
+EXPIRE_BATCH_SIZE = 1000
+
+
+def job_batches(jobs, batch_size=EXPIRE_BATCH_SIZE):
+    """
+    Splits the primary keys of a queryset of jobs into lists of batch_size.
+
+    """
+    pks = list(jobs.order_by('pk').values_list('pk', flat=True))
+    for index in xrange(0, len(pks), batch_size):
+        yield pks[index:index + batch_size]
+
+
+def expire_due_jobs(writer, today=None, batch_size=EXPIRE_BATCH_SIZE):
+    """
+    Expires jobs which expired before today and don't renew automatically.
+
+    Each batch of jobs is removed from Solr with one delete per 1024
+    locations, then marked expired with a single UPDATE. Jobs are only
+    marked once they are out of Solr, so an interrupted run can simply be
+    run again.
+
+    Inputs:
+        :writer: The import_jobs.solr.SolrWriter to send deletes through
+        :today: The day to expire jobs as of; defaults to today
+        :batch_size: Number of jobs per batch
+
+    Outputs:
+        The number of jobs expired
+    """
+    today = today or date.today()
+    jobs = Job.objects.filter(date_expired__lt=today, is_expired=False,
+                              autorenew=False)
+    expired = 0
+    for pks in job_batches(jobs, batch_size):
+        guids = JobLocation.objects.filter(jobs__in=pks).values_list(
+            'guid', flat=True)
+        for query in guid_delete_queries(list(guids)):
+            writer.delete(query)
+        writer.flush()
+        expired += Job.objects.filter(pk__in=pks, is_expired=False).update(
+            is_expired=True, date_updated=timezone.now())
+        # As in Job.save(), an expired job never expires in the future. This
+        # only happens when expiring as of a day after today.
+        Job.objects.filter(pk__in=pks, date_expired__gt=date.today()).update(
+            date_expired=date.today())
+    return expired
+
+
+def renew_due_jobs(writer, today=None, batch_size=EXPIRE_BATCH_SIZE):
+    """
+    Renews jobs which expired before today and renew automatically for
+    another 30 days.
+
+    Each batch of jobs is sent to Solr with their new date_updated, then
+    renewed with a single UPDATE. As with expire_due_jobs, an interrupted
+    run can simply be run again.
+
+    Inputs:
+        :writer: The import_jobs.solr.SolrWriter to send documents through
+        :today: The day to renew jobs as of; defaults to today
+        :batch_size: Number of jobs per batch
+
+    Outputs:
+        The number of jobs renewed
+    """
+    today = today or date.today()
+    jobs = Job.objects.filter(date_expired__lt=today, is_expired=False,
+                              autorenew=True)
+    renewed = 0
+    for pks in job_batches(jobs, batch_size):
+        updated = timezone.now()
+        docs = []
+        batch = Job.objects.filter(pk__in=pks).select_related(
+            'owner').prefetch_related('locations', 'site_packages')
+        for job in batch:
+            job.date_updated = updated
+            docs.extend(transform_for_postajob(doc)
+                        for doc in job.solr_dict())
+        writer.add(docs)
+        renewed += Job.objects.filter(pk__in=pks, date_expired__lt=today,
+                                      is_expired=False).update(
+            date_expired=today + timedelta(days=30), date_updated=updated)
+    return renewed
@@ -10,7 +10,7 @@ from django.core.validators import MinValueValidator
 from django.dispatch import receiver
 from django.db import models, DEFAULT_DB_ALIAS
 from django.db.models.query import QuerySet
-from django.db.models.signals import pre_delete, m2m_changed
+from django.db.models.signals import m2m_changed, post_save, pre_delete
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
 
@@ -18,6 +18,8 @@ from location_data import countries, all_regions, country_list, state_list
 from universal.helpers import send_email
 
 from import_jobs.solr import add_jobs, delete_by_guid
+from seo.site_context import (invalidate_instance_contexts,
+                               invalidate_m2m_contexts)
 from transform import transform_for_postajob
 
 class BaseManagerMixin(object):
@@ -549,6 +551,15 @@ class SitePackage(Package):
         self.save()
 
 
+# The packages a site belongs to are part of its site context.
+post_save.connect(invalidate_instance_contexts, sender=SitePackage,
+                  dispatch_uid='postajob.site_context.save')
+pre_delete.connect(invalidate_instance_contexts, sender=SitePackage,
+                   dispatch_uid='postajob.site_context.delete')
+m2m_changed.connect(invalidate_m2m_contexts, sender=SitePackage.sites.through,
+                    dispatch_uid='postajob.site_context.sites')
+
+
 class PurchasedProduct(BaseModel):
     FILTER_BY_SITES_KWARGS = 'product__package__sitepackage__sites__in'
     EVENT_FIELDS = {'value': ['jobs_remaining', 'is_approved'],
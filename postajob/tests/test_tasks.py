@@ -2,6 +2,8 @@ import datetime
 
 from myjobs.tests.setup import MyJobsBase
 from seo.tests.factories import CompanyFactory
+from import_jobs.solr import SolrWriter
+from postajob.helpers import expire_due_jobs, renew_due_jobs
 from postajob.models import Job, JobLocation
 from tasks import expire_jobs
 
@@ -135,3 +137,35 @@ class TaskTests(MyJobsBase):
         # jobs.
         for job in autorenew_jobs:
             self.assertEqual(new_expire_date, job.date_expired)
+
+    def test_bulk_expiry_is_resumable(self):
+        """
+        Jobs are expired and renewed in batches, and running again after a
+        completed (or interrupted) run only picks up what is left.
+        """
+        for autorenew in [False] * 3 + [True] * 2:
+            job = dict(self.job_data)
+            job['date_expired'] = (datetime.date.today() -
+                                   datetime.timedelta(days=1))
+            job['autorenew'] = autorenew
+            instance = Job.objects.create(**job)
+            location = JobLocation.objects.create(**self.location_data)
+            instance.locations.add(location)
+            instance.save()
+        self.assertEqual(self.ms_solr.search('*:*').hits, 5)
+
+        writer = SolrWriter()
+        try:
+            self.assertEqual(expire_due_jobs(writer, batch_size=2), 3)
+            self.assertEqual(renew_due_jobs(writer, batch_size=2), 2)
+            self.assertEqual(expire_due_jobs(writer, batch_size=2), 0)
+            self.assertEqual(renew_due_jobs(writer, batch_size=2), 0)
+        finally:
+            writer.close()
+
+        self.assertEqual(self.ms_solr.search('*:*').hits, 2)
+        self.assertEqual(Job.objects.filter(is_expired=True).count(), 3)
+        self.assertEqual(
+            Job.objects.filter(
+                date_expired=(datetime.date.today() +
+                              datetime.timedelta(days=30))).count(), 2)
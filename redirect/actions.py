@@ -18,11 +18,36 @@ def replace_or_add_query(url, query, exclusions=None):
     Outputs:
     :url: Input url with query string appended
     """
-    if not exclusions:
-        exclusions = []
+    return add_parsed_query(url, parse_query(query), exclusions)
+
+
+def parse_query(query):
+    """
+    Parses a query string for use with add_parsed_query, so that a query
+    which is added to many urls only needs to be parsed once.
+
+    Inputs:
+    :query: Query string(s) to add to urls
+
+    Outputs:
+    :parsed: A list of (key, value) pairs if :query: starts with ? or &,
+        otherwise :query: itself, which will be appended verbatim
+    """
     if len(query) > 1 and query[0] in ['?', '&']:
         query = query[1:]
         query = query.encode('utf-8')
+        return urlparse.parse_qsl(query, keep_blank_values=True)
+    return query
+
+
+def add_parsed_query(url, new_query, exclusions=None):
+    """
+    replace_or_add_query for a query that has already been through
+    parse_query.
+    """
+    if not exclusions:
+        exclusions = []
+    if isinstance(new_query, list):
         url = url.encode('utf-8')
         url = urlparse.urlparse(url)
         old_query = urlparse.parse_qsl(url.query, keep_blank_values=True)
@@ -30,8 +55,6 @@ def replace_or_add_query(url, query, exclusions=None):
         # make a lower-case copy of old_keys so we can do some comparisons
         insensitive_keys = map(str.lower, old_keys)
 
-        new_query = urlparse.parse_qsl(query, keep_blank_values=True)
-
         # For each source code that we are going to add
         for new_index in range(len(new_query)):
             # Make sure we are not adding a source code that should be excluded
@@ -59,7 +82,7 @@ def replace_or_add_query(url, query, exclusions=None):
         url = urlparse.urlunparse(url)
     else:
         parts = url.split('#')
-        parts[0] += query
+        parts[0] += new_query
         url = '#'.join(parts)
     return url
 
@@ -0,0 +1,92 @@
+"""
+Per business unit redirect data, cached in process memory.
+
+Every click on a job link needs the business unit's canonical microsite and
+its DestinationManipulation rows. These change rarely, so they are loaded
+once per business unit and held in an LRU cache with a TTL. Entries are
+dropped whenever a CanonicalMicrosite or DestinationManipulation is saved
+or deleted in this process; the TTL bounds how stale other processes can
+be.
+
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from redirect.models import CanonicalMicrosite, DestinationManipulation
+from redirect.plans import ManipulationPlan
+from universal.cache import LRUCache
+
+
+resolutions = LRUCache(
+    max_size=getattr(settings, 'REDIRECT_RESOLUTION_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'REDIRECT_RESOLUTION_CACHE_TTL', 300))
+
+
+class BuidResolution(object):
+    """
+    The canonical microsite and manipulations for one business unit.
+
+    :microsite: The CanonicalMicrosite for this business unit, or None.
+    :manipulations: A dictionary of view source -> tuple of
+        DestinationManipulation instances ordered by action_type.
+
+    """
+    def __init__(self, buid, microsite, manipulations):
+        self.buid = buid
+        self.microsite = microsite
+        self.manipulations = manipulations
+        self._plans = {}
+
+    @classmethod
+    def load(cls, buid):
+        microsite = CanonicalMicrosite.objects.filter(buid=buid).first()
+        manipulations = defaultdict(list)
+        for manipulation in DestinationManipulation.objects.filter(
+                buid=buid).order_by('view_source', 'action_type'):
+            manipulations[manipulation.view_source].append(manipulation)
+        return cls(buid, microsite, dict(
+            (view_source, tuple(items))
+            for view_source, items in manipulations.iteritems()))
+
+    def manipulations_for(self, view_source):
+        """
+        Returns the manipulations for `view_source`, falling back to those
+        for view source 0 if there are none.
+
+        """
+        manipulations = self.manipulations.get(view_source, ())
+        if not manipulations and view_source != 0:
+            manipulations = self.manipulations.get(0, ())
+        return manipulations
+
+    def plan_for(self, view_source):
+        """
+        Returns the compiled ManipulationPlan for `manipulations_for(
+        view_source)`, building it on first use.
+
+        """
+        plan = self._plans.get(view_source)
+        if plan is None:
+            plan = ManipulationPlan(self.manipulations_for(view_source))
+            self._plans[view_source] = plan
+        return plan
+
+
+def get_buid_resolution(buid):
+    """Returns the (possibly cached) BuidResolution for a business unit."""
+    return resolutions.get_or_set(buid, lambda: BuidResolution.load(buid))
+
+
+@receiver(post_save, sender=CanonicalMicrosite,
+          dispatch_uid='redirect_resolution_microsite_saved')
+@receiver(post_delete, sender=CanonicalMicrosite,
+          dispatch_uid='redirect_resolution_microsite_deleted')
+@receiver(post_save, sender=DestinationManipulation,
+          dispatch_uid='redirect_resolution_manipulation_saved')
+@receiver(post_delete, sender=DestinationManipulation,
+          dispatch_uid='redirect_resolution_manipulation_deleted')
+def invalidate_buid_resolution(sender, instance, **kwargs):
+    resolutions.delete(instance.buid)
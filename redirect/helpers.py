@@ -25,10 +25,10 @@ from django.utils import timezone
 
 
 from myjobs.models import User
-import redirect.actions
 from redirect.actions import replace_or_add_query, quote_string
-from redirect.models import (CanonicalMicrosite, DestinationManipulation,
-                             Redirect, ViewSource)
+from redirect.cache import get_buid_resolution
+from redirect.models import Redirect, ViewSource
+from redirect.plans import ManipulationPlan
 
 
 STATE_MAP = {
@@ -89,7 +89,7 @@ def do_manipulations(guid_redirect, manipulations,
 
     Inputs:
     :guid_redirect: Redirect object for this job
-    :manipulations: List of DestinationManipulation objects
+    :manipulations: Sequence of DestinationManipulation objects
     :return_dict: Dictionary of values used in all levels of the
         main redirect view
     :debug_content: List of strings that will be output on the debug page
@@ -97,67 +97,12 @@ def do_manipulations(guid_redirect, manipulations,
     Modifies:
     :return_dict: Potentially modifies the redirect_url key
     :debug_content: Potentially adds new debug strings
-    """
-    if manipulations and not return_dict['redirect_url']:
-        for manipulation in manipulations:
-            method_name = manipulation.action
-            if debug_content:
-                debug_content.append(
-                    'ActionTypeID=%s Action=%s' %
-                    (manipulation.action_type,
-                     manipulation.action))
 
-            try:
-                redirect_method = getattr(redirect.actions, method_name)
-            except AttributeError:
-                pass
-            else:
-
-                if manipulation.action in [
-                        'doubleclickwrap', 'replacethenaddpre',
-                        'sourceurlwrap', 'sourceurlwrapappend',
-                        'sourceurlwrapunencoded',
-                        'sourceurlwrapunencodedappend']:
-                    # These actions all result in our final url being
-                    # appended, usually as a query string, to a value
-                    # determined by the manipulation object; due to
-                    # this, we should add any custom query parameters
-                    # before doing the manipulation.
-                    if return_dict['enable_custom_queries']:
-                        guid_redirect.url = replace_or_add_query(
-                            guid_redirect.url,
-                            '&%s' % return_dict.get('qs'),
-                            exclusions=['vs', 'z'])
-                    redirect_url = redirect_method(guid_redirect,
-                                                   manipulation)
-                else:
-                    redirect_url = redirect_method(guid_redirect,
-                                                   manipulation)
-
-                    # manipulations is a QuerySet, which doesn't
-                    # support negative indexing; reverse the set and
-                    # take the first element to get the last
-                    # DestinationManipulation object.
-                    if manipulation == manipulations.reverse()[:1][0]:
-                        # Only add custom query parameters after
-                        # processing the final DestinationManipulation
-                        # object to ensure we're not needlessly
-                        # replacing them on each iteration.
-                        if return_dict['enable_custom_queries']:
-                            redirect_url = replace_or_add_query(
-                                redirect_url,
-                                '&%s' % return_dict.get('qs'),
-                                exclusions=['vs', 'z'])
-                return_dict['redirect_url'] = redirect_url
-
-                if debug_content:
-                    debug_content.append(
-                        'ActionTypeID=%s ManipulatedLink=%s VSID=%s' %
-                        (manipulation.action_type,
-                         return_dict['redirect_url'],
-                         manipulation.view_source))
-
-                guid_redirect.url = return_dict['redirect_url']
+    Redirects normally use the plan cached for their business unit and
+    view source (see get_manipulation_plan) instead of calling this.
+    """
+    ManipulationPlan(manipulations or ()).apply(guid_redirect, return_dict,
+                                                debug_content)
 
 
 def get_manipulations(guid_redirect, vs_to_use):
@@ -170,17 +115,26 @@ def get_manipulations(guid_redirect, vs_to_use):
     :vs_to_use: View source to retrieve manipulations for
 
     Outputs:
-    :manipulations: List of DestinationManipulation objects, or None if none
-        exist
+    :manipulations: Tuple of DestinationManipulation objects, ordered by
+        action_type; empty if none exist
+    """
+    return get_buid_resolution(guid_redirect.buid).manipulations_for(
+        vs_to_use)
+
+
+def get_manipulation_plan(guid_redirect, vs_to_use):
+    """
+    Retrieves the compiled ManipulationPlan for the manipulations returned
+    by get_manipulations
+
+    Inputs:
+    :guid_redirect: Redirect object for this job
+    :vs_to_use: View source to retrieve the plan for
+
+    Outputs:
+    :plan: ManipulationPlan; empty if no manipulations exist
     """
-    manipulations = DestinationManipulation.objects.filter(
-        buid=guid_redirect.buid,
-        view_source=vs_to_use).order_by('action_type')
-    if not manipulations and vs_to_use != 0:
-        manipulations = DestinationManipulation.objects.filter(
-            buid=guid_redirect.buid,
-            view_source=0).order_by('action_type')
-    return manipulations
+    return get_buid_resolution(guid_redirect.buid).plan_for(vs_to_use)
 
 
 def get_redirect_url(request, guid_redirect, vsid, guid, debug_content=None):
@@ -210,7 +164,7 @@ def get_redirect_url(request, guid_redirect, vsid, guid, debug_content=None):
         return_dict['redirect_url'] = 'http://apps.facebook.com/us-jobs/?jvid=%s%s' % \
                                       (guid, vsid)
     else:
-        manipulations = None
+        plan = None
         # Check for a 'vs' request parameter. If it exists, this is an
         # apply click and vs should be used in place of vsid
         apply_vs = request.REQUEST.get('vs')
@@ -226,11 +180,7 @@ def get_redirect_url(request, guid_redirect, vsid, guid, debug_content=None):
         new_job = (guid_redirect.new_date + timedelta(minutes=30)) > \
             datetime.now(tz=timezone.utc)
 
-        try:
-            microsite = CanonicalMicrosite.objects.get(
-                buid=guid_redirect.buid)
-        except CanonicalMicrosite.DoesNotExist:
-            microsite = None
+        microsite = get_buid_resolution(guid_redirect.buid).microsite
 
         if microsite and return_dict.get('expired'):
             return_dict['browse_url'] = microsite.canonical_microsite_url
@@ -260,8 +210,7 @@ def get_redirect_url(request, guid_redirect, vsid, guid, debug_content=None):
                  (guid_redirect.buid, vs_to_use) in settings.CUSTOM_EXCLUSIONS
                  or microsite is None) or skip_microsite or new_job)
             if try_manipulations:
-                manipulations = get_manipulations(guid_redirect,
-                                                  vs_to_use)
+                plan = get_manipulation_plan(guid_redirect, vs_to_use)
             elif microsite:
                 redirect_url = '%s%s/job/?vs=%s' % \
                                (microsite.canonical_microsite_url,
@@ -279,8 +228,8 @@ def get_redirect_url(request, guid_redirect, vsid, guid, debug_content=None):
 
             return_dict['enable_custom_queries'] = request.REQUEST.get('z') == '1'
             return_dict['qs'] = request.META['QUERY_STRING']
-            do_manipulations(guid_redirect, manipulations,
-                             return_dict, debug_content)
+            if plan is not None:
+                plan.apply(guid_redirect, return_dict, debug_content)
 
     return return_dict
 
@@ -4,33 +4,108 @@ import json
 import os
 import sys
 
-from dateutil import parser
+from dateutil import parser, tz
 import boto
 from pymongoenv import connect_db
 
 sys.path.insert(0, '/home/web/MyJobs/MyJobs-urls')
 
+from analytics.rollups import mark_days_dirty
 from secrets import AWS_ACCESS_KEY_ID, AWS_SECRET_KEY
 
 
-def get_log_lines(file_name):
+# Documents inserted per insert_many call; progress through a file is
+# checkpointed after each batch.
+BATCH_SIZE = 1000
+
+# Keys holding timestamps, which are stored as dates.
+TIME_KEYS = frozenset(['to', 'sv', 'nv', 'fv'])
+
+# Timestamps we write end in Z, with microseconds (from Python) or
+# milliseconds (from JavaScript) unless they are zero.
+ISO_FORMATS = ['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S']
+
+
+def iter_log_lines(file_name, offset=0):
     """
-    Returns the text contained within the file pointed to by "file_name". Text
-    is unquoted and split into lines.
+    Yields (end, lines) for each line of the file pointed to by "file_name",
+    reading the file from S3 in chunks. Text is unquoted and split into
+    lines; "end" is the byte offset just past the raw line they came from.
+
+    Reading starts at byte "offset", which must be the start of a line.
     """
     boto_connection = boto.connect_s3(
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_KEY)
     log_bucket = boto_connection.get_bucket('my-jobs-logs', validate=False)
     log = log_bucket.get_key(file_name)
-    contents = log.get_contents_as_string().decode('string_escape')
-    return contents.splitlines()
+    if offset:
+        log.open_read(headers={'Range': 'bytes=%d-' % offset})
+
+    remainder = ''
+    for chunk in log:
+        raw_lines = (remainder + chunk).split('\n')
+        remainder = raw_lines.pop()
+        for raw_line in raw_lines:
+            offset += len(raw_line) + 1
+            yield offset, raw_line.decode('string_escape').splitlines()
+    if remainder:
+        offset += len(remainder)
+        yield offset, remainder.decode('string_escape').splitlines()
+
+
+def parse_time(value):
+    """
+    Parses a timestamp from a log line, trying the format we write before
+    falling back to dateutil.
+    """
+    if value.endswith('Z'):
+        for format_ in ISO_FORMATS:
+            try:
+                return datetime.strptime(value[:-1], format_).replace(
+                    tzinfo=tz.tzutc())
+            except ValueError:
+                pass
+    return parser.parse(value)
+
 
+def parse_line(line):
+    """
+    Parses a log line into a document for the analytics collection.
 
-def to_mongo(file_name):
+    Returns None if the line isn't a document we wish to keep and raises
+    ValueError if it isn't valid JSON.
+    """
+    json_line = json.loads(line)
+    # '"-"' is valid JSON but insert_many requires a list of
+    # dictionaries. If "json_line" is a string, it's not a
+    # document we wish to keep.
+    if isinstance(json_line, basestring):
+        return None
+    for key, value in json_line.items():
+        if key in TIME_KEYS and value:
+            # parser.parse('') results in today's date; we probably
+            # don't want that. Ensure the parameter has a value.
+            try:
+                json_line[key] = parse_time(value)
+            except (ValueError, TypeError, AttributeError):
+                pass
+        elif isinstance(value, basestring) and value.isdigit():
+            json_line[key] = int(value)
+            if key == 'time':
+                json_line[key] = datetime.fromtimestamp(json_line[key])
+    return json_line
+
+
+def to_mongo(file_name, batch_size=BATCH_SIZE):
     """
     Inserts the constituent lines of the file pointed to by "file_name" into
     a Mongo database.
+
+    Lines are inserted in batches of "batch_size" as the file is read. After
+    each batch, the number of lines and bytes processed is recorded on the
+    file's entry in the "files" collection; if a previous run on this file
+    was interrupted, processing resumes from there.
     """
     analytics = connect_db().db
 
@@ -40,64 +115,73 @@ def to_mongo(file_name):
     # notice that we're using file_name here instead of base_name. Analytics
     # log files are stored on the analytics servers themselves, while redirect
     # stores its logs in s3. This is one way to differentiate the two.
-    count = analytics.files.find_one({"file": file_name}) or 0
-    if count:
+    file_ = analytics.files.find_one({"file": file_name})
+    if file_ and ('success' in file_ or 'lines_done' not in file_):
         # This file was already processed.
         # TODO: Add ability to upsert based on this?
         return
 
-    lines = get_log_lines(file_name)
-
-    # All redirect logs are named using the same format, which differs from
-    # analytics logs - "ex%y%m%d%H%M%S.log"; strip "ex" and the extension to
-    # get our timestamp.
-    timestamp = os.path.splitext(base_name)[0][2:]
-    file_created = datetime.strptime(timestamp, "%y%m%d%H%M%S")
-
-    file_id = analytics.files.insert_one({
-        "file": file_name, "line_count": len(lines),
-        "file_created": file_created}).inserted_id
-
-    json_lines = []
-    # Denotes if the file was inserted successfully in its entirety. Toggled if
-    # we can't parse a line as JSON.
-    success = True
-    for line in lines:
-        # Try to parse each line as JSON. There may or may not be invalid data
-        # in the file; Don't crash and burn if so.
-        try:
-            json_line = json.loads(line)
-        except ValueError:
-            success = False
-        else:
-            # '"-"' is valid JSON but insert_many requires a list of
-            # dictionaries. If "json_line" is a string, it's not a
-            # document we wish to keep.
-            if not isinstance(json_line, basestring):
-                for key, value in json_line.items():
-                    if key in ['to', 'sv', 'nv', 'fv'] and value:
-                        # parser.parse('') results in today's date; we probably
-                        # don't want that. Ensure the parameter has a value.
-                        try:
-                            json_line[key] = parser.parse(value)
-                        except (ValueError, TypeError):
-                            pass
-                    elif isinstance(value, basestring) and value.isdigit():
-                        json_line[key] = int(value)
-                        if key == 'time':
-                            json_line[key] = datetime.fromtimestamp(
-                                json_line[key])
-                json_line['file_id'] = file_id
-                json_lines.append(json_line)
-
-    if json_lines:
-        # It's possible the file is blank or we failed parsing all lines.
+    if file_:
+        file_id = file_['_id']
+        lines_done = file_['lines_done']
+        bytes_done = file_['bytes_done']
+        invalid_lines = file_['invalid_lines']
+        # Remove anything inserted after the last checkpoint so the batch
+        # isn't duplicated.
+        analytics.analytics.delete_many({'file_id': file_id,
+                                         'file_line': {'$gte': lines_done}})
+    else:
+        # All redirect logs are named using the same format, which differs
+        # from analytics logs - "ex%y%m%d%H%M%S.log"; strip "ex" and the
+        # extension to get our timestamp.
+        timestamp = os.path.splitext(base_name)[0][2:]
+        file_created = datetime.strptime(timestamp, "%y%m%d%H%M%S")
+        lines_done = bytes_done = invalid_lines = 0
+        file_id = analytics.files.insert_one({
+            "file": file_name, "file_created": file_created,
+            "lines_done": 0, "bytes_done": 0,
+            "invalid_lines": 0}).inserted_id
+
+    def flush(batch):
+        # It's possible a batch is blank if we failed parsing all lines.
         # TODO: Auditing procedure that compares "line_count" from the "files"
         #     collection with the number of items related to that file in the
         #     "analytics" collection.
-        analytics.analytics.insert_many(json_lines)
-    analytics.files.update({'_id': file_id},
-                                  {'$set': {'success': success}})
+        if batch:
+            analytics.analytics.insert_many(batch, ordered=False)
+            # The job_views rollups for these days no longer hold.
+            mark_days_dirty(analytics, set(
+                json_line['to'] for json_line in batch
+                if isinstance(json_line.get('to'), datetime)))
+        analytics.files.update_one({'_id': file_id}, {'$set': {
+            'lines_done': lines_done, 'bytes_done': bytes_done,
+            'invalid_lines': invalid_lines}})
+
+    batch = []
+    for end, lines in iter_log_lines(file_name, bytes_done):
+        for line in lines:
+            # Try to parse each line as JSON. There may or may not be invalid
+            # data in the file; Don't crash and burn if so.
+            try:
+                json_line = parse_line(line)
+            except ValueError:
+                invalid_lines += 1
+            else:
+                if json_line is not None:
+                    json_line['file_id'] = file_id
+                    json_line['file_line'] = lines_done
+                    batch.append(json_line)
+            lines_done += 1
+        bytes_done = end
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+
+    # Denotes if the file was inserted successfully in its entirety; false if
+    # we couldn't parse a line as JSON.
+    analytics.files.update_one({'_id': file_id}, {'$set': {
+        'line_count': lines_done, 'success': not invalid_lines}})
 
 
 if __name__ == '__main__':
@@ -0,0 +1,101 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+
+from redirect import actions
+from redirect.actions import replace_or_add_query
+from redirect.models import DestinationManipulation, Redirect
+from redirect.plans import WRAP_ACTIONS, ManipulationPlan
+
+
+def legacy_manipulations(guid_redirect, manipulations, return_dict):
+    """
+    The per-redirect manipulation loop that ManipulationPlan replaced,
+    looking each action up by name on every redirect. Unlike the original,
+    the last manipulation is found without querying the database, so only
+    the CPU cost is compared.
+
+    """
+    if not manipulations or return_dict['redirect_url']:
+        return
+    for manipulation in manipulations:
+        try:
+            redirect_method = getattr(actions, manipulation.action)
+        except AttributeError:
+            continue
+        # Wrapping actions append the final url to their own, so custom
+        # query parameters are added before they run.
+        if manipulation.action in WRAP_ACTIONS:
+            if return_dict['enable_custom_queries']:
+                guid_redirect.url = replace_or_add_query(
+                    guid_redirect.url, '&%s' % return_dict.get('qs'),
+                    exclusions=['vs', 'z'])
+            redirect_url = redirect_method(guid_redirect, manipulation)
+        else:
+            redirect_url = redirect_method(guid_redirect, manipulation)
+            if (manipulation == manipulations[-1] and
+                    return_dict['enable_custom_queries']):
+                redirect_url = replace_or_add_query(
+                    redirect_url, '&%s' % return_dict.get('qs'),
+                    exclusions=['vs', 'z'])
+        return_dict['redirect_url'] = redirect_url
+        guid_redirect.url = redirect_url
+
+
+class Command(BaseCommand):
+    help = """
+           Replays the DestinationManipulations of a sample of (buid, view
+           source) pairs against job urls and reports the CPU time spent per
+           redirect, both looking up each manipulation's action on every
+           redirect (as do_manipulations used to) and applying a
+           precompiled plan.
+           """
+    option_list = BaseCommand.option_list + (
+        make_option('--groups', type='int', default=200,
+                    help='Number of (buid, view source) pairs to sample.'),
+        make_option('--iterations', type='int', default=1000,
+                    help='Number of redirects replayed per pair.'),
+        make_option('--custom-queries', action='store_true', default=False,
+                    help='Replay redirects as if z=1 were provided.'),
+    )
+
+    def handle(self, *args, **options):
+        groups = DestinationManipulation.objects.values_list(
+            'buid', 'view_source').distinct()[:options['groups']]
+        iterations = options['iterations']
+        return_dict = {'enable_custom_queries': options['custom_queries'],
+                       'qs': 'vs=10&z=1&utm_source=benchmark'}
+
+        legacy = compiled = 0.0
+        redirects = 0
+        for buid, view_source in groups:
+            manipulations = tuple(DestinationManipulation.objects.filter(
+                buid=buid, view_source=view_source).order_by('action_type'))
+            job = Redirect.objects.filter(buid=buid).only('url').first()
+            url = job.url if job else 'http://www.example.com/job?id=1'
+            plan = ManipulationPlan(manipulations)
+
+            def replay(apply):
+                start = time.clock()
+                for _ in xrange(iterations):
+                    return_dict['redirect_url'] = None
+                    apply(Redirect(buid=buid, url=url), return_dict)
+                return time.clock() - start
+
+            legacy += replay(
+                lambda redirect, values: legacy_manipulations(
+                    redirect, manipulations, values))
+            compiled += replay(plan.apply)
+            redirects += iterations
+
+        if not redirects:
+            self.stdout.write("No DestinationManipulations to replay.")
+            return
+        self.stdout.write(
+            "%s redirects over %s (buid, view source) pairs" % (
+                redirects, len(groups)))
+        self.stdout.write("per-redirect loop: %0.2f us/redirect" % (
+            legacy / redirects * 1000000))
+        self.stdout.write("compiled plan:     %0.2f us/redirect" % (
+            compiled / redirects * 1000000))
@@ -0,0 +1,161 @@
+"""
+Compiles DestinationManipulation rows into executable plans.
+
+A plan is built once per (buid, view source) and cached alongside the rest
+of the business unit's redirect data (see redirect.cache), so applying the
+manipulations on a click is a loop over pre-bound callables: no ORM access,
+no attribute lookups on redirect.actions and no re-parsing of query
+strings stored on the manipulations.
+
+"""
+from collections import namedtuple
+
+import redirect.actions
+from redirect.actions import add_parsed_query, parse_query
+
+
+# These actions all result in our final url being appended, usually as a
+# query string, to a value determined by the manipulation object; due to
+# this, we should add any custom query parameters before doing the
+# manipulation.
+WRAP_ACTIONS = frozenset(['doubleclickwrap', 'replacethenaddpre',
+                          'sourceurlwrap', 'sourceurlwrapappend',
+                          'sourceurlwrapunencoded',
+                          'sourceurlwrapunencodedappend'])
+
+CUSTOM_QUERY_EXCLUSIONS = ['vs', 'z']
+
+# Stand-in for a Redirect when calling an action that only reads `url`.
+_Url = namedtuple('_Url', 'url')
+
+
+def _sourcecodetag(manipulation):
+    query = manipulation.value_1
+    if query and query.find('=') > 0:
+        parsed = parse_query(query)
+        return lambda url: add_parsed_query(url, parsed)
+    return lambda url: url
+
+
+def _sourcecodeswitch(manipulation):
+    old, new = manipulation.value_1, manipulation.value_2
+    return lambda url: url.replace(old, new)
+
+
+def _replacethenadd(manipulation):
+    old, new = manipulation.value_1.split('!!!!')
+    parsed = parse_query(manipulation.value_2)
+    return lambda url: add_parsed_query(url.replace(old, new), parsed)
+
+
+def _urlswap(manipulation):
+    value = manipulation.value_1
+    return lambda url: value
+
+
+# Actions with a specialized compiler. Every other action is bound to its
+# function in redirect.actions.
+COMPILERS = {
+    'sourcecodetag': _sourcecodetag,
+    'sourcecodeswitch': _sourcecodeswitch,
+    'fixurl': _sourcecodeswitch,
+    'replacethenadd': _replacethenadd,
+    'urlswap': _urlswap,
+}
+
+
+def compile_action(manipulation):
+    """
+    Returns a function taking a url and returning the manipulated url, or
+    None if the manipulation's action doesn't exist.
+
+    """
+    compiler = COMPILERS.get(manipulation.action)
+    if compiler is not None:
+        try:
+            return compiler(manipulation)
+        except (TypeError, ValueError):
+            # Malformed values; fall back to the action itself, which fails
+            # on use exactly as it always has.
+            pass
+    method = getattr(redirect.actions, manipulation.action or '', None)
+    if method is None:
+        return None
+    return lambda url: method(_Url(url), manipulation)
+
+
+Step = namedtuple('Step', 'manipulation apply wraps last')
+
+
+class ManipulationPlan(object):
+    """
+    An executable, immutable form of an ordered sequence of
+    DestinationManipulation objects.
+
+    """
+    def __init__(self, manipulations):
+        manipulations = tuple(manipulations)
+        self.steps = tuple(
+            Step(manipulation, compile_action(manipulation),
+                 manipulation.action in WRAP_ACTIONS,
+                 i == len(manipulations) - 1)
+            for i, manipulation in enumerate(manipulations))
+
+    def __len__(self):
+        return len(self.steps)
+
+    def apply(self, guid_redirect, return_dict, debug_content=None):
+        """
+        Performs each manipulation in turn. Behaves exactly as
+        redirect.helpers.do_manipulations.
+
+        Inputs:
+        :guid_redirect: Redirect object for this job
+        :return_dict: Dictionary of values used in all levels of the
+            main redirect view
+        :debug_content: List of strings that will be output on the debug page
+
+        Modifies:
+        :guid_redirect: The url is updated after each manipulation
+        :return_dict: Potentially modifies the redirect_url key
+        :debug_content: Potentially adds new debug strings
+        """
+        if not self.steps or return_dict['redirect_url']:
+            return
+        custom_query = None
+        if return_dict.get('enable_custom_queries'):
+            custom_query = parse_query('&%s' % return_dict.get('qs'))
+
+        for step in self.steps:
+            manipulation = step.manipulation
+            if debug_content:
+                debug_content.append(
+                    'ActionTypeID=%s Action=%s' %
+                    (manipulation.action_type, manipulation.action))
+            if step.apply is None:
+                continue
+
+            if step.wraps:
+                if custom_query is not None:
+                    guid_redirect.url = add_parsed_query(
+                        guid_redirect.url, custom_query,
+                        exclusions=CUSTOM_QUERY_EXCLUSIONS)
+                redirect_url = step.apply(guid_redirect.url)
+            else:
+                redirect_url = step.apply(guid_redirect.url)
+                # Only add custom query parameters after processing the
+                # final DestinationManipulation object to ensure we're not
+                # needlessly replacing them on each iteration.
+                if step.last and custom_query is not None:
+                    redirect_url = add_parsed_query(
+                        redirect_url, custom_query,
+                        exclusions=CUSTOM_QUERY_EXCLUSIONS)
+            return_dict['redirect_url'] = redirect_url
+
+            if debug_content:
+                debug_content.append(
+                    'ActionTypeID=%s ManipulatedLink=%s VSID=%s' %
+                    (manipulation.action_type, redirect_url,
+                     manipulation.view_source))
+
+            guid_redirect.url = redirect_url
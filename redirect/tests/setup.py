@@ -8,6 +8,7 @@ from django.test import TransactionTestCase
 from django.test.utils import override_settings
 from django.conf import settings
 
+from redirect.cache import resolutions
 import redirect_settings
 import secrets
 
@@ -23,6 +24,8 @@ class RedirectBase(TransactionTestCase):
     def setUp(self):
         super(RedirectBase, self).setUp()
         clear_url_caches()
+        # Tables are flushed between tests without sending delete signals.
+        resolutions.clear()
 
         stdout = sys.stdout
         sys.stdout = open(os.devnull, 'w')
@@ -1,4 +1,10 @@
-from redirect import helpers
+from redirect import actions, helpers
+from redirect.cache import get_buid_resolution
+from redirect.models import CHOICES
+from redirect.plans import ManipulationPlan
+from redirect.tests.factories import (CanonicalMicrositeFactory,
+                                      DestinationManipulationFactory,
+                                      RedirectFactory)
 from redirect.tests.setup import RedirectBase
 
 
@@ -24,3 +30,66 @@ class HelperTests(RedirectBase):
                                      self.params['value']))
         body = self.add_part()
         self.assertEqual(body, expected)
+
+    def test_manipulations_cached_per_buid(self):
+        redirect = RedirectFactory(buid=5)
+        first = DestinationManipulationFactory(buid=5, view_source=0,
+                                               action_type=1)
+        second = DestinationManipulationFactory(buid=5, view_source=0,
+                                                action_type=2)
+        CanonicalMicrositeFactory(buid=5)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(helpers.get_manipulations(redirect, 10),
+                             (first, second))
+            self.assertEqual(helpers.get_manipulations(redirect, 0),
+                             (first, second))
+            self.assertEqual(get_buid_resolution(5).microsite.buid, 5)
+
+        # Deleting a manipulation drops the cached data for its buid.
+        second.delete()
+        self.assertEqual(helpers.get_manipulations(redirect, 0), (first, ))
+
+    def test_plan_matches_actions(self):
+        redirect = RedirectFactory(url='http://example.com/job?a=1&b=2#top')
+        values = {
+            'replacethenadd': ('example!!!!sample', '&codes=DEjn'),
+            'switchlastthenadd': ('a=!!!!b=', '&c=d'),
+            'replacethenaddpre': ('http!!!!https', 'http://wrap.it/?u='),
+        }
+        for action in CHOICES:
+            value_1, value_2 = values.get(action, ('&codes=DEjn', '&x=y'))
+            manipulation = DestinationManipulationFactory.build(
+                action=action, value_1=value_1, value_2=value_2)
+            expected = getattr(actions, action)(redirect, manipulation)
+
+            return_dict = {'redirect_url': None,
+                           'enable_custom_queries': False}
+            ManipulationPlan([manipulation]).apply(redirect, return_dict)
+            self.assertEqual(return_dict['redirect_url'], expected,
+                             msg=action)
+            redirect.url = 'http://example.com/job?a=1&b=2#top'
+
+    def test_plan_custom_queries(self):
+        redirect = RedirectFactory(url='http://example.com/job')
+        tag = DestinationManipulationFactory(buid=0, view_source=0,
+                                             action_type=1)
+        wrap = DestinationManipulationFactory(
+            buid=0, view_source=0, action_type=2, action='sourceurlwrap',
+            value_1='http://wrap.it/?u=')
+        return_dict = {'redirect_url': None, 'enable_custom_queries': True,
+                       'qs': 'vs=10&z=1&src=abc'}
+        debug_content = ['']
+
+        plan = get_buid_resolution(0).plan_for(10)
+        self.assertIs(plan, get_buid_resolution(0).plan_for(10))
+        plan.apply(redirect, return_dict, debug_content)
+
+        self.assertEqual(
+            return_dict['redirect_url'],
+            'http://wrap.it/?u=' + actions.quote_string(
+                'http://example.com/job?codes=DEjn&src=abc'))
+        self.assertEqual(len(debug_content), 5)
+        self.assertEqual([step.manipulation for step in plan.steps],
+                         [tag, wrap])
+
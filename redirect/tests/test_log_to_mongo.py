@@ -0,0 +1,158 @@
+from datetime import datetime
+
+from dateutil import tz
+from django.test import TestCase
+from mock import patch
+from pymongoenv import connect_db
+from pymongoenv.tests import MongoTestMixin
+
+from redirect.log_to_mongo import (iter_log_lines, parse_line, parse_time,
+                                   to_mongo)
+
+
+# What nginx writes for X-JSON-Header; quotes are escaped as \x22.
+LOG_LINES = [
+    r'{\x22vs\x22: \x22%s\x22, \x22to\x22: '
+    r'\x222016-05-11T14:03:21.485163Z\x22, \x22nv\x22: '
+    r'\x222016-05-11T14:00:00.123Z\x22, \x22hn\x22: \x22www.my.jobs\x22}' % vs
+    for vs in range(4)]
+
+
+class FakeKey(object):
+    """
+    Stands in for a boto S3 key, yielding its data in fixed size chunks and
+    honoring the Range header given to open_read.
+
+    """
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.ranges = []
+
+    def open_read(self, headers=None):
+        range_ = headers['Range']
+        self.ranges.append(range_)
+        self.offset = int(range_[len('bytes='):-1])
+
+    def __iter__(self):
+        data = self.data[self.offset:]
+        for start in range(0, len(data), self.chunk_size):
+            yield data[start:start + self.chunk_size]
+
+
+class LogToMongoTests(MongoTestMixin, TestCase):
+    def setUp(self):
+        super(LogToMongoTests, self).setUp()
+        self.file_name = 'redirect/ex160511140000.log'
+        patcher = patch('redirect.log_to_mongo.boto.connect_s3')
+        connect_s3 = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.get_key = connect_s3.return_value.get_bucket.return_value.get_key
+
+    def use_log(self, data, chunk_size=7):
+        self.key = FakeKey(data, chunk_size)
+        self.get_key.return_value = self.key
+
+    def test_lines_split_across_chunks(self):
+        """
+        Lines are rejoined when a chunk boundary falls inside them, and each
+        line is reported with the offset just past it.
+
+        """
+        self.use_log('"-"\n{"vs": "1"}\n{"vs": "2"}', chunk_size=5)
+        self.assertEqual(list(iter_log_lines(self.file_name)), [
+            (4, ['"-"']), (16, ['{"vs": "1"}']), (27, ['{"vs": "2"}'])])
+
+    def test_escaped_newlines(self):
+        """
+        An escaped newline doesn't end the raw line, so offsets stay on
+        line boundaries, but it is split on once unescaped.
+
+        """
+        self.use_log(r'{"vs": "1"}\n{"vs": "2"}' + '\n' + r'{\x22vs\x22: 3}')
+        self.assertEqual(list(iter_log_lines(self.file_name)), [
+            (25, ['{"vs": "1"}', '{"vs": "2"}']), (40, ['{"vs": 3}'])])
+
+    def test_read_from_offset(self):
+        self.use_log('{"vs": "1"}\n{"vs": "2"}\n')
+        self.assertEqual(list(iter_log_lines(self.file_name, 12)),
+                         [(24, ['{"vs": "2"}'])])
+        self.assertEqual(self.key.ranges, ['bytes=12-'])
+
+    def test_parse_time(self):
+        utc = tz.tzutc()
+        # Python, JavaScript and whole second timestamps, then an HTTP date
+        # that only dateutil understands.
+        for value, expected in [
+                ('2016-05-11T14:03:21.485163Z',
+                 datetime(2016, 5, 11, 14, 3, 21, 485163, tzinfo=utc)),
+                ('2016-05-11T14:03:21.485Z',
+                 datetime(2016, 5, 11, 14, 3, 21, 485000, tzinfo=utc)),
+                ('2016-05-11T14:03:21Z',
+                 datetime(2016, 5, 11, 14, 3, 21, tzinfo=utc)),
+                ('Wed, 11 May 2016 14:03:21 GMT',
+                 datetime(2016, 5, 11, 14, 3, 21, tzinfo=utc))]:
+            self.assertEqual(parse_time(value), expected)
+
+    def test_parse_line(self):
+        line = LOG_LINES[1].decode('string_escape')
+        self.assertEqual(parse_line(line), {
+            'vs': 1,
+            'to': datetime(2016, 5, 11, 14, 3, 21, 485163,
+                           tzinfo=tz.tzutc()),
+            'nv': datetime(2016, 5, 11, 14, 0, 0, 123000, tzinfo=tz.tzutc()),
+            'hn': 'www.my.jobs'})
+
+        parsed = parse_line('{"time": "1462975401", "to": "", '
+                            '"fv": "not a date"}')
+        self.assertEqual(parsed['time'], datetime.fromtimestamp(1462975401))
+        self.assertEqual(parsed['to'], '')
+        self.assertEqual(parsed['fv'], 'not a date')
+
+        self.assertIsNone(parse_line('"-"'))
+        self.assertRaises(ValueError, parse_line, '{"vs": ')
+
+    def test_resume_from_checkpoint(self):
+        """
+        An interrupted run is picked up from the last checkpoint; documents
+        inserted after it are replaced rather than duplicated.
+
+        """
+        data = '\n'.join(LOG_LINES) + '\n'
+        self.use_log(data)
+        db = connect_db().db
+        bytes_done = len(LOG_LINES[0]) + len(LOG_LINES[1]) + 2
+        file_id = db.files.insert_one({
+            'file': self.file_name, 'lines_done': 2,
+            'bytes_done': bytes_done, 'invalid_lines': 0}).inserted_id
+        # Lines 0 and 1 were checkpointed; line 2 was inserted by a batch
+        # that never finished.
+        db.analytics.insert_many([{'file_id': file_id, 'file_line': line,
+                                   'vs': line} for line in range(3)])
+
+        to_mongo(self.file_name, batch_size=1)
+
+        self.assertEqual(self.key.ranges, ['bytes=%d-' % bytes_done])
+        documents = db.analytics.find({'file_id': file_id}).sort('file_line')
+        self.assertEqual([(doc['file_line'], doc['vs']) for doc in documents],
+                         [(0, 0), (1, 1), (2, 2), (3, 3)])
+        file_ = db.files.find_one({'_id': file_id})
+        self.assertEqual((file_['lines_done'], file_['bytes_done']),
+                         (4, len(data)))
+        self.assertEqual((file_['line_count'], file_['success']), (4, True))
+        # The day the lines were logged on is due for new job_views
+        # rollups.
+        self.assertEqual(db.job_view_rollup_dirty.distinct('_id'),
+                         [datetime(2016, 5, 11)])
+
+    def test_processed_file_skipped(self):
+        self.use_log('\n'.join(LOG_LINES))
+        db = connect_db().db
+        db.files.insert_one({'file': self.file_name, 'line_count': 4,
+                             'success': True})
+
+        to_mongo(self.file_name)
+
+        self.assertFalse(self.get_key.called)
+        self.assertEqual(db.analytics.count(), 0)
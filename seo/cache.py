@@ -1,9 +1,13 @@
 import hashlib
+import json
+import time
 
 from django.core.cache import cache
-from seo.helpers import get_jobs, get_solr_facet
+from django.http import QueryDict
+from seo.helpers import get_jobs, get_solr_facet, listing_search, search_fields
 
 from seo.models import Configuration, SeoSite
+from seo.site_context import site_version
 from django.conf import settings
 
 # This module is currently a holding place for low-level caching that was
@@ -14,6 +18,19 @@ from django.conf import settings
 # Time to cache data affected by regular job updates
 MINUTES_TO_CACHE_JOB_DATA = 10
 
+# Query string parameters that change search results. Any others, such as
+# tracking parameters, are left out of search cache keys.
+SEARCH_PARAMS = ('company', 'exact_title', 'location', 'moc', 'moc_id', 'q',
+                 'sort')
+
+# Bumped whenever the Solr index is updated; part of every search cache key.
+INDEX_GENERATION_KEY = 'solr_index_generation'
+
+# How long a request waits for another to run the search it needs before
+# running it itself.
+SEARCH_LOCK_SECONDS = 10
+SEARCH_POLL_SECONDS = 0.1
+
 
 def cache_page_prefix(request):
     """Returns the key prefix based on the input request"""
@@ -36,42 +53,129 @@ def get_total_jobs_count():
     """Returns the job count for the current site's default job view"""
     jobs_count_key = site_item_key('jobs_count')
     jobs_count = cache.get(jobs_count_key)
-    if not jobs_count:
+    if jobs_count is None:
         jobs_count = get_jobs(custom_facets=settings.DEFAULT_FACET,
                               jsids=settings.SITE_BUIDS).count()
         cache.set(jobs_count_key, jobs_count, MINUTES_TO_CACHE_JOB_DATA * 60)
     return jobs_count
 
 
-def get_facet_count_key(filters=None, query_string=None):
+def index_generation():
+    """Returns the current generation of the Solr index."""
+    generation = cache.get(INDEX_GENERATION_KEY)
+    if generation is None:
+        # The generation was never set or was evicted. Start from the current
+        # time so that no search cached under an older generation is reused.
+        cache.add(INDEX_GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(INDEX_GENERATION_KEY)
+    return generation
+
+
+def bump_index_generation():
+    """Invalidates every cached search. Call after updating the index."""
+    try:
+        cache.incr(INDEX_GENERATION_KEY)
+    except ValueError:
+        index_generation()
+
+
+def search_cache_key(prefix, filters=None, params=None, **kwargs):
     """
-    Returns a unique key for the current site and filter path
+    Returns a key to cache a search for the current site
+
     Inputs:
-        filters: Filters for the current search. If the unicode
-                 representation of two filters is equal, they should represent
-                 the same search.
+        :prefix: Identifies what is cached
+        :filters: Filters from build_filter_dict
+        :params: Query string parameters. Only SEARCH_PARAMS are used.
+        :kwargs: Anything else the cached search depends on
+
+    Filters and parameters are sorted, so paths and query strings that only
+    differ in order or in tracking parameters share a key. The key also
+    changes whenever the index or the site's facets change.
+
     """
-    filters = filters or ''
-    query_string = query_string or ''
+    params = params or {}
+    fingerprint = json.dumps({
+        'filters': sorted((k, v) for k, v in (filters or {}).items() if v),
+        'params': sorted((k, params.get(k)) for k in SEARCH_PARAMS
+                         if params.get(k)),
+        'kwargs': kwargs,
+    }, sort_keys=True)
 
     # We use a hash to ensure key length is under memcache's 250 character limit
-    return "browsefacets::%s%s%s" % (
-        settings.SITE_ID,
-        hashlib.md5(unicode(filters)).hexdigest(),
-        hashlib.md5(unicode(query_string)).hexdigest()
-    )
+    return "%s::%s::%s.%s::%s" % (prefix, settings.SITE_ID,
+                                  index_generation(),
+                                  site_version(settings.SITE_ID),
+                                  hashlib.md5(fingerprint).hexdigest())
+
+
+def cached_search(key, run, timeout=MINUTES_TO_CACHE_JOB_DATA * 60):
+    """
+    Returns the search result cached under key, calling run() to compute and
+    cache it if there isn't one. Empty results are cached too.
+
+    Only one process runs a given search at a time; other requests for it
+    wait for the result to land in the cache.
+
+    """
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    lock = key + '::lock'
+    if not cache.add(lock, 1, SEARCH_LOCK_SECONDS):
+        deadline = time.time() + SEARCH_LOCK_SECONDS
+        while time.time() < deadline:
+            time.sleep(SEARCH_POLL_SECONDS)
+            result = cache.get(key)
+            if result is not None:
+                return result
+            if cache.get(lock) is None:
+                break
+        result = run()
+        cache.set(key, result, timeout)
+        return result
+
+    try:
+        result = run()
+        cache.set(key, result, timeout)
+    finally:
+        cache.delete(lock)
+    return result
+
+
+def get_facet_count_key(filters=None, query_string=None):
+    """
+    Returns a unique key for the current site and filter path
+    Inputs:
+        filters: Filters for the current search.
+        query_string: Query string of the current search.
+    """
+    return search_cache_key('browsefacets', filters,
+                            QueryDict(query_string or ''))
 
 
 def get_custom_facets(request, filters=None, query_string=None):
     custom_facet_key = get_facet_count_key(filters, query_string)
-    custom_facets = cache.get(custom_facet_key)
+    return cached_search(
+        custom_facet_key,
+        lambda: get_solr_facet(settings.SITE_BUIDS, filters=filters,
+                               params=request.GET))
 
-    if not custom_facets:
-        custom_facets = get_solr_facet(settings.SITE_BUIDS, filters=filters,
-                                       params=request.GET)
-        cache.set(custom_facet_key, custom_facets)
 
-    return custom_facets
+def get_listing(request, filters, num_jobs, fl=search_fields,
+                count_custom_facets=False):
+    """
+    Returns helpers.listing_search() for the current request, caching the
+    search results.
+
+    """
+    key = search_cache_key('listing', filters, request.GET,
+                           num_jobs=num_jobs, fl=sorted(fl),
+                           count_custom_facets=count_custom_facets)
+    return listing_search(request, filters, num_jobs, fl=fl,
+                          count_custom_facets=count_custom_facets,
+                          cached=lambda run: cached_search(key, run))
 
 
 def get_site_config(request):
@@ -1,4 +1,4 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 import datetime
 from HTMLParser import HTMLParser
 import logging
@@ -38,6 +38,14 @@ sort_order_mapper = {
 }
 sort_fields = ['relevance', 'date']
 
+# Solr tag of the filter that limits a listing_search() to its featured and
+# default jobs.
+LISTING_TAG = 'listing'
+
+ListingSearch = namedtuple('ListingSearch', ['default_jobs', 'featured_jobs',
+                                             'facet_counts',
+                                             'custom_facet_counts'])
+
 
 # Fields that populate the Solr "fl" parameter on searches that use
 # get_jobs().
@@ -1276,8 +1284,12 @@ def _facet_query_result_counts(tagged_facets, sqs):
     if not facet_results:
         return []
 
+    return _tagged_facet_counts(tagged_facets, facet_results['queries'])
+
+
+def _tagged_facet_counts(tagged_facets, query_counts):
     counts = []
-    for query, count in facet_results['queries'].iteritems():
+    for query, count in query_counts.iteritems():
         tagged_facet = tagged_facets[query]['custom_facet']
         if count > 0 or tagged_facet.always_show:
             counts.append((tagged_facet, count))
@@ -1332,32 +1344,97 @@ def add_text_to_job(job):
     return job
 
 
-def jobs_and_counts(request, filters, num_jobs, fl=search_fields):
+def custom_facets_query(custom_facets):
+    """
+    Returns the Solr query that sqs_apply_custom_facets narrows a search by
+    for custom_facets.
+
+    """
+    return create_sq(custom_facets).build_query()
+
+
+def listing_search(request, filters, num_jobs, fl=search_fields,
+                   count_custom_facets=False, cached=None):
+    """
+    Runs the searches behind a job listing in a single Solr request.
+
+    Featured and default jobs are fetched as two result groups of one
+    search, and field facets are counted once over both groups. If
+    count_custom_facets is True, the site's standard custom facets are
+    counted in the same request, as get_solr_facet would count them.
+
+    Inputs:
+    :cached: Optional function used to cache the search. It is called as
+             cached(run) and returns what run() returns; run() queries Solr.
+
+    Returns a ListingSearch. Its default_jobs and featured_jobs are primed
+    with their first num_jobs results, so slicing within those, and
+    count(), don't query Solr again.
+
+    """
     sort_order = request.GET.get('sort', 'relevance')
 
     sqs = prepare_sqs_from_search_params(request.GET)
+    job_kwargs = {'jsids': settings.SITE_BUIDS, 'filters': filters,
+                  'facet_limit': num_jobs, 'sort_order': sort_order,
+                  'fl': fl}
     default_jobs = get_jobs(default_sqs=sqs,
                             custom_facets=settings.DEFAULT_FACET,
                             exclude_facets=settings.FEATURED_FACET,
-                            jsids=settings.SITE_BUIDS, filters=filters,
-                            facet_limit=num_jobs, sort_order=sort_order,
-                            fl=fl)
-    featured_jobs = get_featured_jobs(default_sqs=sqs, filters=filters,
-                                      jsids=settings.SITE_BUIDS,
-                                      facet_limit=num_jobs,
-                                      sort_order=sort_order, fl=fl)
-
-    # Force the query to evaluate and populate the result cache. After this
-    # unless changes are made to the sqs objects
-    # anything using query results will be working with the same
-    # exact version of the query results (and more importantly,
-    # the query won't be re-run).
-    default_jobs[:num_jobs]
-    featured_jobs[:num_jobs]
-
-    facet_counts = default_jobs.add_facet_count(featured_jobs).get('fields')
-
-    return default_jobs, featured_jobs, facet_counts
+                            **job_kwargs)
+    featured_jobs = get_featured_jobs(default_sqs=sqs, **job_kwargs)
+
+    # Both groups are narrowed from the search they have in common, the
+    # same way get_jobs narrows default_jobs and featured_jobs.
+    listing = get_jobs(default_sqs=sqs, **job_kwargs)
+    default_clauses = []
+    if settings.DEFAULT_FACET:
+        default_clauses.append(
+            '(%s)' % custom_facets_query(settings.DEFAULT_FACET))
+    custom_facet_clauses = list(default_clauses)
+    groups = []
+    if settings.FEATURED_FACET:
+        featured_query = custom_facets_query(settings.FEATURED_FACET)
+        default_clauses.append('(*:* NOT (%s))' % featured_query)
+        groups.append(featured_query)
+    groups.insert(0, ' AND '.join(default_clauses) or '*:*')
+
+    tagged_facets = {}
+    if count_custom_facets:
+        for facet in settings.STANDARD_FACET:
+            clauses = list(custom_facet_clauses)
+            if facet.saved_querystring:
+                clauses.insert(0, '(%s)' % facet.saved_querystring)
+            query = '{!ex=%s}%s' % (LISTING_TAG,
+                                    ' AND '.join(clauses) or '*:*')
+            tagged_facets[query] = {'custom_facet': facet}
+            listing = listing.query_facet(query)
+
+    def run():
+        facet_counts, group_results = listing.search_groups(
+            groups, LISTING_TAG, end=num_jobs)
+        custom_facet_counts = _tagged_facet_counts(
+            tagged_facets, facet_counts.get('queries', {}))
+        custom_facet_counts.sort(key=lambda x: -x[1])
+        return {
+            'groups': group_results,
+            'facet_counts': facet_counts.get('fields'),
+            'custom_facet_counts': custom_facet_counts,
+        }
+
+    results = cached(run) if cached else run()
+    default_jobs.prime(*results['groups'][0])
+    if settings.FEATURED_FACET:
+        featured_jobs.prime(*results['groups'][1])
+
+    return ListingSearch(default_jobs, featured_jobs,
+                         results['facet_counts'],
+                         results['custom_facet_counts'])
+
+
+def jobs_and_counts(request, filters, num_jobs, fl=search_fields):
+    listing = listing_search(request, filters, num_jobs, fl=fl)
+    return listing.default_jobs, listing.featured_jobs, listing.facet_counts
 
 
 def get_company_thumbnail(filters):
@@ -16,8 +16,8 @@ from django.core.cache import cache
 from django.core import mail
 from django.core.validators import MaxValueValidator, ValidationError
 from django.db import models
-from django.db.models.signals import (post_delete, pre_delete, post_save,
-                                      pre_save)
+from django.db.models.signals import (m2m_changed, post_delete, pre_delete,
+                                      post_save, pre_save)
 from django.db.models.fields.related import ForeignKey
 from django.dispatch import Signal, receiver
 from django.template import loader
@@ -35,6 +35,9 @@ from registration.models import Invitation
 from social_links import models as social_models
 from seo.route53 import can_send_email, make_mx_record
 from seo.search_backend import DESearchQuerySet
+from seo.site_context import (invalidate_instance_contexts,
+                               invalidate_m2m_contexts,
+                               invalidate_site_contexts)
 from myjobs.models import User, Activity
 from mypartners.models import Tag
 from universal.accessibility import DOCTYPE_CHOICES, LANGUAGE_CODES_CHOICES
@@ -517,6 +520,7 @@ class SeoSite(Site):
         buid_cache_keys = ['%s:buids' % key for key in site_cache_keys]
         social_cache_keys = ['%s:social_links' % site.domain for site in sites]
         cache.delete_many(site_cache_keys + buid_cache_keys + social_cache_keys)
+        invalidate_site_contexts([site.pk for site in sites])
 
     def email_domain_choices(self,):
         from postajob.models import CompanyProfile
@@ -1593,3 +1597,17 @@ def seosite_change_monitor(sender, instance, **kwargs):
         return None
     if old_instance.domain != instance.domain:
         microsite_moved.send(sender=instance, old_domain=old_instance.domain)
+
+
+# Site contexts are compiled from these models; see seo.site_context.
+for model in [SeoSite, SeoSiteFacet, CustomFacet, SeoSiteRedirect, SiteTag,
+              Configuration]:
+    post_save.connect(invalidate_instance_contexts, sender=model,
+                      dispatch_uid='seo.site_context.save.%s' % model.__name__)
+    pre_delete.connect(invalidate_instance_contexts, sender=model,
+                       dispatch_uid='seo.site_context.delete.%s' %
+                       model.__name__)
+for through in [SeoSite.business_units.through, SeoSite.site_tags.through,
+                SeoSite.configurations.through]:
+    m2m_changed.connect(invalidate_m2m_contexts, sender=through,
+                        dispatch_uid='seo.site_context.%s' % through.__name__)
@@ -8,13 +8,65 @@ from haystack.query import SearchQuerySet
 from haystack.utils import IDENTIFIER_REGEX
 from django.conf import settings
 
-from pysolr import SolrError
+from pysolr import Results, SolrError
 from seo_pysolr import Solr
 
 
 class DESearchQuerySet(SearchQuerySet):
     # Tracks which parameters have been added with add_param
     search_parameters = []
+    # Set by prime()
+    _primed = False
+
+    def _fill_cache(self, start, end, **kwargs):
+        # A primed search with no hits has nothing to fetch.
+        if self._primed and not self._result_count:
+            return False
+        return super(DESearchQuerySet, self)._fill_cache(start, end, **kwargs)
+
+    def prime(self, results, hits, facet_counts=None):
+        """
+        Fills the result cache with the first results of a search run
+        elsewhere, such as by search_groups(). Slices within those results,
+        count() and facet_counts() then don't query Solr again.
+
+        Inputs:
+        :results: The first results of this search
+        :hits: Total number of results
+        :facet_counts: Facet counts for this search
+
+        """
+        self._primed = True
+        self._result_count = hits
+        self._result_cache = [None] * hits
+        self._result_cache[:len(results)] = results
+        self.query._hit_count = hits
+        if facet_counts is not None:
+            self.query._facet_counts = facet_counts
+        return self
+
+    def search_groups(self, groups, tag, start=0, end=None):
+        """
+        Runs this search for several groups of results in one request.
+
+        Inputs:
+        :groups: List of Solr queries, each narrowing this search to a group
+        :tag: Tag for the filter restricting results to the union of the
+              groups; query facets can use {!ex=<tag>} to count outside it
+        :start: and :end: Slice of results to return from each group
+
+        Returns a tuple of the facet counts over the union of the groups and
+        a list of (results, hits) for each group.
+
+        """
+        query = self.query
+        search_kwargs = query.build_params()
+        search_kwargs.update(start_offset=start, end_offset=end)
+        results = query.backend.grouped_search(query.build_query(), groups,
+                                               tag, **search_kwargs)
+        facet_counts = query.post_process_facets(results)
+        return facet_counts, [(group['results'], group['hits'])
+                              for group in results['groups']]
 
     def narrow_exclude(self, query):
         clone = self._clone()
@@ -277,23 +329,123 @@ class DESolrSearchBackend(SolrSearchBackend):
                          timeout=self.timeout)
 
     @log_query
-    def search(self, query_string, sort_by=None, start_offset=0, end_offset=None,
-               fields='', highlight=False, facets=None, date_facets=None,
-               query_facets=None, narrow_queries=None, spelling_query=None,
-               within=None, dwithin=None, distance_point=None,
-               limit_to_registered_models=None, result_class=None,
-               facet_mincount=None, facet_limit=None, facet_prefix=None,
-               facet_sort=None, facet_offset=None, bf=None, **kwargs):
+    def search(self, query_string, highlight=False, result_class=None,
+               **kwargs):
         """
-        Overrides both search() and build_search_kwargs().
+        Overrides search().
 
         """
-
         if len(query_string) == 0:
             return {
                 'results': [],
                 'hits': 0,
             }
+        kwargs = self.build_search_kwargs(query_string, highlight=highlight,
+                                          **kwargs)
+
+        try:
+            raw_results = self.conn.search(query_string, **kwargs)
+        except (IOError, SolrError), e:
+            if not self.silently_fail:
+                raise
+
+            self.log.error("Failed to query Solr using '%s': %s", query_string, e)
+            raw_results = EmptyResults()
+
+        return self._process_results(raw_results, highlight=highlight,
+                                     result_class=result_class)
+
+    @log_query
+    def grouped_search(self, query_string, groups, tag, start_offset=0,
+                       end_offset=None, highlight=False, result_class=None,
+                       **kwargs):
+        """
+        Runs a search for several groups of results in one request.
+
+        Inputs:
+        :groups: List of queries, each narrowing the search to one group.
+        :tag: Solr tag for the filter restricting the search to the union of
+              the groups. Facet queries can exclude it with {!ex=<tag>}.
+        :start_offset: and :end_offset: apply within each group.
+
+        Returns the facets of the union, and a list of the results and hits
+        of each group, in the same order as groups.
+
+        """
+        if len(query_string) == 0:
+            return {
+                'facets': {},
+                'groups': [{'results': [], 'hits': 0} for _ in groups],
+            }
+        kwargs = self.build_search_kwargs(query_string, highlight=highlight,
+                                          **kwargs)
+        kwargs.setdefault('fq', [])
+        kwargs['fq'].append('{!tag=%s}%s' % (
+            tag, ' OR '.join('(%s)' % group for group in groups)))
+        if len(groups) > 1:
+            kwargs['group'] = 'true'
+            kwargs['group.query'] = groups
+            # start and rows select groups; pagination is within each.
+            kwargs['start'] = 0
+            kwargs['rows'] = len(groups)
+            kwargs['group.offset'] = start_offset
+            if end_offset is not None:
+                kwargs['group.limit'] = end_offset - start_offset
+        else:
+            kwargs['start'] = start_offset
+            if end_offset is not None:
+                kwargs['rows'] = end_offset - start_offset
+
+        try:
+            # pysolr's Results doesn't keep grouped responses, so decode the
+            # response here.
+            params = {'q': query_string}
+            params.update(kwargs)
+            response = self.conn.decoder.decode(self.conn._select(params))
+        except (IOError, SolrError, ValueError), e:
+            if not self.silently_fail:
+                raise
+
+            self.log.error("Failed to query Solr using '%s': %s", query_string, e)
+            response = {}
+
+        shared = {
+            'highlighting': response.get('highlighting', {}),
+            'facets': response.get('facet_counts', {}),
+            'spellcheck': response.get('spellcheck', {}),
+        }
+        if len(groups) > 1:
+            doclists = [response.get('grouped', {}).get(group, {}).get(
+                'doclist', {}) for group in groups]
+        else:
+            doclists = [response.get('response', {})]
+
+        processed = []
+        for doclist in doclists:
+            raw_results = Results(doclist.get('docs', ()),
+                                  doclist.get('numFound', 0), **shared)
+            processed.append(self._process_results(
+                raw_results, highlight=highlight, result_class=result_class))
+
+        return {
+            'facets': processed[0].get('facets', {}) if processed else {},
+            'groups': processed,
+        }
+
+    def build_search_kwargs(self, query_string, sort_by=None, start_offset=0,
+                            end_offset=None, fields='', highlight=False,
+                            facets=None, date_facets=None, query_facets=None,
+                            narrow_queries=None, spelling_query=None,
+                            within=None, dwithin=None, distance_point=None,
+                            limit_to_registered_models=None,
+                            result_class=None, facet_mincount=None,
+                            facet_limit=None, facet_prefix=None,
+                            facet_sort=None, facet_offset=None, bf=None,
+                            **kwargs):
+        """
+        Overrides build_search_kwargs().
+
+        """
         kwargs = {
             'fl': '* score',
             'mlt': 'false'
@@ -453,17 +605,7 @@ class DESolrSearchBackend(SolrSearchBackend):
         #     # kwargs['fl'] += ' _dist_:geodist()'
         #     pass
 
-        try:
-            raw_results = self.conn.search(query_string, **kwargs)
-        except (IOError, SolrError), e:
-            if not self.silently_fail:
-                raise
-
-            self.log.error("Failed to query Solr using '%s': %s", query_string, e)
-            raw_results = EmptyResults()
-
-        return self._process_results(raw_results, highlight=highlight,
-                                     result_class=result_class)
+        return kwargs
 
     def build_schema(self, fields):
         content_field_name = ''
@@ -0,0 +1,241 @@
+"""
+Compiled, per-host snapshots of the site data that MultiHostMiddleware and
+SiteRedirectMiddleware need on every request.
+
+A SiteContext is built once per host and cached twice: in this process, and
+in the shared cache for other processes. Contexts are stamped with the
+versions of the host and of the sites they were built from. Those versions
+are bumped whenever a model the context is built from is saved or deleted,
+and a context with an old version is never used. Only the affected sites'
+contexts are invalidated. On a warm cache, looking up a host's context
+costs one cache get_many (its versions) and no database queries.
+
+"""
+from collections import namedtuple
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+HOST_VERSION_KEY = 'site_context:version:host:%s'
+SITE_VERSION_KEY = 'site_context:version:site:%s'
+
+# Hosts whose contexts are held in this process. Host headers come from
+# clients, so this is bounded.
+MAX_LOCAL_CONTEXTS = 1000
+
+SiteContext = namedtuple('SiteContext', [
+    'site',              # SeoSite, with its related objects prefetched
+    'buids',             # business unit ids
+    'tags',              # site tag names
+    'default_facets',    # custom facets with boolean_operation and
+    'featured_facets',   # facet_group set from their SeoSiteFacet
+    'standard_facets',
+    'packages',          # SitePackage ids
+    'redirect_to',       # domain this host redirects to, if any
+    'config_revisions',  # (status, revision) of each configuration
+    'version',           # ((version key, version), ...) it was built at
+])
+
+_local_contexts = {}
+
+
+def custom_facets_ops_groups(site_facets):
+    """
+    Returns a list of custom facets with boolean_operation attributes set
+    from site facets
+
+    """
+    custom_facets = []
+    for site_facet in site_facets:
+        custom_facet = site_facet.customfacet
+        setattr(custom_facet, 'boolean_operation', site_facet.boolean_operation)
+        setattr(custom_facet, 'facet_group', site_facet.facet_group)
+        custom_facets.append(custom_facet)
+    return custom_facets
+
+
+def current_versions(keys):
+    """Returns the current values of the version keys, in order."""
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # These versions were never set or were evicted. Start from the
+        # current time so that no context stamped with an older version is
+        # reused.
+        start = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, start, None)
+        versions.update(cache.get_many(missing))
+    return tuple((key, versions.get(key)) for key in keys)
+
+
+def site_version(site_id):
+    """Returns the version the site's contexts must have."""
+    return current_versions([SITE_VERSION_KEY % site_id])[0][1]
+
+
+def is_current(context):
+    """Returns whether none of context's versions have been bumped."""
+    versions = cache.get_many([key for key, _ in context.version])
+    return all(versions.get(key) == version
+               for key, version in context.version)
+
+
+def invalidate_site_contexts(site_ids=(), hosts=()):
+    """
+    Invalidates the cached contexts of the sites with site_ids, and of
+    hosts. A host has to be given when the site it maps to changes, e.g.
+    when a site is created for it.
+
+    """
+    keys = ([SITE_VERSION_KEY % site_id for site_id in site_ids] +
+            [HOST_VERSION_KEY % host for host in hosts])
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Never set or evicted; it starts over on the next lookup.
+            pass
+
+
+def context_sites(instance):
+    """
+    Returns the ids of the sites and the hosts whose contexts are built
+    from instance.
+
+    """
+    from postajob.models import SitePackage
+    from seo.models import (Configuration, CustomFacet, SeoSite,
+                            SeoSiteFacet, SeoSiteRedirect, SiteTag)
+
+    if isinstance(instance, SeoSite):
+        return [instance.pk], [instance.domain]
+    if isinstance(instance, SeoSiteRedirect):
+        return [instance.seosite_id], [instance.redirect_url]
+    if isinstance(instance, SeoSiteFacet):
+        return [instance.seosite_id], []
+    if isinstance(instance, CustomFacet):
+        sites = SeoSiteFacet.objects.filter(customfacet=instance).values_list(
+            'seosite_id', flat=True)
+    elif isinstance(instance, SiteTag):
+        sites = SeoSite.objects.filter(site_tags=instance).values_list(
+            'pk', flat=True)
+    elif isinstance(instance, Configuration):
+        sites = SeoSite.objects.filter(configurations=instance).values_list(
+            'pk', flat=True)
+    elif isinstance(instance, SitePackage):
+        sites = instance.sites.values_list('pk', flat=True)
+    else:
+        raise TypeError('%r is not part of any site context' % instance)
+    return list(sites), []
+
+
+def invalidate_instance_contexts(sender, instance, **kwargs):
+    """
+    Signal receiver for saves and deletes of models that site contexts are
+    built from. Connect it to pre_delete, so that related sites are looked
+    up while the relations still exist.
+
+    """
+    invalidate_site_contexts(*context_sites(instance))
+
+
+def invalidate_m2m_contexts(sender, instance, action, pk_set, **kwargs):
+    """
+    Signal receiver for changes to many to many relations between sites and
+    the models site contexts are built from.
+
+    """
+    from seo.models import SeoSite
+
+    if isinstance(instance, SeoSite):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_site_contexts([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_site_contexts(pk_set)
+    elif action == 'pre_clear':
+        # Through models name their foreign keys after the related models.
+        invalidate_site_contexts(sender.objects.filter(
+            **{instance._meta.model_name: instance}).values_list(
+                'seosite_id', flat=True))
+
+
+def build_site_context(host):
+    """
+    Builds the SiteContext for host from the database. Hosts without a site
+    get the default site (id 1).
+
+    """
+    from postajob.models import SitePackage
+    from seo.models import SeoSite, SeoSiteFacet, SeoSiteRedirect
+
+    redirect = SeoSiteRedirect.objects.select_related('seosite').filter(
+        redirect_url=host).first()
+    site_id = SeoSite.objects.filter(domain=host).values_list(
+        'pk', flat=True).first() or 1
+
+    # Versions are read before the data they cover, so a change made while
+    # the context is built leaves it stamped with an old version.
+    site_ids = [site_id] + ([redirect.seosite_id] if redirect else [])
+    version = current_versions([HOST_VERSION_KEY % host] +
+                               [SITE_VERSION_KEY % pk for pk in site_ids])
+
+    # DO NOT add filters to prefetched objects. Use only with .all()
+    site = SeoSite.objects.select_related('group',
+                                          'microsite_carousel',
+                                          'view_sources',
+                                          ).prefetch_related('billboard_images',
+                                                             'business_units',
+                                                             'featured_companies',
+                                                             'site_tags',
+                                                             'google_analytics',
+                                                             'queryredirect_set',
+                                                             'configurations'
+                                                             ).get(pk=site_id)
+
+    facets = dict((facet_type, []) for facet_type, _
+                  in SeoSiteFacet.FACET_TYPE_CHOICES)
+    for site_facet in SeoSiteFacet.objects.filter(
+            seosite=site).select_related('customfacet'):
+        facets[site_facet.facet_type].append(site_facet)
+
+    return SiteContext(
+        site=site,
+        buids=tuple(bu.id for bu in site.business_units.all()),
+        tags=tuple(tag.site_tag for tag in site.site_tags.all()),
+        default_facets=tuple(custom_facets_ops_groups(
+            facets[SeoSiteFacet.DEFAULT])),
+        featured_facets=tuple(custom_facets_ops_groups(
+            facets[SeoSiteFacet.FEATURED])),
+        standard_facets=tuple(custom_facets_ops_groups(
+            facets[SeoSiteFacet.STANDARD])),
+        packages=tuple(SitePackage.objects.filter(sites=site).values_list(
+            'pk', flat=True)),
+        redirect_to=redirect.seosite.domain if redirect else None,
+        config_revisions=tuple((config.status, config.revision)
+                               for config in site.configurations.all()),
+        version=version)
+
+
+def get_site_context(host):
+    """
+    Returns the SiteContext for host, building and caching it if there is
+    no current one.
+
+    """
+    context = _local_contexts.get(host)
+    if context is not None and is_current(context):
+        return context
+
+    key = 'site_context:%s' % host
+    context = cache.get(key)
+    if context is None or not is_current(context):
+        context = build_site_context(host)
+        cache.set(key, context,
+                  getattr(settings, 'MINUTES_TO_CACHE', 120) * 60)
+
+    if len(_local_contexts) >= MAX_LOCAL_CONTEXTS:
+        _local_contexts.clear()
+    _local_contexts[host] = context
+    return context
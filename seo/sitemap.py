@@ -1,15 +1,35 @@
+from collections import OrderedDict
 import datetime
+import gzip
+import json
 import math
+import os
 from slugify import slugify
 from solrsitemap import SolrSitemap
+from xml.sax.saxutils import escape
 
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.exceptions import ImproperlyConfigured
 from django.core.urlresolvers import NoReverseMatch, reverse
 
+from import_jobs.solr import iter_documents
 from seo.search_backend import DESearchQuerySet
-from seo.helpers import sqs_apply_custom_facets
+from seo.helpers import custom_facets_query, sqs_apply_custom_facets
+from seo.site_context import get_site_context
+
+# Pre-rendered sitemaps. URLs per page match DESolrSitemap.limit, so page
+# numbers mean the same thing whether a page is pre-rendered or not.
+SITEMAP_PAGE_SIZE = 2000
+# Number of days, ending yesterday, listed in the sitemap index.
+SITEMAP_HISTORY = 30
+# Fields fetched for each job; a job is left out of the sitemap if any of
+# them slugifies to an empty string.
+SITEMAP_FIELDS = ('date_new', 'guid', 'location', 'title', 'uid')
+
+URLSET_OPEN = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+URLSET_CLOSE = '</urlset>\n'
 
 
 class DESolrSitemap(SolrSitemap):
@@ -263,3 +283,155 @@ class DateSitemap(DESolrSitemap):
         lastnight = datetime.datetime(*date_val[0:3])
         tonight = lastnight + oneday
         return [lastnight, tonight]
+
+
+def sitemap_directory(domain):
+    return os.path.join(settings.SITEMAP_ROOT, domain)
+
+
+def sitemap_page_path(domain, jobdate, page):
+    """
+    Returns the path of a pre-rendered sitemap page.
+
+    Inputs:
+    :jobdate: Date string, as YYYY-MM-DD
+    :page: Page number, starting at 1
+
+    """
+    return os.path.join(sitemap_directory(domain),
+                        'sitemap-%s-%s.xml.gz' % (jobdate, page))
+
+
+def read_sitemap_manifest(domain, today=None):
+    """
+    Returns the manifest written by write_daily_sitemaps for domain: a
+    dictionary with the time it was generated and the number of pages for
+    each date. Returns None if the sitemaps haven't been written today, as
+    older manifests are missing yesterday's jobs.
+
+    """
+    today = today or datetime.date.today()
+    path = os.path.join(sitemap_directory(domain), 'manifest.json')
+    try:
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, ValueError):
+        return None
+    if manifest.get('generated', '')[:10] != today.isoformat():
+        return None
+    return manifest
+
+
+class SitemapPageWriter(object):
+    """
+    Writes the URL entries for one date to gzipped sitemap pages of
+    page_size entries each. Pages are written under a temporary name and
+    renamed once complete, so a page being served is never partial.
+
+    """
+    def __init__(self, domain, jobdate, page_size=SITEMAP_PAGE_SIZE):
+        self.domain = domain
+        self.jobdate = jobdate
+        self.page_size = page_size
+        self.pages = 0
+        self.count = 0
+        self._file = None
+
+    def write(self, entry):
+        if self.count % self.page_size == 0:
+            self._next_page()
+        self._file.write(entry)
+        self.count += 1
+
+    def _next_page(self):
+        self._close_page()
+        self.pages += 1
+        self._path = sitemap_page_path(self.domain, self.jobdate, self.pages)
+        self._file = gzip.open(self._path + '.tmp', 'wb')
+        self._file.write(URLSET_OPEN)
+
+    def _close_page(self):
+        if self._file is not None:
+            self._file.write(URLSET_CLOSE)
+            self._file.close()
+            os.rename(self._path + '.tmp', self._path)
+            self._file = None
+
+    def close(self):
+        """Finishes the last page and returns the number of pages."""
+        if not self.pages:
+            # Dates without jobs are still listed, so they get an empty page.
+            self._next_page()
+        self._close_page()
+        return self.pages
+
+
+def write_daily_sitemaps(domain, today=None, history=SITEMAP_HISTORY,
+                         conn=None):
+    """
+    Pre-renders the sitemap pages for the `history` days before today for
+    domain, and writes the manifest the sitemap index is built from.
+
+    All of the days are written from a single cursor scan of the jobs in
+    Solr, so building a site's sitemaps costs the same number of requests
+    per job no matter how many pages there are.
+
+    Returns the manifest.
+
+    """
+    context = get_site_context(domain)
+    today = today or datetime.date.today()
+    dates = [(today - datetime.timedelta(days=i)).isoformat()
+             for i in xrange(1, history + 1)]
+
+    directory = sitemap_directory(domain)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    # Narrow the jobs the same way DESolrSitemap does.
+    fq = ['django_ct:(seo.joblisting)',
+          'date_new:[%sT00:00:00Z TO %sT23:59:59Z]' % (dates[-1], dates[0])]
+    if context.buids:
+        fq.append('buid:(%s)' % ' OR '.join(str(i) for i in context.buids))
+    if context.default_facets:
+        fq.append(custom_facets_query(context.default_facets))
+
+    sitemap_view_source = settings.FEED_VIEW_SOURCES.get('sitemap', 28)
+    url_format = (u'<url><loc>%s/%%s%d</loc><lastmod>%%s</lastmod>'
+                  u'<changefreq>monthly</changefreq><priority>1.0</priority>'
+                  u'</url>\n' % (escape('http://%s' % domain),
+                                 sitemap_view_source))
+
+    writers = OrderedDict((date, SitemapPageWriter(domain, date))
+                          for date in dates)
+    for doc in iter_documents(','.join(SITEMAP_FIELDS), fq, conn=conn):
+        writer = writers.get(doc.get('date_new', '')[:10])
+        if writer is None:
+            continue
+        slugs = [slugify(unicode(doc.get(field, '')))
+                 for field in SITEMAP_FIELDS]
+        if not all(slugs):
+            continue
+        guid = slugs[SITEMAP_FIELDS.index('guid')]
+        writer.write((url_format % (guid, writer.jobdate)).encode('utf-8'))
+
+    manifest = {
+        'generated': datetime.datetime.now().isoformat(),
+        'days': dict((date, writer.close())
+                     for date, writer in writers.iteritems()),
+    }
+
+    # Remove pages left over from dates that have aged out, or from days
+    # that had more pages when they were last written.
+    for name in os.listdir(directory):
+        if not name.startswith('sitemap-'):
+            continue
+        date, page = name[len('sitemap-'):].split('.')[0].rsplit('-', 1)
+        if int(page) > manifest['days'].get(date, 0):
+            os.remove(os.path.join(directory, name))
+
+    path = os.path.join(directory, 'manifest.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.rename(path + '.tmp', path)
+    return manifest
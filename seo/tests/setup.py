@@ -25,6 +25,12 @@ class TestDESolrSearchBackend(DESolrSearchBackend):
         settings.SOLR_QUERY_COUNTER = counter + 1
         return super(TestDESolrSearchBackend, self).search(*args, **kwargs)
 
+    def grouped_search(self, *args, **kwargs):
+        counter = getattr(settings, 'SOLR_QUERY_COUNTER', 0)
+        settings.SOLR_QUERY_COUNTER = counter + 1
+        return super(TestDESolrSearchBackend, self).grouped_search(*args,
+                                                                   **kwargs)
+
 
 class TestDESolrEngine(DESolrEngine):
     backend = TestDESolrSearchBackend
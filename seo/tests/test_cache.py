@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+from mock import patch
+
 from django.conf import settings
+from django.test.client import RequestFactory
 
-from seo.cache import get_facet_count_key
+from seo.cache import (bump_index_generation, get_custom_facets,
+                       get_facet_count_key, search_cache_key)
 from seo.helpers import build_filter_dict
 from setup import DirectSEOBase
 
@@ -28,4 +32,30 @@ class SeoCacheTestCase(DirectSEOBase):
         self.assertNotEqual(key4, key1)
         self.assertEqual(key1, key3)
 
+    def test_search_cache_key(self):
+        """
+        Query strings that only differ in parameter order or tracking
+        parameters share a key; index updates change it.
 
+        """
+        filters = build_filter_dict('/dubuque/jobs/')
+        key1 = get_facet_count_key(filters, 'q=nurse&location=dubuque')
+        key2 = get_facet_count_key(filters,
+                                   'location=dubuque&utm_source=x&q=nurse')
+        key3 = get_facet_count_key(filters, 'q=nurse')
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+
+        bump_index_generation()
+        self.assertNotEqual(
+            key1, get_facet_count_key(filters, 'q=nurse&location=dubuque'))
+        self.assertNotEqual(search_cache_key('listing', filters),
+                            search_cache_key('listing', filters, num_jobs=20))
+
+    def test_empty_custom_facets_are_cached(self):
+        request = RequestFactory().get('/jobs/')
+        filters = build_filter_dict('/jobs/')
+        with patch('seo.cache.get_solr_facet', return_value=[]) as facets:
+            self.assertEqual(get_custom_facets(request, filters=filters), [])
+            self.assertEqual(get_custom_facets(request, filters=filters), [])
+        self.assertEqual(facets.call_count, 1)
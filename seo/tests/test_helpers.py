@@ -4,10 +4,12 @@ from collections import namedtuple
 from mock import patch
 
 from django.conf import settings
+from django.test.client import RequestFactory
 
 from seo import helpers
 from seo.models import CustomFacet
 from seo.tests import factories
+from seo.tests.solr_settings import SOLR_FIXTURE
 from setup import DirectSEOBase, DirectSeoTCWithSiteAndConfig
 
 
@@ -205,3 +207,30 @@ class HelpersTestsWithJobAndSite(DirectSeoTCWithSiteAndConfig):
                          company.company_slug.replace('-', ' ').title())
         # extra test to ensure businessunit.title != company_slug
         self.assertNotEqual(helpers.bread_box_company_heading(company.company_slug), self.businessunit.title)
+
+    def test_listing_search_is_one_request(self):
+        featured = factories.CustomFacetFactory(
+            name='Dubai Jobs', querystring='country_short_exact:ARE')
+        settings.SITE_BUIDS = [self.businessunit.id]
+        settings.SITE_PACKAGES = []
+        settings.DEFAULT_FACET = []
+        settings.FEATURED_FACET = [featured]
+        settings.STANDARD_FACET = [featured]
+        request = RequestFactory().get('/jobs/')
+        filters = helpers.build_filter_dict('/jobs/')
+
+        settings.SOLR_QUERY_COUNTER = 0
+        listing = helpers.listing_search(request, filters, 10,
+                                         count_custom_facets=True)
+        featured_jobs = list(listing.featured_jobs[:10])
+        default_jobs = list(listing.default_jobs[:10])
+
+        self.assertEqual(listing.featured_jobs.count(), 1)
+        self.assertEqual(listing.default_jobs.count(), len(SOLR_FIXTURE) - 1)
+        self.assertEqual(featured_jobs[0].country_short, 'ARE')
+        self.assertNotIn('ARE', [job.country_short for job in default_jobs])
+        self.assertEqual(sum(count for _, count in
+                             listing.facet_counts['country_slab']),
+                         len(SOLR_FIXTURE))
+        self.assertEqual(listing.custom_facet_counts, [(featured, 1)])
+        self.assertEqual(settings.SOLR_QUERY_COUNTER, 1)
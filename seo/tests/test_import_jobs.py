@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 import os
+import shutil
+import tempfile
 
 from import_jobs import (DATA_DIR, add_company, remove_expired_jobs, update_solr, get_jobs_from_zipfile,
     filter_current_jobs, update_job_source)
+from import_jobs.scheduler import ImportScheduler, update_solr_many
+from import_jobs.solr import (FingerprintMap, SolrWriter, UidSet,
+                              iter_field_values, job_fingerprint)
+from pysolr import SolrError
 
 from seo.models import BusinessUnit, Company
 from seo.tests.factories import BusinessUnitFactory, CompanyFactory
@@ -33,6 +39,49 @@ class ImportJobsTestCase(DirectSEOBase):
         update_solr(self.buid_id)
         self.assertFalse(os.access(self.filepath, os.F_OK))
 
+    def test_unchanged_jobs_not_reposted(self):
+        """
+        Test that a second import of an identical feed file sends nothing
+        to Solr, and that a changed job is sent again.
+
+        """
+        added, deleted = update_solr(self.buid_id)
+        self.assertTrue(added > 0)
+
+        self.assertEqual(update_solr(self.buid_id), (0, 0))
+
+        doc = self.conn.search('*:*', fq='buid:%s' % self.buid_id,
+                               fl='id,uid').docs[0]
+        self.conn.add([{'id': doc['id'], 'uid': doc['uid'],
+                        'buid': self.buid_id}])
+        self.assertEqual(update_solr(self.buid_id), (1, 0))
+
+    def test_index_generation_bumped_after_commit(self):
+        """
+        Searches cached under the new index generation see the imported
+        jobs.
+
+        """
+        def bump():
+            self.assertTrue(self.conn.search(
+                '*:*', fq='buid:%s' % self.buid_id).hits)
+
+        with patch('import_jobs.bump_index_generation',
+                   side_effect=bump) as bump_index_generation:
+            update_solr(self.buid_id)
+        self.assertTrue(bump_index_generation.called)
+
+    def test_job_fingerprint(self):
+        job = {'uid': 1, 'title': 'Trombonist', 'on_sites': [2, 1],
+               'salted_date': datetime.datetime.now()}
+        same_job = dict(job, on_sites=[1, 2],
+                        salted_date=datetime.datetime(2015, 1, 1))
+        self.assertEqual(job_fingerprint(job), job_fingerprint(same_job))
+
+        changed_job = dict(job, title='Trumpeter')
+        self.assertNotEqual(job_fingerprint(job),
+                            job_fingerprint(changed_job))
+
     def test_subsidiary_rename(self):
         company1 = CompanyFactory()
         bu1 = self.businessunit
@@ -219,3 +268,187 @@ class LoadETLTestCase(DirectSEOBase):
         self.assertEqual(len(filtered_jobs), 28,
                          "filter_current_jobs should ignore the includeinindex bit, returning 39 jobs.  "
                          "Instead returned %s." % len(filtered_jobs))
+
+
+class SolrWriterTestCase(DirectSEOBase):
+    def tearDown(self):
+        super(SolrWriterTestCase, self).tearDown()
+        self.conn.delete(q='*:*')
+
+    def test_batches_by_count_and_size(self):
+        writer = SolrWriter(batch_size=3, max_batch_bytes=100)
+        docs = [{'id': 'seo.%s' % i} for i in range(7)]
+        sizes = [len(batch) for batch, _ in writer.batches(docs)]
+        self.assertEqual(sizes, [3, 3, 1])
+
+        docs = [{'id': 'seo.%s' % i, 'text': 'x' * 30} for i in range(4)]
+        sizes = [len(batch) for batch, _ in writer.batches(docs)]
+        self.assertEqual(sizes, [2, 2])
+        writer.close()
+
+    def test_add_pipelined(self):
+        docs = ({'id': 'seo.%s' % i, 'buid': 1} for i in range(10))
+        writer = SolrWriter(batch_size=3, max_in_flight=2)
+        ids = writer.add(docs)
+        writer.close()
+
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(len(writer.batch_stats), 4)
+        self.assertEqual(self.conn.search('buid:1').hits, 10)
+
+    def test_deletes_committed_on_close(self):
+        """
+        Deletes can't be sent with commitWithin, so they are committed on
+        close even when the writer was asked not to commit.
+
+        """
+        self.conn.add([{'id': 'seo.%s' % i, 'buid': 1} for i in range(3)])
+        writer = SolrWriter(commit_within="30000", commit=False)
+        writer.delete('buid:1')
+        self.assertTrue(writer.close())
+        self.assertEqual(self.conn.search('buid:1').hits, 0)
+
+        writer = SolrWriter(commit_within="30000", commit=False)
+        writer.add([{'id': 'seo.4', 'buid': 2}])
+        self.assertFalse(writer.close())
+
+    def test_failed_batch_is_split(self):
+        docs = [{'id': 'seo.%s' % i, 'buid': 1} for i in range(4)]
+        writer = SolrWriter(batch_size=4, retries=0)
+        real_add = writer.conn.add
+
+        def add(batch, **kwargs):
+            if len(batch) > 1:
+                raise SolrError("Batch too large")
+            return real_add(batch, **kwargs)
+
+        with patch.object(writer.conn, 'add', side_effect=add):
+            writer._send_batch(docs)
+        writer.close()
+
+        self.assertEqual([stats[0] for stats in writer.batch_stats],
+                         [1, 1, 1, 1])
+        self.assertEqual(self.conn.search('buid:1').hits, 4)
+
+
+class UidDiffTestCase(DirectSEOBase):
+    def tearDown(self):
+        super(UidDiffTestCase, self).tearDown()
+        self.conn.delete(q='*:*')
+
+    def test_uid_set(self):
+        uids = UidSet([5, 3, 3, 9, 1])
+        self.assertEqual(list(uids), [1, 3, 5, 9])
+        self.assertIn(3, uids)
+        self.assertNotIn(4, uids)
+        difference = uids.difference(UidSet([1, 9]))
+        self.assertIsInstance(difference, UidSet)
+        self.assertEqual(list(difference), [3, 5])
+
+    def test_uid_set_sorted_in_runs(self):
+        with patch('import_jobs.solr.SORT_RUN_SIZE', 3):
+            uids = UidSet([9, 4, 7, 1, 4, 8, 2, 9, 3, 6])
+        self.assertEqual(list(uids), [1, 2, 3, 4, 6, 7, 8, 9])
+
+    def test_fingerprint_map_sorted_in_runs(self):
+        pairs = [(9, 90), (4, 40), (7, None), (1, 10), (8, 80), (2, 20)]
+        with patch('import_jobs.solr.SORT_RUN_SIZE', 4):
+            fingerprints = FingerprintMap(pairs)
+        self.assertEqual(list(fingerprints), [1, 2, 4, 7, 8, 9])
+        self.assertEqual(fingerprints.get(4), 40)
+        self.assertEqual(fingerprints.get(7), 0)
+        self.assertIsNone(fingerprints.get(5))
+
+    def test_iter_field_values_pages_with_cursor(self):
+        self.conn.add([{'id': 'seo.%s' % i, 'uid': i, 'buid': 1}
+                       for i in range(25)])
+        self.conn.add([{'id': 'seo.other', 'uid': 100, 'buid': 2}])
+
+        uids = list(iter_field_values('uid', fq='buid:1', rows=10))
+        self.assertItemsEqual(uids, range(25))
+
+
+def fake_download_feed_file(buid, data_dir):
+    if buid == 4:
+        raise IOError("Feed not found")
+    return os.path.join(data_dir, 'dseo_feed_%s.xml' % buid)
+
+
+def fake_update_solr(buid, filepath=None, **kwargs):
+    # Runs in a worker process, so it reports what it was given through its
+    # result rather than through the mock.
+    if buid == 5:
+        # The worker dies without reporting back.
+        os._exit(1)
+    if buid == 3:
+        raise SolrError("Solr is down")
+    if not filepath.endswith('dseo_feed_%s.xml' % buid) or kwargs != {
+            'force': True}:
+        raise ValueError("Unexpected arguments")
+    return buid * 10, buid
+
+
+class ImportSchedulerTestCase(DirectSEOBase):
+    def setUp(self):
+        super(ImportSchedulerTestCase, self).setUp()
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+
+    @patch('import_jobs.scheduler.connection')
+    @patch('import_jobs.scheduler.update_solr', side_effect=fake_update_solr)
+    @patch('import_jobs.scheduler.download_feed_file',
+           side_effect=fake_download_feed_file)
+    def test_run(self, download, update, connection):
+        """
+        Every business unit is downloaded once and indexed, and a failed
+        download or import is recorded without stopping the others.
+
+        """
+        summary = update_solr_many([1, 2, 3, 4, 2], processes=2,
+                                   data_dir=self.data_dir, force=True)
+
+        self.assertItemsEqual([call[0][0] for call in download.call_args_list],
+                              [1, 2, 3, 4])
+        results = dict((result[0], result) for result in summary['results'])
+        self.assertEqual(sorted(results), [1, 2, 3, 4])
+        self.assertEqual(results[1][1:3] + results[1][4:], (10, 1, None))
+        self.assertEqual(results[2][1:3] + results[2][4:], (20, 2, None))
+        self.assertIn("Solr is down", results[3][4])
+        self.assertIn("Feed not found", results[4][4])
+        self.assertEqual((summary['buids'], summary['failed']), (4, 2))
+        self.assertEqual((summary['added'], summary['deleted']), (30, 3))
+        # The run's download directory is removed once it is done.
+        self.assertEqual(os.listdir(self.data_dir), [])
+
+    @patch('import_jobs.scheduler.connection')
+    @patch('import_jobs.scheduler.update_solr', side_effect=fake_update_solr)
+    @patch('import_jobs.scheduler.download_feed_file',
+           side_effect=fake_download_feed_file)
+    def test_lost_feed_times_out(self, download, update, connection):
+        """
+        A feed lost with its worker process times out and frees its place
+        in the pipeline rather than stalling the rest of the run.
+
+        """
+        summary = update_solr_many([5, 1, 2], processes=1, max_pending=1,
+                                   data_dir=self.data_dir, feed_timeout=1,
+                                   force=True)
+
+        results = dict((result[0], result) for result in summary['results'])
+        self.assertEqual(results[5][4], "Timed out")
+        self.assertEqual((summary['buids'], summary['failed']), (3, 1))
+        self.assertEqual(summary['added'], 30)
+
+    def test_summary(self):
+        scheduler = ImportScheduler(processes=2)
+        scheduler.results = [(2, 10, 1, 1.5, None),
+                             (1, 5, 4, 2.0, None),
+                             (3, 0, 0, 0.1, "SolrError()")]
+        summary = scheduler.summary(5.0)
+        self.assertEqual(summary['buids'], 3)
+        self.assertEqual(summary['failed'], 1)
+        self.assertEqual(summary['added'], 15)
+        self.assertEqual(summary['deleted'], 5)
+        self.assertEqual(summary['jobs_per_second'], 4.0)
+        self.assertEqual([result[0] for result in summary['results']],
+                         [1, 2, 3])
@@ -1,6 +1,10 @@
 import datetime
 
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.test.client import RequestFactory
+
+from middleware import MultiHostMiddleware
 
 from seo.tests.factories import (SeoSiteFactory, SeoSiteRedirectFactory)
 from seo.models import BusinessUnit, SeoSite, QueryRedirect, QParameter, \
@@ -90,6 +94,46 @@ class MultiHostMiddlewareTestCase(DirectSEOBase):
         self.assertEqual(settings.SITE_NAME, site.name)
         self.assertEqual(len(settings.SITE_BUIDS), site.business_units.all().count())
 
+    def test_warm_site_context_costs_no_queries(self):
+        request = RequestFactory().get('/', HTTP_HOST=self.test_site.domain)
+        request.user = AnonymousUser()
+        MultiHostMiddleware().process_request(request)
+
+        with self.assertNumQueries(0):
+            MultiHostMiddleware().process_request(request)
+        self.assertEqual(settings.SITE_ID, self.test_site.id)
+
+    def test_saving_a_site_invalidates_its_context(self):
+        request = RequestFactory().get('/', HTTP_HOST=self.test_site.domain)
+        request.user = AnonymousUser()
+        MultiHostMiddleware().process_request(request)
+
+        self.test_site.name = u'buck'
+        self.test_site.save()
+        self.bu.save()
+        self.test_site.business_units.add(self.bu)
+
+        MultiHostMiddleware().process_request(request)
+        self.assertEqual(settings.SITE_NAME, u'buck')
+        self.assertEqual(settings.SITE_BUIDS, [self.bu.id])
+
+    def test_clearing_other_sites_keeps_context(self):
+        """
+        Clearing the caches of a business unit only invalidates the contexts
+        of the sites it belongs to.
+
+        """
+        request = RequestFactory().get('/', HTTP_HOST=self.test_site.domain)
+        request.user = AnonymousUser()
+        MultiHostMiddleware().process_request(request)
+
+        self.bu.save()
+        SeoSite.objects.get(pk=1).business_units.add(self.bu)
+        BusinessUnit.clear_cache(self.bu.id)
+
+        with self.assertNumQueries(0):
+            MultiHostMiddleware().process_request(request)
+
 
 class RedirectOverrideMiddlewareTestCase(DirectSEOBase):
     def setUp(self):
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 import datetime
+import shutil
+import tempfile
 
 from django.conf import settings
 
 from seo.models import SeoSite
+from seo.sitemap import read_sitemap_manifest, write_daily_sitemaps
 from seo.tests.solr_settings import SOLR_FIXTURE
 from setup import DirectSEOBase
 
@@ -73,3 +76,36 @@ class SitemapTestCase(DirectSEOBase):
         resp = self.client.get("/sitemap-" + dt + ".xml")
         self.assertEqual(resp.status_code, 200)
         self.assertTrue("<url>" in resp.content)
+
+    def test_pre_rendered_sitemaps(self):
+        """
+        Sitemaps written by write_daily_sitemaps are listed in the index
+        and served without querying Solr.
+
+        """
+        settings.SITE_BUIDS = []
+        site = SeoSite.objects.get(pk=1)
+        site.business_units = []
+        site.save()
+        self.conn.add([dict(SOLR_FIXTURE[0])])
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings.SITEMAP_ROOT = root
+        today = datetime.date.today()
+        write_daily_sitemaps(site.domain,
+                             today=today + datetime.timedelta(days=1))
+        manifest = read_sitemap_manifest(site.domain)
+        self.assertEqual(manifest['days'][today.isoformat()], 1)
+        # The manifest is stale once the day it was written on is over.
+        self.assertIsNone(read_sitemap_manifest(
+            site.domain, today=today + datetime.timedelta(days=1)))
+
+        # Remove the job; the pages are served from the pre-rendered files.
+        self.conn.delete(q="*:*")
+        resp = self.client.get("/sitemap.xml")
+        self.assertIn("sitemap-%s.xml" % today.isoformat(), resp.content)
+        resp = self.client.get("/sitemap-%s.xml" % today.isoformat())
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("<url>", resp.content)
+        self.assertIn(SOLR_FIXTURE[0]['guid'].lower(), resp.content)
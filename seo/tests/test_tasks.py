@@ -6,6 +6,7 @@ from freezegun import freeze_time
 from mock import patch
 from random import choice
 
+from import_jobs.models import ImportRecord
 from setup import DirectSEOBase
 import tasks
 
@@ -60,3 +61,23 @@ class TasksTestCase(DirectSEOBase):
         tasks.check_total_throughput()
         mock_send_mail.assert_not_called()
 
+
+    @patch('tasks.task_clear_bu_cache')
+    @patch('tasks.update_solr_many')
+    def test_update_solr_many_records_imports(self, update_solr_many,
+                                              clear_bu_cache):
+        """
+        Each business unit imported in bulk gets an ImportRecord, and the
+        caches of those imported successfully are cleared.
+
+        """
+        update_solr_many.return_value = {'results': [
+            (1, 10, 1, 1.0, None), (2, 0, 0, 0.5, "SolrError()")]}
+        tasks.task_update_solr_many([1, 2])
+
+        self.assertEqual(
+            list(ImportRecord.objects.order_by('buid').values_list(
+                'buid', 'success')),
+            [(1, True), (2, False)])
+        clear_bu_cache.apply_async.assert_called_once_with(
+            kwargs={'buid': 1}, countdown=1500)
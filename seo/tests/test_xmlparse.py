@@ -332,6 +332,34 @@ class JobFeedTestCase(DirectSEOBase):
         """
         result = DEv2JobFeed(self.invalid_feed, jsid=0)
 
+    def test_streaming_matches_full_parse(self):
+        """
+        Test that a streaming parse yields the same header data and jobs
+        as a parse of the full document.
+
+        """
+        feed = 'seo/tests/data/dseo_feed_0.xml'
+        full = DEv2JobFeed(feed, jsid=0)
+        streamed = DEv2JobFeed(feed, jsid=0, streaming=True)
+
+        self.assertFalse(streamed.errors)
+        self.assertEqual(streamed.job_source_name, full.job_source_name)
+        self.assertEqual(streamed.crawled_date, full.crawled_date)
+        self.assertEqual(streamed.jobparse(), full.jobparse())
+
+        jobs = streamed.solr_jobs()
+        self.assertFalse(isinstance(jobs, list))
+        self.assertEqual([job['uid'] for job in jobs],
+                         [job['uid'] for job in full.solr_jobs()])
+
+    def test_streaming_invalid_feed(self):
+        """
+        Test that schema validation still happens in streaming mode.
+
+        """
+        result = DEv2JobFeed(self.invalid_feed, jsid=0, streaming=True)
+        self.assertTrue(result.errors)
+
     def test_no_onets(self):
         result = DEv2JobFeed(self.no_onet_feed, jsid=0)
         jobs = result.solr_jobs()
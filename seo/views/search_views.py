@@ -1,9 +1,11 @@
 import datetime
+import gzip
 import itertools
 import json
 import logging
 from lxml import etree
 import operator
+import os
 from fsm.views import FSMView
 import urllib
 import json as simplejson
@@ -26,6 +28,7 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render_to_response
 from django.template import RequestContext, loader
 from django.template.defaultfilters import safe
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.utils.encoding import smart_str, iri_to_uri
 from django.utils.feedgenerator import Atom1Feed
@@ -46,7 +49,8 @@ from myblocks.models import SearchResultBlock
 from myblocks import context_tools
 from seo.templatetags.seo_extras import facet_text, smart_truncate
 from seo.breadbox import Breadbox
-from seo.cache import get_custom_facets, get_site_config, get_total_jobs_count
+from seo.cache import (get_custom_facets, get_listing, get_site_config,
+                       get_total_jobs_count)
 from seo.search_backend import DESearchQuerySet
 from seo import helpers
 from seo.filters import FacetListWidget
@@ -54,7 +58,8 @@ from seo.forms.admin_forms import UploadJobFileForm
 from seo.models import (BusinessUnit, Company, Configuration, Country,
                         GoogleAnalytics, JobFeed, SeoSite, SiteTag)
 from seo.decorators import custom_cache_page, protected_site, home_page_check
-from seo.sitemap import DateSitemap
+from seo.sitemap import (DateSitemap, SITEMAP_HISTORY, read_sitemap_manifest,
+                         sitemap_page_path)
 from seo.templatetags.seo_extras import filter_carousel
 from transform import hr_xml_to_json
 from universal.states import states_with_sites
@@ -1380,32 +1385,42 @@ def new_sitemap_index(request):
     Generates the sitemap index page, which instructs the crawler how to
     get to every other page.
 
-    """
-    today = datetime.date.today()
-    yesterday = today - datetime.timedelta(days=1)
-    midnight = datetime.time.max
-    # The latest date/time in sitemaps is yesterday, midnight (time.max)
-    latest_datetime = datetime.datetime.combine(yesterday, midnight)
-    # Number of days to go back from today.
-    history = 30
-    # Populate a list of datetime.datetime objects representing today's date
-    # as well as one for each day going back 'history' days.
-    dates = [latest_datetime - datetime.timedelta(days=i) for i in xrange(history)]
-    earliest_day = (latest_datetime - datetime.timedelta(days=history)).date()
-    datecounts = DateSitemap().numpages(startdate=earliest_day,
-                                        enddate=latest_datetime)
-    sitemaps = {}
+    The pages for each date are read from the manifest written by
+    tasks.write_site_sitemaps if it was written today, and counted in Solr
+    otherwise.
 
-    for date in dates:
-        dt = datetime.date(*date.timetuple()[0:3]).isoformat()
-        sitemaps[dt] = {'sitemap': DateSitemap(), 'count': datecounts[dt]}
+    """
     current_site = Site.objects.get_current()
     protocol = request.is_secure() and 'https' or 'http'
 
+    manifest = read_sitemap_manifest(current_site.domain)
+    if manifest is not None:
+        datecounts = manifest['days']
+    else:
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        midnight = datetime.time.max
+        # The latest date/time in sitemaps is yesterday, midnight (time.max)
+        latest_datetime = datetime.datetime.combine(yesterday, midnight)
+        # Number of days to go back from today.
+        history = SITEMAP_HISTORY
+        # Populate a list of datetime.datetime objects representing today's
+        # date as well as one for each day going back 'history' days.
+        dates = [latest_datetime - datetime.timedelta(days=i)
+                 for i in xrange(history)]
+        earliest_day = (latest_datetime -
+                        datetime.timedelta(days=history)).date()
+        counts = DateSitemap().numpages(startdate=earliest_day,
+                                        enddate=latest_datetime)
+        datecounts = {}
+        for date in dates:
+            dt = datetime.date(*date.timetuple()[0:3]).isoformat()
+            datecounts[dt] = counts[dt]
+
     # List of tuples: (sitemap url, lastmod date)
     sites_dates = []
-    for date in sorted(sitemaps.keys(), reverse=True):
-        pages = sitemaps[date]['count']
+    for date in sorted(datecounts.keys(), reverse=True):
+        pages = datecounts[date]
         sitemap_url = urlresolvers.reverse('sitemap_date',
                                            kwargs={'jobdate': date})
         sites_dates.append(('%s://%s%s' % (protocol, current_site.domain,
@@ -1425,6 +1440,27 @@ def new_sitemap_index(request):
 
 def new_sitemap(request, jobdate=None):
     page = request.GET.get("p", 1)
+
+    # Serve the page pre-rendered by tasks.write_site_sitemaps, if any.
+    if jobdate and unicode(page).isdigit():
+        path = sitemap_page_path(Site.objects.get_current().domain,
+                                 jobdate, int(page))
+        if os.path.exists(path):
+            if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+                with open(path, 'rb') as f:
+                    response = HttpResponse(f.read(),
+                                            content_type='application/xml')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                f = gzip.open(path, 'rb')
+                try:
+                    response = HttpResponse(f.read(),
+                                            content_type='application/xml')
+                finally:
+                    f.close()
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+
     fields = ['title', 'location', 'uid', 'guid']
     sitemaps = {
         jobdate: DateSitemap(page=page, fields=fields, jobdate=jobdate)
@@ -1701,37 +1737,35 @@ def search_by_results_and_slugs(request, *args, **kwargs):
         if not moc:
             raise Http404("No MOC object found for url input %s" % filters['moc_slug'])
 
-    custom_facet_counts = []
     facet_slugs = []
     active_facets = []
-    if site_config.browse_facet_show:
-        cf_count_tup = get_custom_facets(request, filters=filters,
-                                         query_string=query_path)
-
-        if not filters.get('facet_slug', None):
-            custom_facet_counts = cf_count_tup
-        else:
-            facet_slugs = filters['facet_slug'].split('/')
-            # retrieve active facet from URL and add it to list of facets
-            # available to given domain
-            active_facets = helpers.standard_facets_by_name_slug(facet_slugs)
-            # remove active facet from list of available facets and counts
-            # to prevent display on the available facets list
-            custom_facet_counts = [(facet, count) for facet, count
-                                   in cf_count_tup
-                                   if facet not in active_facets]
+    if site_config.browse_facet_show and filters.get('facet_slug', None):
+        facet_slugs = filters['facet_slug'].split('/')
+        # retrieve active facet from URL and add it to list of facets
+        # available to given domain
+        active_facets = helpers.standard_facets_by_name_slug(facet_slugs)
 
-            # Set the facet blurb only if we have exactly one
-            # CustomFacet applied.
-            if len(active_facets) == 1 and active_facets[0].blurb:
-                facet_blurb_facet = active_facets[0]
+        # Set the facet blurb only if we have exactly one
+        # CustomFacet applied.
+        if len(active_facets) == 1 and active_facets[0].blurb:
+            facet_blurb_facet = active_facets[0]
 
     if filters['facet_slug'] and not active_facets:
         raise Http404("No job category found for %s" % filters['facet_slug'])
 
+    # Jobs, facet counts and custom facet counts come from one Solr request.
     fl = list(helpers.search_fields)
-    default_jobs, featured_jobs, facet_counts = helpers.jobs_and_counts(
-        request, filters, num_jobs, fl=fl)
+    listing = get_listing(request, filters, num_jobs, fl=fl,
+                          count_custom_facets=site_config.browse_facet_show)
+    default_jobs = listing.default_jobs
+    featured_jobs = listing.featured_jobs
+    facet_counts = listing.facet_counts
+
+    # remove active facet from list of available facets and counts
+    # to prevent display on the available facets list
+    custom_facet_counts = [(facet, count) for facet, count
+                           in listing.custom_facet_counts
+                           if facet not in active_facets]
 
     total_featured_jobs = featured_jobs.count()
     total_default_jobs = default_jobs.count()
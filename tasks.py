@@ -1,13 +1,14 @@
+from collections import defaultdict
 from datetime import date, timedelta, datetime
-from itertools import chain, izip_longest
+from itertools import groupby, izip_longest
 import json
 import logging
 import newrelic.agent
 import os
 import sys
+from timeit import default_timer as timer
 import traceback
 
-from celery import group
 from celery.task import task
 
 from django.conf import settings
@@ -18,18 +19,22 @@ from django.template.loader import render_to_string
 from django.db.models import Q
 
 from seo.models import SeoSite, BusinessUnit
+from seo.sitemap import write_daily_sitemaps
 from myjobs.models import EmailLog, User, STOP_SENDING, BAD_EMAIL
 from jira import JIRA
 from myjobs.helpers import log_to_jira
 from mymessages.models import Message
 from mysearches.models import (SavedSearch, SavedSearchDigest, SavedSearchLog,
                                DOM_CHOICES, DOW_CHOICES)
-from mypartners.models import PartnerLibrary, PartnerLibrarySource
-from mypartners.helpers import get_library_partners
+from mypartners.models import PartnerLibrarySource
+from mypartners.helpers import get_library_partners, sync_partner_library
+from mysearches.helpers import shared_feed_cache
 import import_jobs
 from import_jobs.models import ImportRecord
 from import_jobs.mongo import jobsfs_to_mongo, seoxml_to_mongo
-from postajob.models import Job
+from import_jobs.scheduler import update_solr_many
+from import_jobs.solr import SolrWriter
+from postajob.helpers import expire_due_jobs, renew_due_jobs
 from registration.models import ActivationProfile
 from djcelery.models import TaskState
 import ast
@@ -227,53 +232,16 @@ def update_partner_library():
         print "Connecting to %s...." % source
         print "Parsing data for PartnerLibrary information..."
 
-        added = skipped = 0
-        for partner in get_library_partners(source.search_url,
-                                            source.download_url,
-                                            json.loads(source.params)):
-            # the second join + split take care of extra internal whitespace
-            fullname = " ".join(" ".join([partner.first_name,
-                                          partner.middle_name,
-                                          partner.last_name]).split())
-            emails = [email.strip()
-                      for email in partner.email_id.split(';', 1)]
-
-            for email in emails:
-                # disambiguate records by source, contact name, and address
-                if not PartnerLibrary.objects.filter(data_source=source.name,
-                                                     contact_name=fullname,
-                                                     st=partner.st,
-                                                     city=partner.city,
-                                                     email=email).exists():
-                    PartnerLibrary.objects.create(
-                        data_source=source.name,
-                        name=partner.organization_name,
-                        uri=partner.website,
-                        region=partner.region,
-                        state=partner.state,
-                        area=partner.area,
-                        contact_name=fullname,
-                        phone=partner.phone,
-                        phone_ext=partner.phone_ext,
-                        alt_phone=partner.alt_phone,
-                        fax=partner.fax,
-                        email=email,
-                        street1=partner.street1,
-                        street2=partner.street2,
-                        city=partner.city,
-                        st=partner.st,
-                        zip_code=partner.zip_code,
-                        is_minority=partner.minority,
-                        is_female=partner.female,
-                        is_disabled=partner.disabled,
-                        is_disabled_veteran=partner.disabled_veteran,
-                        is_veteran=partner.veteran)
-                    added += 1
-                else:
-                    skipped += 1
+        stats = sync_partner_library(
+            source.name, get_library_partners(source.search_url,
+                                              source.download_url,
+                                              json.loads(source.params)))
 
-        print "%d records added and %d records skipped from '%s.\n" % (
-            added, skipped, source)
+        print ("%d records added, %d updated, %d deleted and %d unchanged "
+               "from '%s'." % (stats['added'], stats['updated'],
+                               stats['deleted'], stats['unchanged'], source))
+        print "Timings: %s\n" % ", ".join(
+            "%s %.2fs" % timing for timing in stats['timings'].items())
 
 
 @task(name='tasks.requeue_missed_searches', ignore_result=True)
@@ -341,49 +309,124 @@ def requeue_missed_searches():
             send_search_digest.s(search).apply_async()
 
 
+def due_today_q(today=None):
+    """
+    Builds a Q matching saved searches and digests that should be sent
+    today, given their frequency, day_of_week and day_of_month fields.
+    """
+    today = today or datetime.today()
+    return (Q(frequency='D') |
+            Q(frequency='W', day_of_week=str(today.isoweekday())) |
+            Q(frequency='M', day_of_month=today.day))
+
+
+def plan_search_digests(today=None, batch_size=None):
+    """
+    Selects every digest and individual saved search due today and splits
+    them into batches for send_search_digest_batch.
+
+    Inputs:
+    :today: The day to plan for; defaults to today
+    :batch_size: The number of digests or searches per batch; defaults to
+        settings.SAVED_SEARCH_BATCH_SIZE
+
+    Outputs:
+    A list of (model name, primary keys) tuples, one per batch
+    """
+    batch_size = batch_size or getattr(settings, 'SAVED_SEARCH_BATCH_SIZE',
+                                       100)
+    due = due_today_q(today)
+
+    # If a user opted in for a digest, they receive it and do not get
+    # individual saved search emails. Users with no digest at all are not
+    # sent anything. Searches are ordered by feed so that searches sharing a
+    # feed tend to land in the same batch.
+    digests = SavedSearchDigest.objects.filter(
+        due, is_active=True, user__opt_in_myjobs=True,
+        user__is_disabled=False).order_by('pk').values_list('pk', flat=True)
+    searches = SavedSearch.objects.filter(
+        due, is_active=True, user__savedsearchdigest__is_active=False,
+        user__opt_in_myjobs=True, user__is_disabled=False).order_by(
+        'feed', 'pk').values_list('pk', flat=True)
+
+    batches = []
+    for model, pks in [('SavedSearchDigest', list(digests)),
+                       ('SavedSearch', list(searches))]:
+        for index in xrange(0, len(pks), batch_size):
+            batches.append((model, pks[index:index + batch_size]))
+    return batches
+
+
+@task(name='tasks.send_search_digest_batch', ignore_result=True,
+      default_retry_delay=180, max_retries=2, bind=True)
+def send_search_digest_batch(self, model, pks):
+    """
+    Sends a batch of digest or saved search emails planned by
+    send_search_digests. Every search is loaded in one query and mailed by
+    this worker in turn, sharing a cache of fetched feeds so that searches
+    for the same jobs only request them once. Searches that fail are retried
+    as a smaller batch, with the same error handling as send_search_digest.
+
+    Inputs:
+    :model: 'SavedSearchDigest' or 'SavedSearch'
+    :pks: Primary keys of the instances to be mailed
+    """
+    if model == 'SavedSearchDigest':
+        searches = SavedSearchDigest.objects.select_related('user')
+    else:
+        searches = SavedSearch.objects.select_related('user',
+                                                      'partnersavedsearch')
+    searches = searches.filter(pk__in=pks)
+
+    sent, failed, error = 0, [], None
+    with shared_feed_cache() as feeds:
+        for search in searches:
+            try:
+                search.send_email()
+            except Exception as e:
+                logger.error(
+                    "Unable to send saved search for Saved Search ID: %s",
+                    search.pk)
+                logger.exception(e)
+                failed.append(search.pk)
+                error = e
+            else:
+                sent += 1
+
+    logger.info("Sent %s of %s %s emails from %s distinct feeds (%s "
+                "requested)", sent, len(pks), model, feeds.stats['queries'],
+                feeds.stats['lookups'])
+    if failed and self.request.retries < 2:
+        raise self.retry(args=[model, failed], exc=error)
+
+
 @task(name='tasks.send_search_digests', ignore_result=True)
 def send_search_digests():
     """
     Daily task to send saved searches. If user opted in for a digest, they
     receive it daily and do not get individual saved search emails. Otherwise,
     each active saved search is sent individually.
-    """
 
-    def filter_by_time(qs):
-        """
-        Filters the provided query set for emails that should be sent today
-
-        Inputs:
-        :qs: query set to be filtered
-
-        Outputs:
-        :qs: filtered query set containing today's outgoing emails
-        """
-        today = datetime.today()
-        day_of_week = today.isoweekday()
-
-        daily = qs.filter(frequency='D')
-        weekly = qs.filter(frequency='W', day_of_week=str(day_of_week))
-        monthly = qs.filter(frequency='M', day_of_month=today.day)
-        return chain(daily, weekly, monthly)
+    Due searches are selected up front and sent in batches, one
+    send_search_digest_batch task per batch.
 
+    Outputs:
+    A dictionary with the number of digests and searches 'planned', the
+    number of those 'sent' to workers and the number of 'batches' queued
+    """
     requeue_missed_searches.apply_async()
 
-    digests = SavedSearchDigest.objects.filter(is_active=True,
-                                               user__opt_in_myjobs=True,
-                                               user__is_disabled=False)
-    digests = filter_by_time(digests)
-    for obj in digests:
-        send_search_digest.s(obj).apply_async()
+    batches = plan_search_digests()
+    stats = {'planned': sum(len(pks) for _, pks in batches),
+             'sent': 0, 'batches': 0}
+    for model, pks in batches:
+        send_search_digest_batch.s(model, pks).apply_async()
+        stats['sent'] += len(pks)
+        stats['batches'] += 1
 
-    not_digest = SavedSearchDigest.objects.filter(is_active=False,
-                                                  user__opt_in_myjobs=True,
-                                                  user__is_disabled=False)
-    for item in not_digest:
-        saved_searches = item.user.savedsearch_set.filter(is_active=True)
-        saved_searches = filter_by_time(saved_searches)
-        for search_obj in saved_searches:
-            send_search_digest.s(search_obj).apply_async()
+    logger.info("Queued %(sent)s of %(planned)s planned saved search emails "
+                "in %(batches)s batches", stats)
+    return stats
 
 
 @task(name='task.delete_inactive_activations', ignore_result=True)
@@ -404,65 +447,186 @@ def delete_inactive_activations():
             profile.delete()
 
 
-@task(name='tasks.process_user_events', ignore_result=True)
-def process_user_events(email):
+# Number of addresses whose events are applied together by
+# process_email_events.
+EMAIL_EVENT_BATCH_SIZE = 1000
+
+
+def get_email_owners(emails):
     """
-    Processes all email events for a given user.
+    Bulk version of User.objects.get_email_owner.
+
+    Inputs:
+    :emails: Email addresses to look up
+
+    Outputs:
+    A dictionary mapping lowercased addresses to the User that owns them,
+    either as their primary or a secondary address
+    """
+    owners = {}
+    for user in User.objects.filter(email__in=emails):
+        owners[user.email.lower()] = user
+
+    rest = [email for email in emails if email.lower() not in owners]
+    if rest:
+        secondary = dict(User.objects.filter(
+            profileunits__secondaryemail__email__in=rest).values_list(
+            'profileunits__secondaryemail__email', 'pk'))
+        users = User.objects.in_bulk(secondary.values())
+        for email, pk in secondary.iteritems():
+            owners.setdefault(email.lower(), users[pk])
+    return owners
+
+
+def opt_out_for_events(user, deactivate, stop_sending):
     """
-    user = User.objects.get_email_owner(email=email)
+    Opts a user out of My.jobs emails in response to bad email events and
+    leaves them a message explaining why. Deactivation (three bad events in a
+    row) takes precedence over a request to stop sending.
 
-    logs = EmailLog.objects.filter(email=email).order_by('-received')
-    newest_log = logs[0]
+    Inputs:
+    :user: User to opt out
+    :deactivate: (email, event) of the newest bad event if the user's newest
+        three events were bad, otherwise None
+    :stop_sending: (email, event) of the newest stop sending event, if any
 
-    filter_by_event = lambda x, num = None: [log for log in logs[:num]
-                                             if log.event in x]
+    Outputs:
+    The list of fields that were changed on user
+    """
+    user.opt_in_myjobs = False
+    update_fields = ['deactivate_type', 'opt_in_myjobs']
+    if deactivate:
+        # Only deactivate the user if the previous "max_deactivations"
+        # communications fail, not for one-off failures.
+        user.is_verified = False
+        user.deactivate_type = deactivate[1]
+        update_fields.append('is_verified')
+        body = ('<b>Warning</b>: Attempts to send messages to {email} '
+                'have failed. Please check your email address in your '
+                '<a href="{{settings_url}}">'
+                'account settings</a>.').format(email=deactivate[0])
+    else:
+        user.deactivate_type = stop_sending[1]
+        body = ('<b>Warning</b>: We have received a request to stop '
+                'communications with {email}. If this was in error, '
+                'please opt back into emails in your '
+                '<a href="{{settings_url}}">'
+                'account settings</a>.').format(email=stop_sending[0])
+    body = body.format(settings_url=reverse_lazy('edit_account'))
+    Message.objects.create_message(users=user, subject='', body=body)
+    return update_fields
+
+
+def apply_email_events(batch):
+    """
+    Applies the events of a batch of addresses to their owners and marks
+    the events processed.
 
+    Inputs:
+    :batch: A list of (email, logs) tuples, where logs are the
+        (pk, email, event, received, processed) values of every EmailLog
+        for that address, newest first
+
+    Outputs:
+    The number of users updated
+    """
     max_errors = 3
-    # The presence (and number of events) of deactivate or stop_sending
-    # determines what kind (if any) of My.jobs message the user will receive.
-    # deactivate takes precedence. The logs query set has already been
-    # evaluated, so the only overhead is the list comprehension
-    deactivate = filter_by_event(BAD_EMAIL, num=3)
-    num_errors = len(deactivate)
-    stop_sending = filter_by_event(STOP_SENDING)
-    update_fields = []
-    if user:
-        if (num_errors == max_errors
-                or stop_sending) and user.opt_in_myjobs:
-            user.opt_in_myjobs = False
-            if num_errors == max_errors:
-                # Only deactivate the user if the previous "max_deactivations"
-                # communications fail, not for one-off failures.
-                user.is_verified = False
-                user.deactivate_type = deactivate[0].event
-                update_fields.append('is_verified')
-                body = ('<b>Warning</b>: Attempts to send messages to {email} '
-                        'have failed. Please check your email address in your '
-                        '<a href="{{settings_url}}">'
-                        'account settings</a>.').format(
-                            email=deactivate[0].email)
-            else:
-                user.deactivate_type = stop_sending[0].event
-                body = ('<b>Warning</b>: We have received a request to stop '
-                        'communications with {email}. If this was in error, '
-                        'please opt back into emails in your '
-                        '<a href="{{settings_url}}">'
-                        'account settings</a>.').format(
-                            email=stop_sending[0].email)
-            body = body.format(settings_url=reverse_lazy('edit_account'))
-            Message.objects.create_message(users=user, subject='', body=body)
-            update_fields.extend(['deactivate_type',
-                                  'opt_in_myjobs'])
+    owners = get_email_owners([email for email, _ in batch])
+    last_responses = defaultdict(list)
+    updated = 0
+
+    for email, logs in batch:
+        user = owners.get(email.lower())
+        if user is None:
+            continue
+
+        # The presence (and number of events) of deactivate or stop_sending
+        # determines what kind (if any) of My.jobs message the user will
+        # receive. deactivate takes precedence.
+        deactivate = [log[1:3] for log in logs[:max_errors]
+                      if log[2] in BAD_EMAIL]
+        stop_sending = [log[1:3] for log in logs if log[2] in STOP_SENDING]
+        newest = logs[0][3]
+
+        if ((len(deactivate) == max_errors or stop_sending)
+                and user.opt_in_myjobs):
+            # Opting out has side effects on the user's partner saved
+            # searches, so these users are saved individually. They are few.
+            update_fields = opt_out_for_events(
+                user, deactivate[0] if len(deactivate) == max_errors else None,
+                stop_sending[0] if stop_sending else None)
+            if user.last_response < newest:
+                user.last_response = newest
+                update_fields.append('last_response')
+            user.save(update_fields=update_fields)
+            updated += 1
+        elif user.last_response < newest:
+            last_responses[newest].append(user.pk)
+
+    for received, pks in last_responses.iteritems():
+        updated += User.objects.filter(
+            pk__in=pks, last_response__lt=received).update(
+            last_response=received)
+
+    processed = [log[0] for _, logs in batch for log in logs if not log[4]]
+    for index in xrange(0, len(processed), EMAIL_EVENT_BATCH_SIZE):
+        EmailLog.objects.filter(
+            pk__in=processed[index:index + EMAIL_EVENT_BATCH_SIZE]).update(
+            processed=True)
+    return updated
+
+
+def process_email_events(emails=None, batch_size=EMAIL_EVENT_BATCH_SIZE):
+    """
+    Processes the unprocessed email events of every address, or of only
+    those in emails. Event logs are streamed ordered by address in a single
+    query; the decisions for each address are made in memory and written
+    for batch_size addresses at a time.
 
-        if user.last_response < newest_log.received:
-            user.last_response = newest_log.received
-            update_fields.append('last_response')
+    Inputs:
+    :emails: Addresses to process; defaults to all
+    :batch_size: Number of addresses per batch of writes
 
-        # If update_fields is an empty iterable, the save is aborted
-        # This doesn't hit the DB unless a field has changed
-        user.save(update_fields=update_fields)
+    Outputs:
+    A dictionary with the number of 'events' processed, 'users' updated and
+    the throughput in 'events_per_second'
+    """
+    started = timer()
+    logs = EmailLog.objects.order_by('email', '-received', '-pk')
+    if emails is not None:
+        logs = logs.filter(email__in=emails)
+    logs = logs.values_list('pk', 'email', 'event', 'received',
+                            'processed').iterator()
+
+    stats = {'events': 0, 'users': 0}
+    batch = []
+    # Email comparisons are case insensitive in the database.
+    for email, address_logs in groupby(logs, key=lambda log: log[1].lower()):
+        address_logs = list(address_logs)
+        unprocessed = sum(1 for log in address_logs if not log[4])
+        if not unprocessed:
+            continue
+        stats['events'] += unprocessed
+        batch.append((address_logs[0][1], address_logs))
+        if len(batch) >= batch_size:
+            stats['users'] += apply_email_events(batch)
+            batch = []
+    if batch:
+        stats['users'] += apply_email_events(batch)
+
+    elapsed = timer() - started
+    stats['events_per_second'] = stats['events'] / elapsed if elapsed else 0
+    logger.info("Processed %(events)s email events for %(users)s users at "
+                "%(events_per_second).1f events per second", stats)
+    return stats
 
-    logs.filter(processed=False).update(processed=True)
+
+@task(name='tasks.process_user_events', ignore_result=True)
+def process_user_events(email):
+    """
+    Processes all email events for a given user.
+    """
+    process_email_events(emails=[email])
 
 
 @task(name='tasks.process_batch_events', ignore_result=True)
@@ -476,12 +640,7 @@ def process_batch_events():
     EmailLog.objects.filter(received__lte=now - timedelta(days=60),
                             processed=True).delete()
 
-    emails = set(EmailLog.objects.values_list('email', flat=True).filter(
-        processed=False))
-
-    result = group(process_user_events.subtask((email,))
-                   for email in emails).apply()
-    result.join()
+    process_email_events()
 
     # These users have not responded in a month. Send them an email if they
     # own any saved searches
@@ -527,19 +686,18 @@ def split_list(l, list_len, fill_val=None):
 
 @task(name='tasks.expire_jobs', ignore_result=True)
 def expire_jobs():
-    jobs = Job.objects.filter(date_expired__lt=date.today(),
-                              is_expired=False, autorenew=False)
-    for job in jobs:
-        # Setting is_expired to True will trigger job.remove_from_solr()
-        job.is_expired = True
-        job.save()
-
-    jobs = Job.objects.filter(date_expired__lt=date.today(),
-                              is_expired=False, autorenew=True)
-    for job in jobs:
-        job.date_expired = date.today() + timedelta(days=30)
-        # Saving will trigger job.add_to_solr().
-        job.save()
+    """
+    Expires posted jobs which expired before today, renewing those set to
+    renew automatically. Solr is updated a batch of jobs at a time through
+    one writer, which commits once at the end.
+    """
+    writer = SolrWriter()
+    try:
+        expired = expire_due_jobs(writer)
+        renewed = renew_due_jobs(writer)
+    finally:
+        writer.close()
+    logger.info("Expired %s jobs and renewed %s jobs", expired, renewed)
 
 
 @task(name="tasks.task_clear_bu_cache", acks_late=True, ignore_result=True)
@@ -563,6 +721,24 @@ def task_update_solr(jsid, **kwargs):
         raise task_update_solr.retry(exc=e)
 
 
+@task(name="tasks.task_update_solr_many", acks_late=True, ignore_result=True)
+def task_update_solr_many(buids, clear_cache=True, **kwargs):
+    """
+    Imports many business units at once through the parallel import
+    pipeline in import_jobs.scheduler, recording an ImportRecord for each.
+    As with task_update_solr(clear_cache=True), the business unit caches of
+    every successful import are cleared once the import is searchable.
+
+    """
+    summary = update_solr_many(buids, **kwargs)
+    for buid, added, deleted, seconds, error in summary['results']:
+        ImportRecord(buid=buid, success=not error).save()
+        if clear_cache and not error:
+            task_clear_bu_cache.apply_async(kwargs={'buid': buid},
+                                            countdown=1500)
+    return summary
+
+
 @task(name='tasks.etl_to_solr', ignore_result=True, send_error_emails=True, soft_time_limit=3600)
 def task_etl_to_solr(guid, buid, name):
     try:
@@ -637,6 +813,24 @@ def task_submit_all_sitemaps():
         task_submit_sitemap.delay(site.domain)
 
 
+@task(name="tasks.write_site_sitemaps", ignore_result=True)
+def write_site_sitemaps(domain):
+    """
+    Pre-renders the sitemap pages and manifest for the given domain
+    Input:
+        :domain: sitemap domain
+    """
+    manifest = write_daily_sitemaps(domain)
+    logging.info("Wrote %s sitemap pages for %s" % (
+        sum(manifest['days'].values()), domain))
+
+
+@task(name="tasks.write_sitemaps", ignore_result=True)
+def write_sitemaps():
+    for domain in SeoSite.objects.values_list('domain', flat=True):
+        write_site_sitemaps.delay(domain)
+
+
 def get_event_list(events):
     """
     Turns a block of json events into a list of events.
@@ -0,0 +1,81 @@
+"""In-process caching helpers."""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A thread-safe, size-bounded, in-process cache.
+
+    Once `max_size` entries are stored, the least recently used entry is
+    evicted to make room for a new one. If `ttl` (in seconds) is given,
+    entries older than that are treated as missing.
+
+    Counts of hits, misses and evictions are kept in `hits`, `misses` and
+    `evictions`.
+
+    """
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count=True):
+        with self._lock:
+            try:
+                expires, value = self._entries.pop(key)
+            except KeyError:
+                if count:
+                    self.misses += 1
+                return default
+            if expires is not None and expires < time.time():
+                if count:
+                    self.misses += 1
+                return default
+            # Re-insert to mark the entry as most recently used.
+            self._entries[key] = (expires, value)
+            if count:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = (expires, value)
+
+    def get_or_set(self, key, func):
+        """
+        Returns the value cached for `key`, calling `func()` and caching its
+        result if there isn't one.
+
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func()
+            self.set(key, value)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_MISSING = object()
@@ -0,0 +1,25 @@
+import time
+
+from unittest import TestCase
+
+from mock import patch
+
+from universal.cache import LRUCache
+
+
+class LRUCacheTests(TestCase):
+    def test_eviction_and_ttl(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.evictions, 1)
+
+        cache = LRUCache(ttl=60)
+        cache.set('a', 1)
+        with patch('universal.cache.time.time',
+                   return_value=time.time() + 61):
+            self.assertIsNone(cache.get('a'))
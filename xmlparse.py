@@ -17,6 +17,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.utils.html import linebreaks
 
 from seo.models import BusinessUnit
+from moc_coding.cache import MocIndex
 from moc_coding.models import CustomCareer, Moc
 from universal.helpers import get_object_or_none
 
@@ -47,20 +48,34 @@ class JobFeed(object):
     datetime_pattern -- A string specifying the format of the datetime
     data in the feed. Should conform to the specification outlined here:
     http://docs.python.org/library/time.html#time.strftime
+    streaming -- Boolean. If True, the feed file is never loaded into a
+    full tree. It is validated and its header fields are read in a single
+    `iterparse` pass, and `solr_jobs()` returns a generator that parses one
+    job node at a time, discarding each node once it has been processed.
+    moc_index -- A moc_coding.cache.MocIndex used to map O*NET codes to
+    MOCs. Defaults to a new index, loaded once for this feed.
     """
     def __init__(self, filepath, js_field=None, crawl_field=None, node_tag=None,
                  datetime_pattern=None, jsid=None, schema=None, markdown=True,
-                 company=None):
+                 company=None, streaming=False, moc_index=None):
         if None in (js_field, crawl_field, datetime_pattern):
             raise AttributeError("You must specify valid values for js_field, "
                                  "datetime_pattern and crawl_field.")
         self.filepath = filepath
         self.bu_mapped_mocs = None
-        self.parser = etree.XMLParser(recover=False, schema=schema)
-        self.doc = etree.parse(self.filepath, self.parser)
+        self.moc_index = moc_index or MocIndex()
+        self.schema = schema
+        self.streaming = streaming
         self.datetime_pattern = datetime_pattern
         self.jsid = jsid
         self.node_tag = node_tag
+        if streaming:
+            self.doc = None
+            self.header = self.scan_header(js_field, crawl_field,
+                                           'job_source_id')
+        else:
+            self.parser = etree.XMLParser(recover=False, schema=schema)
+            self.doc = etree.parse(self.filepath, self.parser)
         self.job_source_name = self.unescape(self.parse_doc(js_field))
         self.crawled_date = get_strptime(self.parse_doc(crawl_field),
                                          self.datetime_pattern)
@@ -94,10 +109,66 @@ class JobFeed(object):
     def solr_jobs(self):
         """
         This method must return a list of dictionaries from solr_job_dict.
+        In streaming mode a generator of those dictionaries is returned
+        instead.
+
+        """
+        jobs = (self.solr_job_dict(node) for node in self.job_nodes())
+        return jobs if self.streaming else list(jobs)
 
+    def job_nodes(self):
+        """
+        Yields every job node (each child of `node_tag`) in the feed.
+
+        In streaming mode the feed file is read with `iterparse`, and each
+        node is cleared (along with any siblings that preceded it) once the
+        caller asks for the next one, so only a single job is ever held in
+        memory.
+
+        """
+        if not self.streaming:
+            for node in self.doc.find(self.node_tag).iterchildren():
+                yield node
+            return
+
+        context = self._iterparse()
+        for event, elem in context:
+            parent = elem.getparent()
+            if parent is None or parent.tag != self.node_tag:
+                continue
+            yield elem
+            self._clear_node(elem)
+
+    def scan_header(self, *fields):
         """
-        return [self.solr_job_dict(node) for node in
-                self.doc.find(self.node_tag).iterchildren()]
+        Walks the whole feed once with `iterparse`, validating it against
+        `schema` and returning a dictionary of the text of the first
+        occurrence of each tag in `fields`. Job nodes are discarded as soon
+        as they have been parsed.
+
+        The iterparse context is stored as `self.parser` so its error log
+        is available to callers, just as with the non-streaming parser.
+
+        """
+        header = {}
+        self.parser = context = self._iterparse()
+        for event, elem in context:
+            if elem.tag in fields and elem.tag not in header:
+                header[elem.tag] = elem.text
+            parent = elem.getparent()
+            if parent is not None and parent.tag == self.node_tag:
+                self._clear_node(elem)
+        return header
+
+    def _iterparse(self):
+        return etree.iterparse(self.filepath, events=('end', ),
+                               schema=self.schema, recover=False)
+
+    @staticmethod
+    def _clear_node(elem):
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
 
     @staticmethod
     def moc_data(mocs):
@@ -113,14 +184,19 @@ class JobFeed(object):
         return MocData(moc_set, moc_slab, moc_ids)
 
     @staticmethod
-    def job_mocs(job):
+    def job_mocs(job, moc_index=None):
         """
         Return a list of MOCs and MOC slabs for a given job.
 
+        If a MocIndex is passed in the MOCs are looked up in memory rather
+        than in the database.
+
         """
         onets = job.get('onet_code', '')
         moc_list = []
         if onets:
+            if moc_index is not None:
+                return moc_index.job_mocs(onets)
             [moc_list.append(moc) for moc in
              Moc.objects.filter(onets__code__in=onets)]
         return moc_list
@@ -145,11 +221,8 @@ class JobFeed(object):
             :job: A job node from the xml feed
 
         """
-        content_type = ContentType.objects.get_for_model(BusinessUnit)
         if self.bu_mapped_mocs is None:
-            self.bu_mapped_mocs = CustomCareer.objects.filter(
-                object_id=self.jsid,
-                content_type=content_type).values_list('moc', flat=True)
+            self.bu_mapped_mocs = self.moc_index.mapped_moc_ids(self.jsid)
         if not self.bu_mapped_mocs:
             return self.moc_data(mocs)
 
@@ -157,11 +230,8 @@ class JobFeed(object):
         # for this business unit, we remove the original mapping
         unmapped_mocs = set(mocs) - set(self.bu_mapped_mocs)
 
-        onet_list = []
-        [onet_list.append(bu_onet) for bu_onet in
-         self.bu_mapped_mocs.filter(onet__in=job['onet_code'])]
-        mapped_job_mocs = Moc.objects.filter(id__in=list(onet_list))
-        mapped_job_moc_set = set(mapped_job_mocs)
+        mapped_job_moc_set = set(self.moc_index.custom_mocs(
+            self.jsid, job['onet_code']))
         job_mocs = unmapped_mocs | mapped_job_moc_set
         return self.moc_data(job_mocs)
 
@@ -173,6 +243,11 @@ class JobFeed(object):
 
     def parse_doc(self, field, wrapper=None):
         """Use for retrieving document-level (as opposed to job-level) tags."""
+        if self.streaming:
+            text = self.header.get(field)
+            if text is not None and wrapper:
+                return wrapper(text)
+            return text
         result = self.doc.find('.//' + field)
         if result is not None:
             if wrapper:
@@ -343,7 +418,7 @@ class DEJobFeed(JobFeed):
         city_slab = self.city_slab(job_node)
         state_slab = self.state_slab(job_node)
         title_slab = self.title_slab(job_node)
-        mocs = self.job_mocs(job_node)
+        mocs = self.job_mocs(job_node, self.moc_index)
         moc_tups = self.moc_data(mocs)
         mapped_moc_tups = self.mapped_mocs(mocs, job_node)
 
@@ -488,9 +563,8 @@ class DEv2JobFeed(DEJobFeed):
 
     def jobparse(self):
         joblist = []
-        jobs = self.doc.find(self.node_tag).iterchildren()
 
-        for job in jobs:
+        for job in self.job_nodes():
             attr = job.find('uid')
             jobdict = {'uid': self.unescape(attr.text)}
             joblist.append(jobdict)
@@ -518,14 +592,19 @@ def guid_from_link(link):
     return url.path.replace("/", "")[:32] if url and url.path else ''
 
 
-def get_mapped_mocs(bu, onets):
+def get_mapped_mocs(bu, onets, moc_index=None):
     """For a given job, determine any custom onet mappings that override the
     defaults.
     Input:
         :bu: The businessUnit this job is associated with
         :onets: The onets associated with this job.
+        :moc_index: An optional MocIndex to look the mappings up in, instead
+                    of querying the database.
     """
-    original = set(DEJobFeed.job_mocs({'onet_code': onets}))
+    original = set(DEJobFeed.job_mocs({'onet_code': onets}, moc_index))
+    if moc_index is not None:
+        mappings = set(moc_index.custom_mocs(bu.pk, onets))
+        return DEJobFeed.moc_data(mappings | original)
     content_type = ContentType.objects.get_for_model(BusinessUnit)
     mappings = CustomCareer.objects.filter(object_id=bu.pk,
                                            content_type=content_type,